@@ -0,0 +1,298 @@
+"""
+End-to-end benchmark for the scraping pipeline, replayed from recorded fixtures.
+
+Wiki pages and Sheets API responses are recorded once (with --record, which needs network access and credentials),
+then every other run replays them through scrape_all_perks, scrape_characters_mt, scrape_otz and transform_dicts without
+touching the network. For each stage, the wall time, CPU time, peak (Python) memory and number of requests are
+reported.
+
+The fixtures committed in benchmarks/fixtures are synthetic (see make_fixtures.py), so the benchmark runs as-is;
+--record replaces them with the live wiki and sheet.
+
+Results can be saved as a baseline (--save-baseline), and any later run with a stage that is slower than the baseline
+by more than --threshold exits with a non-zero status.
+
+Usage:
+    python benchmarks/bench_pipeline.py --record
+    python benchmarks/bench_pipeline.py --save-baseline
+    python benchmarks/bench_pipeline.py [--repeat 5] [--threshold 0.2]
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(__file__, '../..'))
+sys.path[:0] = [os.path.join(ROOT, 'scrapers'), ROOT]
+
+import util  # noqa: E402
+from scrapers import constants  # noqa: E402
+
+FIXTURES_DIR = os.path.join(ROOT, 'benchmarks', 'fixtures')
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+KILLER, SURVIVOR = "killers", "survivors"
+
+
+class RequestCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"wiki": 0, "sheets": 0}
+
+    def increment(self, kind):
+        with self._lock:
+            self.counts[kind] += 1
+
+    def reset(self):
+        with self._lock:
+            self.counts = {k: 0 for k in self.counts}
+
+
+COUNTER = RequestCounter()
+
+
+def _html_path(url: str) -> str:
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '_', url.removeprefix('https://'))
+    return os.path.join(FIXTURES_DIR, 'html', f'{slug}.html')
+
+
+def _sheets_path(spreadsheet_id: str, ranges) -> str:
+    key = json.dumps([spreadsheet_id, [str(r) for r in ranges]])
+    return os.path.join(FIXTURES_DIR, 'sheets', f'{hashlib.sha1(key.encode()).hexdigest()}.json')
+
+
+# ---------------- RECORDING --------------------
+def _recording_get_content(url: str):
+    from bs4 import BeautifulSoup
+
+    COUNTER.increment("wiki")
+    content = util.get_session().get(url).content
+
+    path = _html_path(url)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+    return BeautifulSoup(content, 'html.parser')
+
+
+class _RecordingRequest:
+    def __init__(self, request, path):
+        self.request = request
+        self.path = path
+
+    def execute(self, *args, **kwargs):
+        COUNTER.increment("sheets")
+        response = self.request.execute(*args, **kwargs)
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(response, f)
+
+        return response
+
+
+class _RecordingSpreadsheets:
+    def __init__(self, service):
+        self.service = service
+
+    def get(self, spreadsheetId, ranges, **kwargs):
+        return _RecordingRequest(self.service.spreadsheets().get(spreadsheetId=spreadsheetId, ranges=ranges, **kwargs),
+                                 _sheets_path(spreadsheetId, ranges))
+
+
+class RecordingService:
+    def __init__(self, service):
+        self.service = service
+
+        # only as rate limited (see sheets.get) as whatever's being recorded, i.e. the real API
+        self.rate_limited = getattr(service, 'rate_limited', True)
+
+    def spreadsheets(self):
+        return _RecordingSpreadsheets(self.service)
+
+
+# ---------------- REPLAYING --------------------
+def _replay_get_content(url: str):
+    from bs4 import BeautifulSoup
+
+    COUNTER.increment("wiki")
+    path = _html_path(url)
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'No recorded fixture for {url}! (re-record with --record)')
+
+    with open(path, 'rb') as f:
+        return BeautifulSoup(f.read(), 'html.parser')
+
+
+class _ReplayRequest:
+    def __init__(self, path):
+        self.path = path
+
+    def execute(self, *args, **kwargs):
+        COUNTER.increment("sheets")
+
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f'No recorded fixture for Sheets request {self.path}! (re-record with --record)')
+
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+
+class _ReplaySpreadsheets:
+    def get(self, spreadsheetId, ranges, **kwargs):
+        return _ReplayRequest(_sheets_path(spreadsheetId, ranges))
+
+
+class ReplayService:
+    # replayed responses don't count against the Sheets quota, so the benchmark shouldn't be waiting on the limiter
+    rate_limited = False
+
+    def spreadsheets(self):
+        return _ReplaySpreadsheets()
+
+
+# ---------------- BENCHMARK --------------------
+def measure(func):
+    """ runs func, returning (result, {wall, cpu, peak_memory, requests}) """
+    COUNTER.reset()
+    tracemalloc.start()
+
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    result = func()
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, {"wall": wall, "cpu": cpu, "peak_memory": peak} | dict(COUNTER.counts)
+
+
+def run_pipeline(service, no_workers: int):
+    import table_crawler
+
+    # every run gets its own (empty) wiki table row cache, so each one parses every row, like the first run of the day
+    # would, and the real cache in out/cache is left alone
+    row_cache_path = table_crawler.ROW_CACHE_PATH
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        table_crawler.ROW_CACHE_PATH = os.path.join(cache_dir, os.path.basename(row_cache_path))
+
+        try:
+            return _run_pipeline(service, no_workers)
+        finally:
+            table_crawler.ROW_CACHE_PATH = row_cache_path
+
+
+def _run_pipeline(service, no_workers: int):
+    from character_scraper import scrape_characters_mt
+    from main import transform_dicts
+    from otz_scraper import scrape_otz
+    from perk_scraper import scrape_all_perks
+
+    results = {}
+
+    perks, results['scrape_perks'] = measure(lambda: tuple(scrape_all_perks([KILLER, SURVIVOR]).values()))
+
+    characters, results['scrape_characters_mt'] = measure(
+        lambda: (scrape_characters_mt(KILLER, no_workers=no_workers, force_refresh=True),
+                 scrape_characters_mt(SURVIVOR, no_workers=no_workers, force_refresh=True)))
+
+    spreadsheets, results['scrape_otz'] = measure(
+        lambda: (scrape_otz(service, constants.OTZ_SPREADSHEET_ID, KILLER, 32, 12),
+                 scrape_otz(service, constants.OTZ_SPREADSHEET_ID, SURVIVOR, 32, 12)))
+
+    # transform_dicts modifies its inputs, so give it its own copy (outside the measurement)
+    (killer_perks, survivor_perks), (killer_characters, survivor_characters), \
+        (killer_spreadsheet, survivor_spreadsheet) = copy.deepcopy((perks, characters, spreadsheets))
+
+    _, results['transform_dicts'] = measure(
+        lambda: transform_dicts(survivor_perks=survivor_perks, survivor_characters=survivor_characters,
+                                survivor_spreadsheet=survivor_spreadsheet, killer_perks=killer_perks,
+                                killer_characters=killer_characters, killer_spreadsheet=killer_spreadsheet,
+                                current_date="01-01-1970"))
+
+    return results
+
+
+def summarise(runs):
+    """ median of every metric across runs """
+    return {stage: {metric: statistics.median(run[stage][metric] for run in runs) for metric in runs[0][stage]}
+            for stage in runs[0]}
+
+
+def print_results(results, baseline=None):
+    print(f'{"stage":<24}{"wall (s)":>10}{"cpu (s)":>10}{"peak (MB)":>11}{"wiki":>7}{"sheets":>8}{"vs base":>10}')
+
+    for stage, r in results.items():
+        change = ""
+        if baseline is not None and stage in baseline:
+            change = f'{(r["wall"] / baseline[stage]["wall"] - 1) * 100:+.1f}%'
+
+        print(f'{stage:<24}{r["wall"]:>10.3f}{r["cpu"]:>10.3f}{r["peak_memory"] / 1e6:>11.1f}'
+              f'{r["wiki"]:>7}{r["sheets"]:>8}{change:>10}')
+
+
+def find_regressions(results, baseline, threshold: float):
+    return [stage for stage, r in results.items()
+            if stage in baseline and r["wall"] > baseline[stage]["wall"] * (1 + threshold)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", action="store_true",
+                        help="scrape the live wiki and sheet, saving everything as fixtures")
+    parser.add_argument("--creds_path", default=f"{ROOT}/credentials.json", type=str,
+                        help="service account credentials path (only needed with --record)")
+    parser.add_argument("--no-workers", default=16, type=int, help="number of workers for the character scraper")
+    parser.add_argument("--repeat", default=3, type=int, help="number of times to run the pipeline")
+    parser.add_argument("--threshold", default=0.2, type=float,
+                        help="maximum allowed slowdown in wall time per stage, relative to the baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="save the results of this run as the baseline")
+    args = parser.parse_args()
+
+    if args.record:
+        import sheets
+
+        util.get_content = _recording_get_content
+        service = RecordingService(sheets.build_service(args.creds_path))
+        print_results(run_pipeline(service, args.no_workers))
+        print(f'\nRecorded fixtures to {FIXTURES_DIR}')
+        return
+
+    util.get_content = _replay_get_content
+    service = ReplayService()
+
+    results = summarise([run_pipeline(service, args.no_workers) for _ in range(args.repeat)])
+
+    baseline = None
+    if os.path.exists(BASELINE_PATH) and not args.save_baseline:
+        with open(BASELINE_PATH, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+        print(f'\nSaved baseline to {BASELINE_PATH}')
+
+    elif baseline is not None:
+        regressions = find_regressions(results, baseline, args.threshold)
+
+        if regressions:
+            print(f'\nRegression (> {args.threshold * 100:.0f}% slower than baseline) in: {", ".join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
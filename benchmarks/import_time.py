@@ -0,0 +1,77 @@
+"""
+Import-time benchmark for the entry points.
+
+Runs each entry point's import in a fresh interpreter (with -X importtime) a number of times and reports the median
+wall time, as well as the slowest modules imported along the way. Useful for checking that heavy dependencies
+(Google API client, BeautifulSoup, Levenshtein, etc.) aren't being pulled in at start-up.
+
+Usage: python benchmarks/import_time.py [--runs 10] [--top 10] [--modules main scheduler]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(__file__, '../..'))
+SCRAPERS = os.path.join(ROOT, 'scrapers')
+
+
+def _env():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([SCRAPERS, ROOT, env.get('PYTHONPATH', '')])
+    return env
+
+
+def time_import(module: str, runs: int):
+    """ returns (median wall time in seconds, list of (cumulative us, module) from the last run) """
+    times = []
+    stderr = ""
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                              cwd=SCRAPERS, env=_env(), capture_output=True, text=True)
+        times.append(time.perf_counter() - start)
+        stderr = proc.stderr
+
+        if proc.returncode != 0:
+            raise RuntimeError(f'Unable to import {module}!\n{stderr}')
+
+    return statistics.median(times), _parse_importtime(stderr)
+
+
+def _parse_importtime(stderr: str):
+    modules = []
+
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, cumulative, name = line.removeprefix('import time:').split('|')
+        modules.append((int(cumulative.strip()), name.strip()))
+
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", default=10, type=int, help="number of fresh interpreters to time per module")
+    parser.add_argument("--top", default=10, type=int, help="number of slowest imports to show per module")
+    parser.add_argument("--modules", nargs="+", default=["main", "scheduler"], help="entry point modules to import")
+    args = parser.parse_args()
+
+    baseline, _ = time_import('sys', args.runs)
+    print(f'interpreter start-up: {baseline * 1000:.1f}ms')
+
+    for module in args.modules:
+        wall, modules = time_import(module, args.runs)
+        print(f'\n{module}: {wall * 1000:.1f}ms ({(wall - baseline) * 1000:.1f}ms over start-up)')
+
+        for cumulative, name in sorted(modules, reverse=True)[:args.top]:
+            print(f'    {cumulative / 1000:8.1f}ms  {name}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Generates the synthetic fixtures committed in benchmarks/fixtures, so the pipeline benchmark can be run straight away
+(without network access or credentials) and in CI.
+
+The wiki pages and spreadsheet are made up, but laid out like the real ones (the same tables, infoboxes, headings and
+cell positions the scrapers look for), with as many characters and universal perks as the pipeline searches for by
+default. The Sheets responses are recorded by running the pipeline against an in-memory spreadsheet, so they have
+exactly the ranges the scrapers ask for.
+
+Re-run this whenever the scrapers' requests change (e.g. a new range is fetched), or use bench_pipeline.py --record
+to replace the fixtures with the live wiki and sheet instead.
+
+Usage:
+    python benchmarks/make_fixtures.py
+"""
+import os
+import random
+import shutil
+
+import bench_pipeline
+from bench_pipeline import FIXTURES_DIR, KILLER, SURVIVOR, RecordingService
+
+import util
+import xlsx
+from scrapers import constants
+
+NO_CHARACTERS = 33  # one more than the pipeline searches for, so the search for "unknown" characters finds one
+NO_UNIVERSALS = 13
+
+ICON_BASE = "https://static.wikia.nocookie.net/deadbydaylight_gamepedia_en/images"
+
+TIER_COLOURS = [{"red": 0.22, "green": 0.46, "blue": 0.11}, {"red": 0.42, "green": 0.66, "blue": 0.31},
+                {"red": 0.95, "green": 0.76, "blue": 0.2}, {"red": 0.8, "green": 0.25, "blue": 0.25}]
+
+# perks transform_dicts moves to their own characters (see create_character_from in main.py)
+SPECIAL_PERKS = {
+    KILLER: {"All": ["Jolt", "Fearmonger", "Claustrophobia"]},
+    SURVIVOR: {"All": ["Guardian", "Kinship", "Renewal", "Situational Awareness", "Self-Aware", "Inner Healing"],
+               "David": ["Tenacity", "Detective's Hunch", "Stake Out"]},
+}
+
+
+def _icon(name: str) -> str:
+    file_name = name.replace(" ", "").replace("'", "")
+    return f'{ICON_BASE}/0/0a/{file_name}.png/revision/latest?cb=20230101000000'
+
+
+def _names(character_type: str):
+    """ (name on the wiki, name on the sheet) for each character """
+    if character_type == KILLER:
+        return [(f'The Killer{i:02d}', f'The Killer{i:02d}') for i in range(1, NO_CHARACTERS + 1)]
+
+    return [(f'Survivor{i:02d} Surname', f'Survivor{i:02d}') for i in range(1, NO_CHARACTERS + 1)]
+
+
+def _perk_name(character: str, i: int) -> str:
+    return f'{character} Perk {"ABC"[i]}'
+
+
+def _universal_names(character_type: str):
+    names = list(SPECIAL_PERKS[character_type]["All"])
+    names += [f'{character_type.capitalize()} Universal {i:02d}' for i in range(NO_UNIVERSALS - len(names))]
+
+    # one that's named slightly differently on the sheet, like the real ones (see generate_perk_discrepancies_dict)
+    return [(name, name.replace("Universal", "universal") if i == len(names) - 1 else name)
+            for i, name in enumerate(names)]
+
+
+# ---------------- WIKI --------------------
+def _page(title: str, body: str) -> str:
+    languages = "".join(f'<li class="interlanguage-link"><a href="https://deadbydaylight.fandom.com/{locale}/wiki/'
+                        f'{title.replace(" ", "_")}" hreflang="{locale}">{locale}</a></li>' for locale in ("de", "fr"))
+
+    return f'<!DOCTYPE html><html><head><title>{title} | Dead by Daylight Wiki</title></head><body>' \
+           f'<ul>{languages}</ul><main>{body}</main></body></html>'
+
+
+def _perk_row(name: str, character: str, rng: random.Random) -> str:
+    description = f'<p>Whenever you do something, your <a href="/wiki/Auras">Aura</a> reading ability is revealed ' \
+                  f'for <span style="color: #5eaf48">{rng.randint(4, 8)}</span>/<span style="color: #c7bb4c">' \
+                  f'{rng.randint(9, 12)}</span> seconds<span style="padding:0 2px"><a href="/wiki/File:Icon.png">' \
+                  f'<img src="{_icon("Icon")}"></a></span>.</p><ul><li>Some more detail about {name}.</li></ul>'
+
+    return f'<tr><th><a href="{_icon(f"IconPerks_{name}")}" class="image"><img src="{_icon(name)}"></a></th>' \
+           f'<th><a href="/wiki/{name.replace(" ", "_")}">{name}</a></th>' \
+           f'<th><a href="/wiki/{character.replace(" ", "_")}">{character}</a></th>' \
+           f'<td><div class="formattedPerkDesc">{description}</div></td></tr>'
+
+
+def _perks_page(character_type: str, rng: random.Random) -> str:
+    rows = []
+
+    for wiki_name, sheet_name in _names(character_type):
+        character = sheet_name.removeprefix("The ")
+        rows += [_perk_row(_perk_name(character, i), character, rng) for i in range(3)]
+
+    for character, perks in SPECIAL_PERKS[character_type].items():
+        rows += [_perk_row(perk, character, rng) for perk in perks if character != "All"]
+
+    rows += [_perk_row(wiki_name, ". All", rng) for wiki_name, _ in _universal_names(character_type)]
+
+    return _page(f'{character_type.capitalize()[:-1]} Perks',
+                 '<table class="wikitable sortable"><tr><th>Icon</th><th>Name</th><th>Character</th>'
+                 f'<th>Description</th></tr>{"".join(rows)}</table>')
+
+
+def _list_page(character_type: str) -> str:
+    ct_caps = character_type.capitalize()
+
+    characters = "".join(f'<div><div><a href="/wiki/{name.replace(" ", "_")}"><img src="{_icon(name)}"></a></div>'
+                         f'<div><a href="/wiki/{name.replace(" ", "_")}">{name}</a></div></div>'
+                         for name, _ in _names(character_type))
+
+    return _page(ct_caps, f'<h2><span class="mw-headline" id="List_of_{ct_caps}">List of {ct_caps}</span></h2>'
+                          f'<div class="charList">{characters}</div>')
+
+
+def _character_page(name: str, is_killer: bool, rng: random.Random) -> str:
+    killer_rows = '<tr><td class="titleColumn">Alias</td><td class="valueColumn">Some Former Name</td></tr>' \
+                  '<tr><td class="titleColumn">Height</td><td class="valueColumn">Tall</td></tr>' if is_killer else ""
+
+    infobox = f'<table class="infoboxtable"><tr><th class="center bold" colspan="2">{name}</th></tr>' \
+              f'<tr><th class="center charInfoboxImage" colspan="2"><a href="{_icon(f"{name}_Portrait")}">' \
+              f'<img src="{_icon(name)}"></a></th></tr>{killer_rows}</table>'
+
+    words = ["The", "fog", "rolled", "in", "and", "nobody", "came", "back"]
+    lore = "".join(f'<p><i>{" ".join(rng.choice(words) for _ in range(40))}</i></p>' for _ in range(4))
+
+    power = f'<h2><span class="mw-headline" id="Power:_Power_Of_{name.replace(" ", "_")}">Power: Power Of {name}' \
+            f'</span></h2><div><a href="{_icon(f"IconPower_{name}")}" class="image"><img></a></div>' \
+            f'<p>Hold the Power button to do something.</p><p>Release it to do something else.</p>' \
+            f'<div style="clear:both"></div>' if is_killer else ""
+
+    return _page(name, f'{infobox}<h2><span class="mw-headline" id="Overview">Overview</span></h2>'
+                       f'<p><a href="{_icon(f"{name}_Half")}" class="image"><img></a></p>'
+                       f'<h2><span class="mw-headline" id="Lore">Lore</span></h2>'
+                       f'<div><a href="{_icon(f"{name}_Full")}" class="image"><img></a></div>{lore}'
+                       f'<h2><span class="mw-headline" id="Load-out">Load-out</span></h2>{power}')
+
+
+def write_html(rng: random.Random):
+    pages = {}
+
+    for character_type in (KILLER, SURVIVOR):
+        ct_caps = character_type.capitalize()
+
+        pages[f'{constants.DBD_WIKI_BASE_LINK}{ct_caps[:-1]}_Perks'] = _perks_page(character_type, rng)
+        pages[f'{constants.DBD_WIKI_BASE_LINK}{ct_caps}'] = _list_page(character_type)
+
+        for name, _ in _names(character_type):
+            pages[f'{constants.DBD_WIKI_BASE_LINK}{name.replace(" ", "_")}'] = \
+                _character_page(name, character_type == KILLER, rng)
+
+    for url, page in pages.items():
+        path = bench_pipeline._html_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(page)
+
+
+# ---------------- SHEETS --------------------
+class GridService(xlsx.XlsxService):
+    """ an XlsxService for a spreadsheet that's already in memory (sheet name -> (col, row) -> cell) """
+
+    def __init__(self, grid):
+        self.path = "<synthetic>"
+        self.grid = grid
+        self.sheet_paths = {sheet_name: sheet_name for sheet_name in grid}  # i.e. the order of the sheets
+
+    def _sheet(self, sheet_name: str):
+        return self.grid.get(sheet_name, {})
+
+
+def _text(value: str, background: dict = None, borders: dict = None) -> dict:
+    cell = {"effectiveValue": {"stringValue": value}, "effectiveFormat": {"borders": borders} if borders else {},
+            "userEnteredFormat": {"backgroundColor": background or {}}}
+
+    if background is not None:
+        cell['userEnteredFormat']['backgroundColorStyle'] = {"rgbColor": background}
+
+    return cell
+
+
+def _fill(background: dict) -> dict:
+    return {"effectiveFormat": {},
+            "userEnteredFormat": {"backgroundColor": background, "backgroundColorStyle": {"rgbColor": background}}}
+
+
+def _character_cells(start, sheet_name: str, is_survivor: bool, rng: random.Random) -> dict:
+    character = sheet_name.removeprefix("The ")
+    cells = {start: _text(sheet_name), start + 9: _text("Base game", rng.choice(TIER_COLOURS))}
+
+    for i in range(3):
+        cells[(start >> 1) + 1 + i * 3] = _fill(rng.choice(TIER_COLOURS))
+        cells[(start >> 2) + 2 + i * 3] = _text(_perk_name(character, i), borders={"top": {"style": "SOLID"}}
+                                                if is_survivor and i == 0 else None)
+
+    if is_survivor:
+        cells |= {start + 10: _text("Average"), (start >> 1) + 10: _text("Quiet"), (start >> 2) + 10: _text("loud")}
+    else:
+        cells |= {start + 10: _text("4.6 m/s"), (start >> 2) + 10: _text("32m TR")}
+
+    return cells
+
+
+def build_grid(rng: random.Random) -> dict:
+    from cell import Cell
+    from otz_scraper import _get_next_character_start
+
+    grid = {}
+
+    for character_type, layout in ((KILLER, constants.KILLER_CONSTANTS), (SURVIVOR, constants.SURVIVOR_CONSTANTS)):
+        is_survivor = character_type == SURVIVOR
+        cells = {}
+
+        start = Cell(layout['character_col_start'], layout['start'])
+
+        for i, (_, sheet_name) in enumerate(_names(character_type)):
+            cells |= _character_cells(start, sheet_name, is_survivor, rng)
+            start = _get_next_character_start(start, i, layout['character_row_skip'], layout['col_skip'],
+                                              layout['characters_per_row'])
+
+        universal = Cell(layout['base_perks_start_col'], layout['base_perks_start_row'])
+
+        for i, (_, sheet_name) in enumerate(_universal_names(character_type)):
+            cells |= {universal + i: _fill(rng.choice(TIER_COLOURS)), (universal >> 1) + i: _text(sheet_name)}
+
+        cells |= {cell: {"effectiveValue": {"numberValue": 45123.0}} for cell in layout['misc'].values()}
+
+        guides = grid.setdefault(layout['guides_sheet_name'], {})
+
+        for i in range(2):
+            guide = layout['guides_start'] + i * layout['guides_row_skip']
+            guides |= {guide: _text(f'{character_type.capitalize()} guide {i + 1}'),
+                       guide + 1: _text("Watch on YouTube") | {"hyperlink": f'https://youtu.be/{character_type}{i}'}}
+
+        grid.setdefault(layout['sheet_name'], {}).update(cells)
+
+    # xlsx's (col, row), rather than Cell
+    return {sheet_name: {(cell.col, cell.row): value for cell, value in cells.items()}
+            for sheet_name, cells in grid.items()}
+
+
+def main():
+    for kind in ("html", "sheets"):
+        shutil.rmtree(os.path.join(FIXTURES_DIR, kind), ignore_errors=True)
+
+    rng = random.Random(0)  # the same fixtures every time
+
+    write_html(rng)
+
+    # the Sheets responses are recorded from the pipeline itself, so they're exactly what it asks for
+    util.get_content = bench_pipeline._replay_get_content
+    bench_pipeline.run_pipeline(RecordingService(GridService(build_grid(rng))), no_workers=4)
+
+    print(f'\nWrote synthetic fixtures to {FIXTURES_DIR}')
+
+
+if __name__ == "__main__":
+    main()
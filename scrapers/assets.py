@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+import util
+from metrics import METRICS
+
+ASSETS_DIR = f'{util.one_dir_up()}/out/assets'
+MANIFEST_PATH = f'{ASSETS_DIR}/manifest.json'
+
+# key in the output JSON -> max width / height (px) the front-end displays it at
+ASSET_SIZES = {
+    "icon": 128,
+    "image_half": 512,
+    "image_full": 1024,
+}
+
+WEBP_QUALITY = 85
+
+
+def mirror_assets(*outputs: Dict, no_workers: int = 16) -> Dict[str, str]:
+    """
+    Downloads every image referenced in the given outputs (perk / character / power icons and character images),
+    re-encodes them as WebP at the size the front-end uses them at, saves them to out/assets, then replaces the
+    remote (Fandom) URLs in the outputs with the local paths (relative to out/). Outputs are modified in place.
+
+    Images are stored by a hash of their content, so images that are the same (e.g. a perk's icon in both the perks
+    and spreadsheet outputs) are only stored once. The ETag for each image is kept in out/assets/manifest.json, so
+    images that haven't changed since the last run aren't downloaded or re-encoded again. Images that none of the
+    outputs refer to any more are removed from the manifest (and out/assets), so the outputs should be every output
+    that uses mirrored assets.
+
+    Downloads go through concurrency.FANDOM_LIMITER (the images are on Fandom's CDN), so it decides how many are
+    in-flight at once, along with everything else fetched from Fandom; no_workers is just the number of threads.
+
+    Requires Pillow; if it isn't installed, the outputs are left alone.
+
+    :return: A dictionary mapping (remote) URLs to local paths.
+    """
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        print("Pillow isn't installed, skipping mirroring assets!")
+        return {}
+
+    print("Starting mirroring assets...")
+
+    os.makedirs(ASSETS_DIR, exist_ok=True)
+    manifest = _load_manifest()
+
+    wanted = {}  # (url, size) pairs
+    mirrored = set()  # local paths, from outputs carried over from previous runs that were already mirrored
+    for output in outputs:
+        _collect_urls(output, wanted, mirrored)
+
+    urls = {url for url, _ in wanted}
+
+    with ThreadPoolExecutor(max_workers=no_workers) as executor:
+        results = dict(zip(urls, executor.map(lambda u: _download(u, manifest.get(u)), urls)))
+
+    local_paths = {}
+
+    for (url, size) in wanted:
+        entry = results[url]
+
+        if entry is None:  # couldn't download it, keep the remote URL
+            continue
+
+        manifest[url] = entry
+        local_paths[(url, size)] = _encode(entry, size)
+
+    for output in outputs:
+        _rewrite_urls(output, local_paths)
+
+    _prune(manifest, urls, mirrored)
+
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4)
+
+    return {url: path for (url, _), path in local_paths.items()}
+
+
+def source_urls() -> Dict[str, str]:
+    """
+    :return: local path (e.g. assets/<hash>_128.webp) -> the remote URL it was mirrored from, for every asset in the
+             manifest. Anything that needs the original (wiki) URL of an output that's already been mirrored (e.g.
+             characters carried over from a previous run) can look it up here.
+    """
+    sources = {}
+
+    for url, entry in _load_manifest().items():
+        for size in ASSET_SIZES.values():
+            sources[f'assets/{entry["sha256"][:16]}_{size}.webp'] = url
+
+    return sources
+
+
+def _prune(manifest: Dict, urls: set, mirrored: set):
+    """ removes the manifest entries (and their files) for every image that isn't referenced any more """
+    mirrored_hashes = {os.path.basename(path).split('_')[0] for path in mirrored}
+    stale = [url for url, entry in manifest.items()
+             if url not in urls and entry['sha256'][:16] not in mirrored_hashes]
+    hashes = {manifest.pop(url)['sha256'] for url in stale}
+
+    # the same image can be at more than one URL, and some of them may still be referenced
+    hashes -= {entry['sha256'] for entry in manifest.values()}
+
+    for sha256 in hashes:
+        paths = [_original_path(sha256)] + [f'{ASSETS_DIR}/{sha256[:16]}_{size}.webp' for size in ASSET_SIZES.values()]
+
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    if stale:
+        print(f'Removed {len(stale)} asset(s) that are no longer used.')
+
+
+def _load_manifest() -> Dict:
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+
+    with open(MANIFEST_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _is_remote(value) -> bool:
+    return isinstance(value, str) and value.startswith("http")
+
+
+def _collect_urls(obj, wanted: Dict, mirrored: set, key: str = None):
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            _collect_urls(v, wanted, mirrored, k)
+
+    elif isinstance(obj, list):
+        for v in obj:
+            _collect_urls(v, wanted, mirrored, key)
+
+    elif key in ASSET_SIZES and _is_remote(obj):
+        wanted[(obj, ASSET_SIZES[key])] = None
+
+    elif key in ASSET_SIZES and isinstance(obj, str) and obj.startswith("assets/"):
+        mirrored.add(obj)
+
+
+def _rewrite_urls(obj, local_paths: Dict):
+    if isinstance(obj, dict):
+        items = obj.items()
+    elif isinstance(obj, list):
+        items = enumerate(obj)
+    else:
+        return
+
+    for k, v in list(items):
+        if isinstance(v, (dict, list)):
+            _rewrite_urls(v, local_paths)
+
+        elif k in ASSET_SIZES and (v, ASSET_SIZES[k]) in local_paths:
+            obj[k] = local_paths[(v, ASSET_SIZES[k])]
+
+
+def _download(url: str, previous: Dict | None) -> Dict | None:
+    """
+    Downloads the image at url (unless it hasn't changed since last time), storing the original under its content
+    hash. Returns its manifest entry.
+    """
+    headers = {}
+    if previous is not None and previous.get('etag') and os.path.exists(_original_path(previous['sha256'])):
+        headers['If-None-Match'] = previous['etag']
+
+    try:
+        req = util.get_response(url, headers=headers)
+    except Exception as e:
+        print(f'Unable to download {url}! ({str(e)})')
+        return previous
+
+    if req.status_code == 304:
+        METRICS.inc("cache_hits_total", cache="assets")
+        return previous
+
+    if req.status_code != 200:
+        print(f'Unable to download {url}! (status={req.status_code})')
+        return previous
+
+    METRICS.inc("cache_misses_total", cache="assets")
+    METRICS.inc("asset_bytes_total", len(req.content))
+
+    sha256 = hashlib.sha256(req.content).hexdigest()
+    path = _original_path(sha256)
+
+    if not os.path.exists(path):
+        with open(path, 'wb') as f:
+            f.write(req.content)
+
+    return {"etag": req.headers.get('ETag'), "sha256": sha256}
+
+
+def _original_path(sha256: str) -> str:
+    return f'{ASSETS_DIR}/{sha256[:16]}.orig'
+
+
+def _encode(entry: Dict, size: int) -> str:
+    """ re-encodes the original image to WebP at the given size (if it hasn't been already), returning its path """
+    from PIL import Image
+
+    file_name = f'{entry["sha256"][:16]}_{size}.webp'
+    path = f'{ASSETS_DIR}/{file_name}'
+
+    if not os.path.exists(path):
+        with open(_original_path(entry['sha256']), 'rb') as f:
+            image = Image.open(io.BytesIO(f.read()))
+            image.thumbnail((size, size))  # only ever shrinks, keeps aspect ratio
+            image.save(path, 'WEBP', quality=WEBP_QUALITY)
+
+    return f'assets/{file_name}'
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import re
+from typing import Dict
+
+import util
+
+BUNDLE_DIR = f'{util.one_dir_up()}/out/bundle'
+
+CHARACTER_TYPES = ("killers", "survivors")
+
+
+def write_bundle(perks: Dict, characters: Dict, spreadsheets: Dict) -> Dict:
+    """
+    Writes the final JSON split up into small pieces for the front-end (in out/bundle), so it only has to download
+    what it's actually showing:
+
+    - index.json: Last updated, guides, the tier / availability palette, and a list of every character (name, icon,
+                  availability and the path of their shard).
+    - <character_type>/<name>.<hash>.json: Everything about one character (wiki info, wiki perks and spreadsheet
+                                           entry).
+    - <character_type>/universals.<hash>.json: Universal (base) perks, from both the wiki and spreadsheet.
+
+    Shards are named with a hash of their content, so they can be cached forever by the browser (only index.json
+    needs revalidating). Every file also gets precompressed .gz and .br (if brotli is installed) siblings, so a static
+    file server can serve them directly. Shards from before the previous run that are no longer used are removed (the
+    previous run's are kept, so a client that still has the old index can fetch what it points at).
+
+    :return: The index.
+    """
+    print("Starting writing front-end bundle...")
+
+    index = {
+        "last_updated": spreadsheets['last_updated'],
+        "guides": spreadsheets['guides'],
+        "palette": spreadsheets['palette'],
+    }
+
+    written = set()
+
+    for character_type in CHARACTER_TYPES:
+        sheet = spreadsheets[character_type]
+        index[character_type] = {"characters": {}}
+
+        for name, sheet_character in sheet['characters'].items():
+            shard = {
+                "character": characters[character_type].get(name, {}),
+                "perks": perks[character_type].get(name, {}),
+                "spreadsheet": sheet_character,
+            }
+
+            path = _write_shard(character_type, util.slugify(name), shard)
+            written.add(path)
+
+            index[character_type]['characters'][name] = {
+                "name": name,
+                "icon": sheet_character.get('icon', ""),
+                "availability": sheet_character.get('availability', {}),
+                "shard": path,
+            }
+
+        universals = {
+            "perks": perks[character_type].get('All', {}),
+            "spreadsheet": sheet['universals'],
+        }
+
+        path = _write_shard(character_type, "universals", universals)
+        written.add(path)
+        index[character_type]['universals'] = path
+
+    previous = _index_shards()
+
+    # written after the shards, so anything reading the bundle never sees an index pointing at shards that don't
+    # exist yet, and before removing any, so it never sees one pointing at shards that don't exist any more
+    _write_file("index.json", _encode(index))
+
+    _remove_stale(written | previous)
+
+    return index
+
+
+def _encode(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def _write_shard(character_type: str, name: str, shard: Dict) -> str:
+    content = _encode(shard)
+    path = f'{character_type}/{name}.{hashlib.sha256(content).hexdigest()[:12]}.json'
+
+    # same name = same content, so there's nothing to do if it's already there
+    if not os.path.exists(f'{BUNDLE_DIR}/{path}'):
+        _write_file(path, content)
+
+    return path
+
+
+def _write_file(path: str, content: bytes):
+    full_path = f'{BUNDLE_DIR}/{path}'
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+    for suffix, data in _compressed_variants(content):
+        tmp_path = f'{full_path}{suffix}.tmp'
+
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+
+        os.replace(tmp_path, f'{full_path}{suffix}')
+
+
+def _compressed_variants(content: bytes):
+    yield "", content
+    yield ".gz", gzip.compress(content, compresslevel=9, mtime=0)
+
+    try:
+        import brotli
+    except ImportError:
+        return
+
+    yield ".br", brotli.compress(content, quality=11)
+
+
+def _index_shards() -> set:
+    """ the shards the current index.json (i.e. the previous run's) points at """
+    try:
+        with open(f'{BUNDLE_DIR}/index.json', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return set()
+
+    shards = set()
+
+    for character_type in CHARACTER_TYPES:
+        entries = index.get(character_type, {})
+        shards.update(character['shard'] for character in entries.get('characters', {}).values())
+
+        if 'universals' in entries:
+            shards.add(entries['universals'])
+
+    return shards
+
+
+def _remove_stale(written: set):
+    for character_type in CHARACTER_TYPES:
+        type_dir = f'{BUNDLE_DIR}/{character_type}'
+
+        if not os.path.exists(type_dir):
+            continue
+
+        for file_name in os.listdir(type_dir):
+            base_name = re.sub(r'\.(gz|br)$', '', file_name)
+
+            if f'{character_type}/{base_name}' not in written:
+                os.remove(f'{type_dir}/{file_name}')
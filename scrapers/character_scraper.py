@@ -1,5 +1,7 @@
 import os
+import queue
 import threading
+import time
 import json
 
 from datetime import datetime
@@ -7,52 +9,38 @@ from typing import Dict
 
 from unidecode import unidecode
 
+import concurrency
+from journal import RunJournal, checkpointed
+import records
+import storage
 import util
+from metrics import METRICS
 from scrapers import constants
 
 
-def _build_survivor_json():
-    return {
-        "name": "",
-        "icon": "",
-        "image_half": "",
-        "image_full": "",
-        "wiki_link": "",
-        "lore": "",
-    }
-
-
-def _build_killer_json():
-    return {
-        "name": "",
-        "former_name": "",
-        "height": "",
-        "icon": "",
-        "image_half": "",
-        "image_full": "",
-        "wiki_link": "",
-        "power": {
-            "name": "",
-            "icon": "",
-            "desc": "",
-        },
-        "lore": "",
-    }
+CHARACTERS_LATEST = None
 
+# character list page url -> the same page on other language's wikis (see localisation.py)
+LANGUAGE_LINKS = {}
 
-CHARACTERS_LATEST = None
+# how many more times to try pages that failed to scrape
+PAGE_RETRIES = 2
 
 
-def scrape_characters_mt(character_type: str, no_workers: int, force_refresh: bool = False) -> Dict:
+def scrape_characters_mt(character_type: str, no_workers: int, force_refresh: bool = False,
+                         journal: RunJournal = None) -> Dict:
     """
-    Scrape perks, but using threads! Very simple threading here; work is allocated evenly and in-order
-    (eg. [job 1, job 2, job 3], no_threads=3 -> thread 1 gets job 1, thread 2 gets job 2, thread 3 gets job 3.)
+    Scrape perks, but using threads! Very simple threading here; workers take jobs (wiki links) off a shared queue
+    until there's none left. How many pages are being fetched at once is adjusted automatically by the wiki's limiter
+    (starting from no_workers, see concurrency.AIMDLimiter), so threads may be waiting on it.
 
     Character scrapers (each individual wiki link) takes a while to run (and are very unlikely to change between
     each run), so it's probably a good idea to check if any have already been scraped, so we're not repeating ourselves.
 
     There is basically no thread safety here, but given that every worker should be doing separate characters &
     contributing to the list separately with no shared data, I don't think this is much of an issue.
+
+    If a journal is given, each character is checkpointed as soon as it's scraped (and skipped if it already has been).
     """
     if no_workers == 1:
         return scrape_characters(character_type)
@@ -66,33 +54,152 @@ def scrape_characters_mt(character_type: str, no_workers: int, force_refresh: bo
     already_scraped_list, prev_characters = _generate_already_scraped_list(character_type, force_refresh)
 
     wiki_links = _scrape_wiki_links(url, ct_caps)
+    METRICS.inc("cache_hits_total", len([wl for wl in wiki_links if wl in already_scraped_list]), cache="characters")
     wiki_links = [wl for wl in wiki_links if wl not in already_scraped_list]
+    METRICS.inc("cache_misses_total", len(wiki_links), cache="characters")
     wiki_links = [(wl, i) for i, wl in enumerate(wiki_links)]
 
     if len(wiki_links) == 0:
         return {character_type: prev_characters}
 
-    work_allocs = util.divide_list(wiki_links, min(no_workers, len(wiki_links)))
-
     characters = [None] * len(wiki_links)
+    failed = {}  # wiki link -> (index, error)
 
-    def worker_func(_work_alloc, _characters):
-        for work in _work_alloc:
-            ch_info = _scrape_character(work[0], character_type)
-            characters[work[1]] = ch_info
+    def worker_func(_jobs, _characters):
+        while True:
+            try:
+                work = _jobs.get_nowait()
+            except queue.Empty:
+                return
 
-    workers = [threading.Thread(target=worker_func, args=(work_alloc, characters)) for work_alloc in
-               work_allocs]
+            # one page failing (e.g. its layout has changed) shouldn't take down the rest
+            try:
+                ch_info = checkpointed(journal, f'character:{work[0]}',
+                                       lambda: _scrape_character(work[0], character_type))
+            except Exception as e:
+                failed[work[0]] = (work[1], repr(e))
+                continue
 
-    [worker.start() for worker in workers]
-    [worker.join() for worker in workers]
+            failed.pop(work[0], None)
+            _characters[work[1]] = ch_info
 
-    characters = {ch['name']: ch for ch in characters}
+    to_scrape = wiki_links
+
+    for attempt in range(PAGE_RETRIES + 1):
+        if attempt > 0:
+            if not failed:
+                break
+
+            print(f"Retrying {len(failed)} failed {ct_caps} page(s) (attempt {attempt}/{PAGE_RETRIES})...")
+            time.sleep(2 ** attempt)
+            to_scrape = [(wl, idx) for wl, (idx, _) in failed.items()]
+
+        # there are enough workers for the most requests we'd ever want in-flight; how many actually are in-flight at
+        # once is decided by the limiter (see concurrency.AIMDLimiter)
+        jobs = queue.Queue()
+        [jobs.put(wl) for wl in to_scrape]
+
+        no_threads = min(max(no_workers, concurrency.FANDOM_LIMITER.max_limit), len(to_scrape))
+        workers = [threading.Thread(target=worker_func, args=(jobs, characters)) for _ in range(no_threads)]
+
+        [worker.start() for worker in workers]
+        [worker.join() for worker in workers]
+
+    print(f"Finished scraping Character Wiki for {ct_caps} (concurrency={concurrency.FANDOM_LIMITER.limit}).")
+
+    characters = {ch['name']: ch for ch in characters if ch is not None}
+    characters |= _fallback_to_previous(character_type, {wl: error for wl, (_, error) in failed.items()})
 
     # needs character_type: X to cross-reference old run
     return {character_type: prev_characters | characters}
 
 
+def _fallback_to_previous(character_type: str, failures: Dict[str, str]) -> Dict:
+    """
+    Prints a summary of every page that couldn't be scraped, and returns the previous run's entry for each of them (if
+    there is one), so one broken page doesn't mean losing that character from the output.
+
+    Only refreshes (force_refresh, i.e. --refresh-characters) have anything to fall back on: otherwise, characters
+    that were scraped before aren't scraped again at all, so the only pages that can fail are new characters' (or
+    ones whose previous entry was malformed, which isn't worth keeping).
+    """
+    if not failures:
+        return {}
+
+    _, previous = _generate_already_scraped_list(character_type, force_refresh=False)
+    previous = {ch['wiki_link']: ch for ch in previous.values() if 'wiki_link' in ch}
+
+    fallbacks = {}
+
+    print(f"Failed to scrape {len(failures)} {character_type.capitalize()} page(s):")
+
+    for wiki_link, error in failures.items():
+        if wiki_link in previous:
+            fallbacks[previous[wiki_link]['name']] = previous[wiki_link]
+
+        print(f"    {wiki_link}: {error} "
+              f"({'using previous run' if wiki_link in previous else 'no previous run to fall back on, skipping'})")
+
+    METRICS.inc("character_pages_failed_total", len(failures))
+    return fallbacks
+
+
+def scrape_characters_queued(character_type: str, queue_path: str, batch: str, no_workers: int,
+                             force_refresh: bool = False, poll_interval: float = 2.0) -> Dict:
+    """
+    Scrape characters using a shared work queue (see work_queue.WorkQueue), instead of just threads in this process.
+
+    Each wiki link is added to the queue as a job, and then jobs are worked on by no_workers threads in this process
+    plus any other worker processes on this machine (python worker.py --queue <path>), until every job is done (or
+    has failed). Jobs are grouped by batch, so re-running with the same batch only scrapes pages that haven't been
+    done yet (or that failed last time).
+
+    Same return as :func:`scrape_characters_mt`.
+    """
+    import worker
+    from work_queue import WorkQueue
+
+    ct_caps = character_type.capitalize()
+
+    print(f"Starting scraping Character Wiki for {ct_caps} (queue={queue_path}, batch={batch})...")
+
+    url = f"https://deadbydaylight.fandom.com/wiki/{ct_caps}"
+
+    already_scraped_list, prev_characters = _generate_already_scraped_list(character_type, force_refresh)
+
+    wiki_links = [wl for wl in _scrape_wiki_links(url, ct_caps) if wl not in already_scraped_list]
+
+    if len(wiki_links) == 0:
+        return {character_type: prev_characters}
+
+    work_queue = WorkQueue(queue_path)
+    payloads = [{"url": wl, "character_type": character_type} for wl in wiki_links]
+    work_queue.enqueue(batch, worker.CHARACTER_JOB, payloads)
+
+    # local workers keep going until every job's finished, not just until there's nothing left to claim, as a job
+    # claimed by another worker process that dies goes back to pending once its lease expires
+    stop = threading.Event()
+    local_workers = [threading.Thread(target=worker.run_worker, args=(queue_path, False, poll_interval),
+                                      kwargs={"batch": batch, "stop": stop}) for _ in range(no_workers)]
+    [local_worker.start() for local_worker in local_workers]
+
+    while (counts := work_queue.counts(batch)).get('pending', 0) + counts.get('claimed', 0) > 0:
+        time.sleep(poll_interval)
+
+    stop.set()
+    [local_worker.join() for local_worker in local_workers]
+
+    results = [result for payload, result in work_queue.results(batch, worker.CHARACTER_JOB)
+               if payload['character_type'] == character_type and payload['url'] in wiki_links]
+
+    failures = {payload['url']: error for payload, error in work_queue.failures(batch)
+                if payload['character_type'] == character_type}
+
+    characters = {ch['name']: ch for ch in results} | _fallback_to_previous(character_type, failures)
+
+    return {character_type: prev_characters | characters}
+
+
 def scrape_characters(character_type, force_refresh=False):
     already_scraped_list = _generate_already_scraped_list(character_type, force_refresh)
 
@@ -109,6 +216,7 @@ def scrape_characters(character_type, force_refresh=False):
 
 def _scrape_wiki_links(url, character_type):
     soup = util.get_content(url)
+    LANGUAGE_LINKS[url] = util.language_links(soup)
 
     # finds the header tag for "List of X", then finds the next div beyond that.
     character_name_div = soup.find('span', id=f'List_of_{character_type}').find_all_next('div')[0]
@@ -120,38 +228,39 @@ def _scrape_wiki_links(url, character_type):
 
 def _scrape_character(url, character_type):
     soup = util.get_content(url)
-    is_killer = character_type == "Killers"
+    is_killer = character_type.lower() == "killers"
 
-    info = _build_killer_json() if is_killer else _build_survivor_json()
     name, icon = _scrape_name_and_icon(soup)
-    info['name'] = unidecode(name).replace("The ", "")
-    info['icon'] = icon
-
     lore, image_full = _scrape_lore_and_image_full(soup)
 
-    info['lore'] = lore
-    info['image_full'] = image_full
-    info['wiki_link'] = url
-
-    info['image_half'] = util.strip_revision_from_url(soup.find('span', id='Overview').find_next('a')['href'])
+    info = {
+        "name": unidecode(name).replace("The ", ""),
+        "icon": icon,
+        "image_half": util.strip_revision_from_url(soup.find('span', id='Overview').find_next('a')['href']),
+        "image_full": image_full,
+        "wiki_link": url,
+        "lore": lore,
+    }
 
     if is_killer:
-        info = _scrape_killer(soup, info)
+        former_name, height, power = _scrape_killer(soup)
+        return records.build(records.Killer, **info, former_name=former_name, height=height, power=power)
 
-    return info
+    return records.build(records.Survivor, **info)
 
 
-def _scrape_killer(soup, info):
+def _scrape_killer(soup):
+    """ :return: (former name, height, power) """
     info_table = soup.find("table", class_="infoboxtable")
-    info['former_name'] = info_table.find('td', class_="valueColumn").text.strip()
-    info['height'] = info_table.find_all(lambda tag: tag.name == 'td' and tag.text.startswith("Height"))[0] \
+    former_name = info_table.find('td', class_="valueColumn").text.strip()
+    height = info_table.find_all(lambda tag: tag.name == 'td' and tag.text.startswith("Height"))[0] \
         .find_all_next('td', class_='valueColumn')[0].text.strip()
 
     power = []
     power_curr = soup.find('span', id=lambda v: v is not None and v.startswith("Power:_")).find_parent()
     power_icon_found = False
     power_icon = ""
-    info['power']['name'] = power_curr.text.split(": ")[1]
+    power_name = power_curr.text.split(": ")[1]
 
     while (power_curr := power_curr.find_next_sibling()).get('style') != "clear:both" and \
             power_curr.find('span', id='Power_Trivia') is None:
@@ -162,10 +271,7 @@ def _scrape_killer(soup, info):
         elif power_curr.name == 'p':
             power.append(power_curr.text.strip())
 
-    info['power']['icon'] = power_icon
-    info['power']['desc'] = "\n".join(power)
-
-    return info
+    return former_name, height, records.build(records.Power, name=power_name, icon=power_icon, desc="\n".join(power))
 
 
 def _scrape_name_and_icon(soup):
@@ -201,17 +307,60 @@ def _generate_already_scraped_list(character_type, force_refresh: bool):
 
     path = f'{util.one_dir_up()}/out/characters_LATEST.json'
 
+    # indexed lookup, rather than loading the whole of characters_LATEST.json (only if nothing's loaded it already,
+    # and the database is at least as new as the JSON)
+    if CHARACTERS_LATEST is None and storage.exists() and \
+            (not os.path.exists(path) or os.path.getmtime(storage.DB_PATH) >= os.path.getmtime(path)):
+        _, characters = storage.get_scraped_characters(storage.connect(), character_type)
+        characters = _drop_malformed(character_type, characters)
+
+        return [ch['wiki_link'] for ch in characters.values()], characters
+
     if not os.path.exists(path):
         return [], {}
 
     if CHARACTERS_LATEST is None:
         with open(path, encoding='utf-8') as f:
-            CHARACTERS_LATEST = json.load(f)
+            CHARACTERS_LATEST = {ct: _drop_malformed(ct, characters) for ct, characters in json.load(f).items()}
 
     return [ch['wiki_link'] for ch in CHARACTERS_LATEST[character_type].values() if 'wiki_link' in ch], \
            CHARACTERS_LATEST[character_type]
 
 
+def _drop_malformed(character_type: str, characters: Dict) -> Dict:
+    """
+    Checks each previously scraped character decodes as its record (see records.py); any that don't, or killers that
+    were saved without their power (which decode, but with an empty one), are left out, so they get scraped again
+    instead of being carried forward.
+    """
+    valid = {}
+
+    for name, character in characters.items():
+        path = f'{character_type}.{name}'
+
+        try:
+            records.decode(records.CHARACTER_RECORDS[character_type], character, path)
+
+            if character_type == "killers" and 'power' not in character:
+                raise records.RecordError(f'{path}: missing field "power" for Killer')
+        except records.RecordError as e:
+            print(f'Previously scraped character is malformed, it will be scraped again ({str(e)})')
+            continue
+
+        valid[name] = character
+
+    return valid
+
+
+def update_characters_latest(characters: Dict):
+    """
+    Replaces the in-memory copy of characters_LATEST.json, so long-running processes (i.e. the scheduler daemon) don't
+    have to re-read the file from disk after each run.
+    """
+    global CHARACTERS_LATEST
+    CHARACTERS_LATEST = characters
+
+
 if __name__ == "__main__":
     killer_characters = scrape_characters('Killers')
     survivor_characters = scrape_characters('Survivors')
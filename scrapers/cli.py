@@ -35,12 +35,46 @@ def main_parser() -> argparse.ArgumentParser:
                         help='the minimum amount of characters to search for on the Otz spreadsheet.')
     parser.add_argument("--min-universals", default=12, type=int,
                         help='the minimum amount of universal (base) perks to search for on the Otz spreadsheet.')
+    parser.add_argument("--sheets-quota", default=60, type=int,
+                        help='the Google Sheets API quota (reqs/min); all requests to the Sheets API are rate limited '
+                             'to stay within this.')
+    parser.add_argument("--sheet-xlsx", default=None, nargs='?', const="", type=str,
+                        help='read the Otz spreadsheet from an XLSX export instead of the Sheets API (no credentials '
+                             'or quota needed). on its own, the export is downloaded (in one request) to out/cache; '
+                             'given a path, that (already downloaded) file is used for Otz\'s spreadsheet.')
+    parser.add_argument("--sheets-config", default=None, type=str,
+                        help='path to a JSON file listing other spreadsheets / tabs to scrape alongside Otz\'s (e.g. '
+                             'community copies, or the Survivor Sound & Stealth tab), see otz_scraper.sheet_configs. '
+                             'all sheets are scraped at once, sharing --sheets-quota; each is saved as '
+                             'out/<name>_LATEST.json.')
 
     # ---------------- CHARACTER SCRAPER ARGS --------------------
+    # fetching from the wiki is I/O bound, so the number of requests in-flight is adjusted automatically
+    # (see concurrency.AIMDLimiter); no-workers is just where it starts.
     parser.add_argument("--no-workers", default=16, type=int,
-                        help='number of workers to use for character scraper. '
-                             'recommended amount is the number of cores you have (including hyper-threading); '
-                             'any more may cause slowdown!')
+                        help='initial number of concurrent requests to the wiki (used by the character scraper); '
+                             'this is adjusted automatically between --min-workers and --max-workers.')
+    parser.add_argument("--min-workers", default=1, type=int,
+                        help='the minimum number of concurrent requests to the wiki.')
+    parser.add_argument("--max-workers", default=32, type=int,
+                        help='the maximum number of concurrent requests to the wiki.')
+    parser.add_argument("--refresh-characters", action="store_true",
+                        help="Whether to scrape every character's page again (e.g. to pick up edits on the wiki), "
+                             "rather than only characters that haven't been scraped before. characters whose pages "
+                             "fail to scrape keep their entry from the previous run.")
+
+    parser.add_argument("--queue", default=None, type=str,
+                        help='path to a shared work queue (SQLite database, e.g. out/queue.db). if specified, '
+                             'character pages are scraped through the queue, so workers in other processes on this '
+                             'machine (python worker.py --queue <path>) can help.')
+    parser.add_argument("--queue-batch", default=None, type=str,
+                        help='name of the batch of jobs on the queue for this run (defaults to the current date). '
+                             'pages already done in the batch are not scraped again.')
+
+    parser.add_argument("--locales", default=[], type=lambda s: [locale.strip() for locale in s.split(',') if locale],
+                        help='comma separated list of other languages to scrape perk and character names (and perk '
+                             'descriptions) in, e.g. "de,fr,pt-br". each is saved to out/perks_<locale>_LATEST.json '
+                             'and out/characters_<locale>_LATEST.json, keyed by the English names.')
 
     # ---------------- SCRAPE ARGS --------------------
     parser.add_argument("--ignore-prepare-final-json", action="store_true",
@@ -53,6 +87,33 @@ def main_parser() -> argparse.ArgumentParser:
     parser.add_argument("--ignore-sheet-scraper", action="store_true",
                         help="Whether to scrape the Otzdarva spreadsheet")
 
+    parser.add_argument("--resume", action="store_true",
+                        help="Whether to resume the last run (if it didn't finish), skipping any perk pages, character "
+                             "pages and sheet sections it had already done.")
+
+    # ---------------- OUTPUT ARGS --------------------
+    parser.add_argument("--metrics", action="store_true",
+                        help="Whether to write timings, request counts and Sheets API quota usage for the run to "
+                             "out/metrics_LATEST.json and out/metrics_LATEST.prom (Prometheus text format).")
+    parser.add_argument("--mirror-assets", action="store_true",
+                        help="Whether to download every icon / image used in the final JSON files to out/assets "
+                             "(re-encoded as WebP), and point the final JSON files at them instead of the wiki. "
+                             "Requires Pillow.")
+    parser.add_argument("--sprite-atlas", action="store_true",
+                        help="Whether to pack every perk icon into sprite atlases (out/sprites), with a coordinate map "
+                             "keyed by perk name in out/sprites_LATEST.json. Requires Pillow.")
+    parser.add_argument("--sqlite", action="store_true",
+                        help="Whether to also store the final JSON in an (indexed) SQLite database, out/otz.db.")
+    parser.add_argument("--bundle", action="store_true",
+                        help="Whether to also write the final JSON as a small index plus one (content-hashed, "
+                             "precompressed) file per character in out/bundle, for the front-end.")
+    parser.add_argument("--static-site", action="store_true",
+                        help="Whether to also pre-render the killer / survivor info pages as static HTML in out/site "
+                             "(only the pages whose data has changed are re-rendered).")
+    parser.add_argument("--profile", action="store_true",
+                        help="Whether to profile each stage of the run (perks, characters, sheet, discrepancies, "
+                             "save), writing cProfile and collapsed stack (flame graph) files to out/profile.")
+
     return parser
 
 
@@ -67,6 +128,50 @@ def scheduler_parser():
     parser_.add_argument("--refresh-time", default=3, type=int,
                          help="The minimum time that has to have elapsed since the last run of this program, in days.")
 
+    # ---------------- DAEMON ARGS --------------------
+    parser_.add_argument("--daemon", action="store_true",
+                         help="Whether to keep the scheduler running, polling the 'Last Updated' cell on the sheet "
+                              "instead of exiting after one check.")
+    parser_.add_argument("--poll-interval", default=60, type=int,
+                         help="How often the daemon checks the sheet for updates, in minutes.")
+    parser_.add_argument("--poll-jitter", default=5, type=int,
+                         help="The maximum random delay added to each poll interval, in minutes.")
+
+    return parser_
+
+
+def server_parser():
+    parser_ = argparse.ArgumentParser(description="Serves the outputs of the latest run over HTTP.")
+    parser_.add_argument("--host", default="127.0.0.1", type=str, help="The address to serve on.")
+    parser_.add_argument("--port", default=8080, type=int, help="The port to serve on.")
+    parser_.add_argument("--reload-interval", default=30, type=int,
+                         help="How often to check for the outputs of a new run, in seconds.")
+
+    return parser_
+
+
+def worker_parser():
+    parser_ = argparse.ArgumentParser(description="Works on jobs from a shared work queue.")
+    parser_.add_argument("--queue", default=f"{util.one_dir_up()}/out/queue.db", type=str,
+                         help="path to the shared work queue (SQLite database).")
+    parser_.add_argument("--no-workers", default=4, type=int, help="number of worker threads.")
+    parser_.add_argument("--exit-when-empty", action="store_true",
+                         help="Whether to stop once there are no more jobs, instead of waiting for more.")
+    parser_.add_argument("--batch", default=None, type=str,
+                         help="only work on jobs from this batch (e.g. a run's --queue-batch), rather than any batch.")
+
+    return parser_
+
+
+def history_parser():
+    parser_ = argparse.ArgumentParser(description="Updates the history index over the archived spreadsheets, and "
+                                                  "shows how a perk's tier / a character has changed over time.")
+    parser_.add_argument("--perk", default=None, type=str, help="name of a perk to show the tier history of.")
+    parser_.add_argument("--character", default=None, type=str,
+                         help="name of a character to show the history of (availability and stats).")
+    parser_.add_argument("--rebuild", action="store_true",
+                         help="Whether to rebuild the index from the whole archive, rather than only adding new runs.")
+
     return parser_
 
 
@@ -78,3 +183,18 @@ def parse_main_args():
 def parse_scheduler_args():
     parser_ = scheduler_parser()
     return parser_.parse_args()
+
+
+def parse_server_args():
+    parser_ = server_parser()
+    return parser_.parse_args()
+
+
+def parse_worker_args():
+    parser_ = worker_parser()
+    return parser_.parse_args()
+
+
+def parse_history_args():
+    parser_ = history_parser()
+    return parser_.parse_args()
@@ -0,0 +1,104 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import METRICS
+
+
+class AIMDLimiter:
+    """
+    Limits the number of requests in-flight at once, adjusting the limit as it goes using AIMD (additive increase,
+    multiplicative decrease, i.e. the same thing TCP does for congestion control).
+
+    - Every time a full "window" of requests (the current limit) succeeds without slowing down, the limit goes up
+      by one.
+    - If we get throttled (429 / 503), or a request takes much longer than the fastest we've seen recently, the limit
+      is halved.
+
+    This means the number of concurrent requests should settle just below whatever the wiki is happy with, rather
+    than us having to guess it.
+    """
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 32, latency_tolerance: float = 3.0,
+                 name: str = "Fandom"):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = max(self.min_limit, min(initial, self.max_limit))
+        self.latency_tolerance = latency_tolerance
+        self.name = name
+
+        self.in_flight = 0
+        self.successes = 0
+        self.base_latency = None
+
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+
+            self.in_flight += 1
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def on_success(self, latency: float):
+        with self._condition:
+            # slowly forget the fastest latency, so one lucky request doesn't make everything look slow forever
+            self.base_latency = latency if self.base_latency is None \
+                else min(latency, self.base_latency * 1.05)
+
+            if latency > self.base_latency * self.latency_tolerance:
+                self._decrease("slow responses")
+                return
+
+            self.successes += 1
+
+            if self.successes >= self.limit and self.limit < self.max_limit:
+                self._set_limit(self.limit + 1, "increasing")
+
+    def on_throttle(self):
+        with self._condition:
+            self._decrease("throttled")
+
+    def _decrease(self, reason: str):
+        self._set_limit(max(self.min_limit, self.limit // 2), reason)
+
+    def _set_limit(self, limit: int, reason: str):
+        self.successes = 0
+
+        if limit == self.limit:
+            return
+
+        print(f'{self.name} concurrency: {self.limit} -> {limit} ({reason})')
+        self.limit = limit
+        METRICS.inc("concurrency_changes_total", limiter=self.name)
+        self._condition.notify_all()
+
+
+FANDOM_LIMITER = AIMDLimiter(initial=16)
+FANDOM_CONFIG = None
+
+
+def configure(initial: int, min_limit: int, max_limit: int):
+    """ replaces the wiki limiter, unless the config hasn't changed (so long-running processes keep what it learnt) """
+    global FANDOM_LIMITER, FANDOM_CONFIG
+
+    if FANDOM_CONFIG != (initial, min_limit, max_limit):
+        FANDOM_LIMITER = AIMDLimiter(initial=initial, min_limit=min_limit, max_limit=max_limit)
+        FANDOM_CONFIG = (initial, min_limit, max_limit)
+
+
+def backoff_sleep(attempt: int, retry_after: str = None):
+    try:
+        delay = float(retry_after) if retry_after is not None else 2 ** attempt
+    except ValueError:
+        delay = 2 ** attempt
+
+    time.sleep(min(delay, 60))
@@ -17,11 +17,13 @@ GLOBAL_CONSTANTS = {
 
 SURVIVOR_CONSTANTS = GLOBAL_CONSTANTS | {
     "sheet_name": "Survivor Info",
+    "guides_sheet_name": "Survivor Sound & Stealth",
 
     "start": 19,
     "character_row_skip": 12,
     "base_perks_start_col": 'W',
     "guides_start": Cell('D', 4),
+    "guides_row_skip": 4,
 
     "misc": util.BiDict({
 
@@ -30,11 +32,13 @@ SURVIVOR_CONSTANTS = GLOBAL_CONSTANTS | {
 
 KILLER_CONSTANTS = GLOBAL_CONSTANTS | {
     "sheet_name": "Killer Info",
+    "guides_sheet_name": "Killer Info",
 
     "start": 20,
     "character_row_skip": 13,
     "base_perks_start_col": 'V',
     "guides_start": Cell('N', 4),
+    "guides_row_skip": 3,
 
     "misc": util.BiDict({
         "last_updated": Cell('G', 4)
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import glob
+import json
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import cli
+import palette
+import util
+
+ARCHIVE_DIR = f'{util.one_dir_up()}/out/archive'
+INDEX_PATH = f'{util.one_dir_up()}/out/history_index.json'
+
+CHARACTER_TYPES = ("killers", "survivors")
+
+# everything about a character on the sheet that's tracked over time (other than their perks' tiers)
+CHARACTER_STATS = ("availability", "stealth", "noise", "cries", "movement_speed", "terror_radius")
+
+ARCHIVE_FILE_RE = re.compile(r'^(spreadsheet|killer_spreadsheet|survivor_spreadsheet)_(\d{2}-\d{2}-\d{4})\.json$')
+
+DATE_FORMAT = '%d-%m-%Y'
+
+
+def _empty_index() -> Dict:
+    return {
+        "files": {},
+        "last_date": None,
+        "perks": {character_type: {} for character_type in CHARACTER_TYPES},
+        "characters": {character_type: {} for character_type in CHARACTER_TYPES},
+    }
+
+
+def update_index(rebuild: bool = False) -> Dict:
+    """
+    Brings the history index (out/history_index.json) up to date with the spreadsheets in out/archive, only reading
+    the ones it hasn't seen before (i.e. normally just the run that's just been archived). The whole archive is only
+    re-read if rebuild, or an archived spreadsheet from before the last one indexed turns up (or changes).
+
+    Files are told apart by their size and modification time as well as their name, as a second run on the same day
+    (e.g. the scheduler with --force, or --resume) overwrites that day's archive. The last day's entries are then
+    replaced with the new run's.
+
+    The index holds, for every perk and character on the sheet, when each of their values changed:
+
+    {
+        files (dict): archive file already in the index -> its [size, modification time],
+        last_date (str): date of the latest run in the index,
+        perks: {<character_type>: {<perk name>: {character (str), tier: [[<date>, <tier name>], ...]}}},
+        characters: {<character_type>: {<name>: {<stat, e.g. availability>: [[<date>, <value>], ...]}}},
+    }
+
+    Each series only has an entry when the value changes (the first being when it was first seen), so it stays
+    small no matter how many runs there are.
+    """
+    index = _empty_index() if rebuild else load_index()
+
+    if isinstance(index['files'], list):  # from before files were fingerprinted
+        index = _empty_index()
+
+    runs = _archived_runs(index['files'])
+
+    if not runs:
+        return index
+
+    if index['last_date'] is not None and _parse_date(runs[0][0]) < _parse_date(index['last_date']):
+        print("Archive has spreadsheets from before the last one in the history index, rebuilding it...")
+        index = _empty_index()
+        runs = _archived_runs({})
+
+    if index['last_date'] is not None and runs[0][0] == index['last_date']:
+        # the last day's been run again; its files are read again (all of them, as the final spreadsheet is used
+        # over the per-type ones), so its entries are replaced rather than added to
+        _drop_date(index, index['last_date'])
+        runs[0] = (runs[0][0], [name for name, _ in _archive_files() if _date_of(name) == index['last_date']])
+
+    for date, files in runs:
+        for character_type, sheet, tiers in _read_run(files):
+            _add_sheet(index, date, character_type, sheet, tiers)
+
+        index['files'] |= {file_name: _fingerprint(file_name) for file_name in files}
+        index['last_date'] = date
+
+    util.write_atomic(INDEX_PATH, json.dumps(index, ensure_ascii=False, separators=(',', ':')))
+    print(f"Updated history index with {len(runs)} run(s) (up to {index['last_date']}).")
+
+    return index
+
+
+def load_index() -> Dict:
+    if not os.path.exists(INDEX_PATH):
+        return _empty_index()
+
+    with open(INDEX_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _parse_date(date: str) -> datetime:
+    return datetime.strptime(date, DATE_FORMAT)
+
+
+def _archive_files():
+    """ yields (file name, match) for every archived spreadsheet """
+    for path in glob.glob(f'{ARCHIVE_DIR}/*spreadsheet_*.json'):
+        file_name = os.path.basename(path)
+        match = ARCHIVE_FILE_RE.match(file_name)
+
+        if match is not None:
+            yield file_name, match
+
+
+def _date_of(file_name: str) -> str:
+    return ARCHIVE_FILE_RE.match(file_name).group(2)
+
+
+def _fingerprint(file_name: str) -> List[int]:
+    stat = os.stat(f'{ARCHIVE_DIR}/{file_name}')
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _archived_runs(seen: Dict[str, List[int]]) -> List[Tuple[str, List[str]]]:
+    """
+    :return: (date, [archive file names]) of every run with spreadsheets not in seen (or that have changed since they
+             were), oldest first
+    """
+    runs = {}
+
+    for file_name, match in _archive_files():
+        if seen.get(file_name) != _fingerprint(file_name):
+            runs.setdefault(match.group(2), []).append(file_name)
+
+    return sorted(runs.items(), key=lambda run: _parse_date(run[0]))
+
+
+def _drop_date(index: Dict, date: str):
+    """ removes every change on date from the index (which has to be the last date in it) """
+    for kind in ("perks", "characters"):
+        for entries in index[kind].values():
+            for name in list(entries):
+                series_by_key = {"tier": entries[name]['tier']} if kind == "perks" else entries[name]
+
+                for key, series in series_by_key.items():
+                    series[:] = [change for change in series if change[0] != date]
+
+                if not any(series_by_key.values()):  # first seen on date
+                    del entries[name]
+
+    index['files'] = {name: fingerprint for name, fingerprint in index['files'].items() if _date_of(name) != date}
+
+
+def _read_run(files: List[str]):
+    """
+    Yields (character type, sheet, tier palette) for each character type in the run's files. The final spreadsheet
+    (both types in one) is used over the per-type ones from the same run, if there is one.
+    """
+    final = [f for f in files if f.startswith("spreadsheet_")]
+
+    for file_name in final or files:
+        with open(f'{ARCHIVE_DIR}/{file_name}', encoding='utf-8') as f:
+            content = json.load(f)
+
+        tiers = content.get('palette', {}).get('tiers')
+
+        if file_name in final:
+            for character_type in CHARACTER_TYPES:
+                if character_type in content:
+                    yield character_type, content[character_type], tiers
+        else:
+            yield "killers" if file_name.startswith("killer") else "survivors", content, tiers
+
+
+def _add_sheet(index: Dict, date: str, character_type: str, sheet: Dict, tiers: List | None):
+    tier_palette = palette.Palette(palette.TIER_PALETTE)
+
+    def tier_name(tier) -> str:
+        if isinstance(tier, int):  # palette index (runs since the palette was added)
+            return tiers[tier]['name']
+        if isinstance(tier, str):  # hex (the earliest runs)
+            tier = dict(zip(("red", "green", "blue"), (int(tier[i:i + 2], 16) for i in (1, 3, 5))))
+
+        return tier_palette.entries[tier_palette.index_of(tier)]['name']
+
+    characters = sheet.get('characters', {})
+    universals = sheet.get('universals', {})
+
+    # perks / universals were lists in earlier runs, and dicts keyed by name since
+    for key, character in characters.items():
+        name = key.removeprefix("The ")
+        perks = character.get('perks', [])
+
+        for perk in (perks.values() if isinstance(perks, dict) else perks):
+            _add_perk(index, date, character_type, perk['name'], name, tier_name(perk['tier']))
+
+        series = index['characters'][character_type].setdefault(name, {})
+
+        for stat in CHARACTER_STATS:
+            if stat in character:
+                value = character[stat]
+                _add_change(series.setdefault(stat, []), date, value['value'] if isinstance(value, dict) else value)
+
+    for perk in (universals.values() if isinstance(universals, dict) else universals):
+        _add_perk(index, date, character_type, perk['name'], "All", tier_name(perk['tier']))
+
+
+def _add_perk(index: Dict, date: str, character_type: str, perk_name: str, character: str, tier: str):
+    entry = index['perks'][character_type].setdefault(perk_name, {"character": character, "tier": []})
+    entry['character'] = character
+    _add_change(entry['tier'], date, tier)
+
+
+def _add_change(series: List, date: str, value):
+    if not series or series[-1][1] != value:
+        series.append([date, value])
+
+
+# ---------------- QUERIES --------------------
+def perk_timeline(perk_name: str, index: Dict = None) -> Dict[str, List]:
+    """ :return: character type -> [[date, tier name], ...] for the perk (usually just the one character type) """
+    index = index if index is not None else load_index()
+    return {character_type: perks[perk_name]['tier'] for character_type, perks in index['perks'].items()
+            if perk_name in perks}
+
+
+def character_timeline(name: str, index: Dict = None) -> Dict[str, Dict[str, List]]:
+    """ :return: character type -> stat -> [[date, value], ...] for the character """
+    index = index if index is not None else load_index()
+    return {character_type: characters[name] for character_type, characters in index['characters'].items()
+            if name in characters}
+
+
+if __name__ == "__main__":
+    args = cli.parse_history_args()
+    history = update_index(rebuild=args.rebuild)
+
+    if args.perk is not None:
+        util.pretty_print(perk_timeline(args.perk, history))
+
+    if args.character is not None:
+        util.pretty_print(character_timeline(args.character, history))
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from typing import Callable
+
+import util
+
+JOURNAL_PATH = f'{util.one_dir_up()}/out/journal_LATEST.jsonl'
+
+
+class RunJournal:
+    """
+    Keeps track of every unit of work (perk page, character page, sheet section) finished in the current run, along
+    with its result, so that if the run dies partway through it can be resumed (with --resume) without redoing them.
+
+    The journal is a JSON lines file; the first line is the run's date, then one line per finished unit. It's
+    appended to (and flushed) as soon as each unit finishes, and removed once the run is done.
+    """
+
+    def __init__(self, current_date: str, resume: bool = False, path: str = JOURNAL_PATH):
+        self.path = path
+        self.current_date = current_date
+        self.completed = {}
+        self._lock = threading.Lock()
+
+        if resume and os.path.exists(path):
+            self._load()
+            print(f'Resuming run from {self.current_date} ({len(self.completed)} units already done)...')
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({"run": current_date}) + "\n")
+
+    def _load(self):
+        with open(self.path, encoding='utf-8') as f:
+            for i, line in enumerate(f):
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:  # the last line may be half written if we died whilst writing it
+                    continue
+
+                if i == 0:
+                    self.current_date = entry['run']
+                else:
+                    self.completed[entry['unit']] = entry['result']
+
+    def get(self, unit: str):
+        return self.completed.get(unit)
+
+    def checkpoint(self, unit: str, result):
+        line = json.dumps({"unit": unit, "result": result}, ensure_ascii=False) + "\n"
+
+        with self._lock:
+            self.completed[unit] = result
+
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def finish(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def checkpointed(journal: RunJournal | None, unit: str, func: Callable):
+    """ returns the result of unit from the journal if it's already been done, otherwise runs func and records it """
+    if journal is None:
+        return func()
+
+    if unit in journal.completed:
+        return journal.get(unit)
+
+    result = func()
+    journal.checkpoint(unit, result)
+    return result
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from urllib.parse import urljoin
+
+import character_scraper
+import perk_scraper
+import util
+from journal import RunJournal, checkpointed
+from scrapers import constants
+
+CHARACTER_TYPES = ("killers", "survivors")
+
+# if fewer than this fraction of the English perks / characters are matched on a locale's page, something's wrong
+# (e.g. the page layout's changed), rather than the locale just missing a few
+MIN_MATCH_RATE = 0.5
+
+
+def scrape_locales(locales: List[str], perks: Dict, characters: Dict, no_workers: int,
+                   journal: RunJournal = None) -> Dict[str, Dict]:
+    """
+    Scrapes the perk and character list pages of the wiki in each of the given languages (e.g. "de", "fr", "pt-br"),
+    found through the language links on the English pages.
+
+    Every page (for every locale) is fetched at once, through the same session and concurrency.FANDOM_LIMITER as
+    the other scrapers, so each extra locale adds a few more requests in-flight rather than another full run. The
+    English pages' language links are kept from when they were scraped, so they aren't fetched again.
+
+    Perks and characters are matched up with the English ones by their icon (the file names are the same on every
+    wiki, unlike the names), and keyed by their English name. Icons that have already been mirrored (see assets.py,
+    e.g. characters carried over from a previous run) are matched by the wiki URL they were mirrored from.
+
+    Localisations are optional, so they never stop the rest of the run: if a page can't be scraped, or less than
+    MIN_MATCH_RATE of the perks / characters on it could be matched (i.e. the page layout's probably changed), it's
+    logged and that locale's perks / characters are left out (rather than saved with only some character types).
+
+    :param perks: English perks ({character_type: {character: {perk name: perk}}})
+    :param characters: English characters ({character_type: {name: character}})
+
+    :return: A dictionary of localised perks and characters in the following format:
+    {
+        <locale> (str): {
+            perks: {<character_type> (str): {<english perk name> (str): {name, description, description_raw}}},
+            characters: {<character_type> (str): {<english name> (str): {name, wiki_link}}},
+        }
+    }
+    (either of perks / characters is missing if it couldn't be scraped)
+    """
+    print(f"Starting scraping Wiki for locales {', '.join(locales)}...")
+
+    english_urls = {("perks", ct): perk_scraper._get_url(ct) for ct in CHARACTER_TYPES if perks.get(ct)} | \
+                   {("characters", ct): f'{constants.DBD_WIKI_BASE_LINK}{ct.capitalize()}' for ct in CHARACTER_TYPES
+                    if characters.get(ct)}
+
+    import assets
+    sources = assets.source_urls()
+
+    with ThreadPoolExecutor(max_workers=no_workers) as executor:
+        language_links = dict(zip(english_urls.keys(), executor.map(_get_language_links, english_urls.values())))
+
+        jobs = {}
+
+        for locale in locales:
+            for (kind, character_type), links in language_links.items():
+                if locale not in links:
+                    print(f"No {locale} version of {english_urls[(kind, character_type)]}, skipping...")
+                    continue
+
+                scrape = _scrape_perks if kind == "perks" else _scrape_characters
+                english = perks[character_type] if kind == "perks" else characters[character_type]
+
+                # default args, so each job gets its own (rather than the loop's last) values
+                jobs[(locale, kind, character_type)] = executor.submit(
+                    checkpointed, journal, f'locale:{locale}:{kind}:{character_type}',
+                    lambda _scrape=scrape, _url=links[locale], _english=english: _scrape(_url, _english, sources))
+
+        localised = {locale: {"perks": {}, "characters": {}} for locale in locales}
+
+        for (locale, kind, character_type), job in jobs.items():
+            try:
+                result = job.result()
+            except Exception as e:
+                print(f'Unable to scrape {locale} {character_type} {kind}, leaving them out! ({str(e)})')
+                localised[locale][kind] = None
+                continue
+
+            if localised[locale][kind] is not None:
+                localised[locale][kind][character_type] = result
+
+        localised = {locale: {kind: outputs for kind, outputs in kinds.items() if outputs is not None}
+                     for locale, kinds in localised.items()}
+
+    print(f"Finished scraping Wiki for locales {', '.join(locales)}.")
+    return localised
+
+
+def _get_language_links(url: str) -> Dict[str, str]:
+    links = perk_scraper.LANGUAGE_LINKS.get(url, character_scraper.LANGUAGE_LINKS.get(url))
+
+    if links is not None:
+        return links
+
+    try:
+        return util.language_links(util.get_content(url))
+    except Exception as e:
+        print(f'Unable to get the other languages of {url}! ({str(e)})')
+        return {}
+
+
+def _wiki_icon(icon: str, sources: Dict[str, str]) -> str:
+    return sources.get(icon, icon)
+
+
+def _scrape_perks(url: str, english_perks: Dict, sources: Dict[str, str]) -> Dict:
+    english_names = {util.image_name(_wiki_icon(perk['icon'], sources)): name
+                     for character_perks in english_perks.values() for name, perk in character_perks.items()}
+
+    perks = {}
+
+    for _, perk in perk_scraper._scrape_perk_table(util.get_content(url), util.wiki_base_link(url)):
+        english_name = english_names.get(util.image_name(perk['icon']))
+
+        if english_name is not None:
+            perks[english_name] = {key: perk[key] for key in ("name", "description", "description_raw")}
+
+    _report(url, "perks", len(perks), len(english_names))
+    return perks
+
+
+def _scrape_characters(url: str, english_characters: Dict, sources: Dict[str, str]) -> Dict:
+    english_names = {util.image_name(_wiki_icon(character['icon'], sources)): name
+                     for name, character in english_characters.items()}
+
+    characters = {}
+
+    # the list page links to each character with their portrait, which is the same image as their icon
+    for a in util.get_content(url).find_all('a', href=True):
+        img = a.find('img')
+
+        if img is None or not a.get('title'):
+            continue
+
+        image = img.get('data-image-name') or img.get('data-src') or img.get('src', "")
+        english_name = english_names.get(util.image_name(image))
+
+        if english_name is not None and english_name not in characters:
+            href = urljoin(constants.DBD_WIKI_BASE_LINK, a['href'])  # relative to the wiki's root, e.g. /de/wiki/...
+            characters[english_name] = {"name": a['title'], "wiki_link": href}
+
+    _report(url, "characters", len(characters), len(english_names))
+    return characters
+
+
+def _report(url: str, kind: str, matched: int, total: int):
+    if total and matched / total < MIN_MATCH_RATE:
+        raise ValueError(f'Only matched {matched}/{total} {kind} on {url}, so they can\'t be matched up with the '
+                         f'English ones any more (has the page layout changed?)')
+
+    if matched < total:
+        print(f"Only matched {matched}/{total} {kind} on {url} (the rest are left in English)")
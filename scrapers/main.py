@@ -1,24 +1,24 @@
 from __future__ import annotations
 
-import argparse
-import json
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Tuple
 
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-
-from Levenshtein import distance
-
+import concurrency
+import metrics
+import palette
+import profiling
 import util
-from character_scraper import scrape_characters_mt
-from otz_scraper import scrape_otz
-from perk_scraper import scrape_perks
+from journal import RunJournal, checkpointed
+from metrics import METRICS
 
 from scrapers import constants, cli
 
 KILLER, SURVIVOR = "killers", "survivors"
 
+# (sheet perks, wiki perks) -> discrepancies. perk names barely ever change between runs, so long-running processes
+# (i.e. the scheduler daemon) can skip re-doing all the Levenshtein comparisons.
+PERK_DISCREPANCIES_CACHE = {}
+
 
 # # differences in names between Otz's spreadsheet and the Wiki.
 # SPREADSHEET_TO_WIKI_DISCREPANCIES = util.BiDict({
@@ -47,6 +47,9 @@ def scrape_all(args=None, current_date=None, sheets_service=None):
 
     The spreadsheet in question can be found here: https://otzdarva.com/spreadsheet
     (or here: https://docs.google.com/spreadsheets/d/1uk0OnioNZgLly_Y9pZ1o0p3qYS9-mpknkv3DlkXAxGA/edit#gid=806953)
+
+    Each scraper (and its dependencies) is only imported if it's actually going to run, which keeps start-up quick
+    when some of them are ignored.
     """
     if args is None:
         args = cli.parse_main_args()
@@ -54,6 +57,15 @@ def scrape_all(args=None, current_date=None, sheets_service=None):
     if current_date is None:
         current_date = datetime.now().strftime('%d-%m-%Y')
 
+    # if resuming, this carries on with the date of the run being resumed
+    run_journal = RunJournal(current_date, resume=args.resume)
+    current_date = run_journal.current_date
+
+    if args.profile:
+        profiling.enable()
+
+    concurrency.configure(args.no_workers, args.min_workers, args.max_workers)
+
     prepare_final_json = not args.ignore_prepare_final_json
 
     # needs to be True to have enough information to prepare final JSONs (if that's what you want to do)
@@ -73,47 +85,184 @@ def scrape_all(args=None, current_date=None, sheets_service=None):
     survivor_spreadsheet = {}
 
     if should_scrape_perks:
-        killer_perks = scrape_perks(KILLER)
-        survivor_perks = scrape_perks(SURVIVOR)
+        from perk_scraper import scrape_all_perks
+        from search_index import build_search_index
+
+        with METRICS.timed("stage_seconds", stage="perks"), profiling.stage("perks"):
+            # both pages are crawled at once; any already done by the run being resumed aren't crawled again
+            remaining = [ct for ct in (KILLER, SURVIVOR) if f'perks:{ct}' not in run_journal.completed]
+            scraped_perks = scrape_all_perks(remaining) if remaining else {}
+
+            killer_perks = checkpointed(run_journal, f'perks:{KILLER}', lambda: scraped_perks[KILLER])
+            survivor_perks = checkpointed(run_journal, f'perks:{SURVIVOR}', lambda: scraped_perks[SURVIVOR])
 
         if not prepare_final_json:
             util.save_json("perks", survivor_perks | killer_perks, current_date)
+            util.save_json("perks_search", build_search_index(killer_perks, survivor_perks), None)
 
     if should_scrape_characters:
-        killer_characters = scrape_characters_mt(KILLER, no_workers=args.no_workers)
-        survivor_characters = scrape_characters_mt(SURVIVOR, no_workers=args.no_workers)
+        from character_scraper import scrape_characters_mt, scrape_characters_queued
+
+        with METRICS.timed("stage_seconds", stage="characters"), profiling.stage("characters"):
+            if args.queue is not None:
+                batch = args.queue_batch or current_date
+
+                killer_characters = scrape_characters_queued(KILLER, args.queue, batch, no_workers=args.no_workers,
+                                                             force_refresh=args.refresh_characters)
+                survivor_characters = scrape_characters_queued(SURVIVOR, args.queue, batch, no_workers=args.no_workers,
+                                                               force_refresh=args.refresh_characters)
+            else:
+                killer_characters = scrape_characters_mt(KILLER, no_workers=args.no_workers,
+                                                         force_refresh=args.refresh_characters, journal=run_journal)
+                survivor_characters = scrape_characters_mt(SURVIVOR, no_workers=args.no_workers,
+                                                           force_refresh=args.refresh_characters, journal=run_journal)
 
         if not prepare_final_json:
             util.save_json("characters", survivor_characters | killer_characters, current_date)
 
     if should_scrape_sheet:
-        if sheets_service is None:
-            credentials = Credentials.from_service_account_file(args.creds_path)
-            sheets_service = build('sheets', 'v4', credentials=credentials)
+        import sheets
+        from otz_scraper import scrape_sheets, sheet_configs
+
+        if args.sheet_xlsx is not None:
+            import xlsx
 
-        killer_spreadsheet = scrape_otz(sheets_service, otz_spreadsheet_id, KILLER,
-                                        args.min_characters, args.min_universals)
+            # one export per spreadsheet; a given file is Otz's, any others (from --sheets-config) are downloaded
+            xlsx_services = {}
+
+            def service_for(spreadsheet_id):
+                if spreadsheet_id not in xlsx_services:
+                    path = args.sheet_xlsx if args.sheet_xlsx and spreadsheet_id == otz_spreadsheet_id else None
+                    xlsx_services[spreadsheet_id] = xlsx.load_service(path, spreadsheet_id)
+
+                return xlsx_services[spreadsheet_id]
+        else:
+            if sheets_service is None:
+                sheets_service = sheets.build_service(args.creds_path)
 
-        survivor_spreadsheet = scrape_otz(sheets_service, otz_spreadsheet_id, SURVIVOR,
-                                          args.min_characters, args.min_universals)
+            def service_for(_):
+                return sheets_service
+
+        sheets.configure(args.sheets_quota)
+        sheets.start_run()
+
+        with METRICS.timed("stage_seconds", stage="sheet"), profiling.stage("sheet"):
+            scraped_sheets = scrape_sheets(service_for, sheet_configs(args.sheets_config), args.min_characters,
+                                           args.min_universals, journal=run_journal)
+
+        print(sheets.quota_report())
+
+        killer_spreadsheet = scraped_sheets.pop("killer_spreadsheet")
+        survivor_spreadsheet = scraped_sheets.pop("survivor_spreadsheet")
+
+        # any other sheets (from --sheets-config) are saved as they are, whether or not the final JSON's being made
+        for name, sheet in scraped_sheets.items():
+            util.save_json(name, sheet, current_date)
 
         if not prepare_final_json:
             util.save_json("killer_spreadsheet", killer_spreadsheet, current_date)
             util.save_json("survivor_spreadsheet", survivor_spreadsheet, current_date)
+            update_history()
+
+    if args.locales and not prepare_final_json:
+        scrape_localisations(args, {KILLER: killer_perks, SURVIVOR: survivor_perks},
+                             killer_characters | survivor_characters, current_date, run_journal)
 
     if prepare_final_json:
-        perks, chars, spreadsheets = transform_dicts(survivor_perks=survivor_perks,
-                                                          survivor_characters=survivor_characters,
-                                                          survivor_spreadsheet=survivor_spreadsheet,
-                                                          killer_perks=killer_perks,
-                                                          killer_characters=killer_characters,
-                                                          killer_spreadsheet=killer_spreadsheet,
-                                                          current_date=current_date)
+        with METRICS.timed("stage_seconds", stage="transform"):
+            perks, chars, spreadsheets = transform_dicts(survivor_perks=survivor_perks,
+                                                         survivor_characters=survivor_characters,
+                                                         survivor_spreadsheet=survivor_spreadsheet,
+                                                         killer_perks=killer_perks,
+                                                         killer_characters=killer_characters,
+                                                         killer_spreadsheet=killer_spreadsheet,
+                                                         current_date=current_date)
+
+        with METRICS.timed("stage_seconds", stage="palette"):
+            spreadsheets = palette.apply_palette(spreadsheets)
+
+        # before mirroring assets, as perks / characters are matched up between languages by their (wiki) icons
+        # (already mirrored ones, from previous runs, are looked up in the assets manifest)
+        if args.locales:
+            scrape_localisations(args, perks, chars, current_date, run_journal)
+
+        if args.mirror_assets:
+            import assets
+
+            with METRICS.timed("stage_seconds", stage="assets"):
+                assets.mirror_assets(perks, chars, spreadsheets, no_workers=args.max_workers)
+
+        sprite_map, stale_atlases = None, set()
+
+        if args.sprite_atlas:
+            import sprites
 
-        util.save_json('perks', perks, current_date)
-        util.save_json('characters', chars, current_date)
-        util.save_json('spreadsheet', spreadsheets, current_date)
-        util.save_json('last_updated', spreadsheets['last_updated'], None)
+            with METRICS.timed("stage_seconds", stage="sprites"):
+                sprite_map, stale_atlases = sprites.generate_perk_atlases(spreadsheets, no_workers=args.max_workers)
+
+        with METRICS.timed("stage_seconds", stage="save"), profiling.stage("save"):
+            util.save_json('perks', perks, current_date)
+            util.save_json('perks_search', build_search_index(perks[KILLER], perks[SURVIVOR]), None)
+            util.save_json('characters', chars, current_date)
+            util.save_json('spreadsheet', spreadsheets, current_date)
+            util.save_json('last_updated', spreadsheets['last_updated'], None)
+
+            if sprite_map:
+                util.save_json('sprites', sprite_map, None)
+
+        # only once the new map's been saved, as the old one points at them
+        if stale_atlases:
+            sprites.remove_atlases(stale_atlases)
+
+        update_history()
+
+        if args.sqlite:
+            import storage
+
+            with METRICS.timed("stage_seconds", stage="sqlite"):
+                storage.save_run(storage.connect(), perks, chars, spreadsheets, current_date)
+
+        if args.bundle:
+            import bundle
+
+            with METRICS.timed("stage_seconds", stage="bundle"):
+                bundle.write_bundle(perks, chars, spreadsheets)
+
+        if args.static_site:
+            import static_site
+
+            with METRICS.timed("stage_seconds", stage="static_site"), profiling.stage("static_site"):
+                static_site.render_site(perks, chars, spreadsheets)
+
+        from character_scraper import update_characters_latest
+        update_characters_latest(chars)
+
+    run_journal.finish()
+
+    if args.metrics:
+        metrics.save()
+
+    profiling.save()
+
+
+def update_history():
+    """ adds the spreadsheet that's just been archived to the history index (see history.py) """
+    import history
+
+    with METRICS.timed("stage_seconds", stage="history"):
+        history.update_index()
+
+
+def scrape_localisations(args, perks: dict, characters: dict, current_date, run_journal: RunJournal):
+    """ scrapes perks and characters from the wiki in each of args.locales, saved as <perks|characters>_<locale> """
+    from localisation import scrape_locales
+
+    with METRICS.timed("stage_seconds", stage="localisation"), profiling.stage("localisation"):
+        localised = scrape_locales(args.locales, perks, characters, no_workers=args.max_workers, journal=run_journal)
+
+    for locale, outputs in localised.items():
+        for kind, output in outputs.items():  # perks / characters (unless they couldn't be scraped)
+            util.save_json(f'{kind}_{locale}', output, current_date)
 
 
 def transform_dicts(survivor_perks: dict, survivor_characters: dict, survivor_spreadsheet: dict,
@@ -155,7 +304,8 @@ def transform_dicts(survivor_perks: dict, survivor_characters: dict, survivor_sp
     wiki_perks = set(util.flatten_list([list(ch.keys()) for ch in survivor_perks.values()] +
                                        [list(ch.keys()) for ch in killer_perks.values()]))
 
-    perk_discrepancies = generate_perk_discrepancies_dict(sheet_perks, wiki_perks)
+    with profiling.stage("discrepancies"):
+        perk_discrepancies = generate_perk_discrepancies_dict(sheet_perks, wiki_perks)
 
     new_survivor_characters = {SURVIVOR: {}}
 
@@ -195,6 +345,16 @@ def generate_perk_discrepancies_dict(sheet_perks, wiki_perks):
     This generates a dictionary mapping names in the sheet to names in the Wiki for any that aren't exactly the same
     using Levenshtein distance (see here: https://en.wikipedia.org/wiki/Levenshtein_distance).
     """
+    from Levenshtein import distance
+
+    cache_key = (frozenset(sheet_perks), frozenset(wiki_perks))
+
+    if cache_key in PERK_DISCREPANCIES_CACHE:
+        METRICS.inc("cache_hits_total", cache="perk_discrepancies")
+        return PERK_DISCREPANCIES_CACHE[cache_key]
+
+    METRICS.inc("cache_misses_total", cache="perk_discrepancies")
+
     discrepancies = {}
 
     for sheet_perk in sheet_perks:
@@ -213,6 +373,7 @@ def generate_perk_discrepancies_dict(sheet_perks, wiki_perks):
 
         wiki_perks.discard(best_match)  # get rid of it from wiki perks bc we already have a match
 
+    PERK_DISCREPANCIES_CACHE[cache_key] = discrepancies
     return discrepancies
 
 
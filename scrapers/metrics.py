@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+import util
+
+PREFIX = "otz_scraper"
+
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, math.inf)
+
+SHEETS_QUOTA_PER_MINUTE = 60
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+
+        for i, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                self.counts[i] += 1
+                break
+
+    def cumulative_counts(self):
+        total = 0
+        for count in self.counts:
+            total += count
+            yield total
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": {("+Inf" if math.isinf(b) else b): c for b, c in zip(self.buckets, self.cumulative_counts())}
+        }
+
+
+class Metrics:
+    """
+    Very small metrics registry (counters and latency histograms, with labels), which can be exported as JSON or in
+    the Prometheus text format.
+
+    Sheets API calls are also timestamped, so we can see the most calls made within any one minute compared to the
+    quota (see cli.main_parser for more info on the quota).
+    """
+
+    def __init__(self, sheets_quota_per_minute: int = SHEETS_QUOTA_PER_MINUTE):
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Tuple], float] = {}
+        self.histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+
+        self.sheets_quota_per_minute = sheets_quota_per_minute
+        self._sheets_calls = deque()
+        self.sheets_peak_calls_per_minute = 0
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+
+        with self._lock:
+            self.histograms.setdefault(key, Histogram()).observe(value)
+
+    @contextmanager
+    def timed(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def record_sheets_call(self):
+        now = time.monotonic()
+        self.inc("sheets_requests_total")
+
+        with self._lock:
+            self._sheets_calls.append(now)
+
+            while self._sheets_calls and now - self._sheets_calls[0] > 60:
+                self._sheets_calls.popleft()
+
+            self.sheets_peak_calls_per_minute = max(self.sheets_peak_calls_per_minute, len(self._sheets_calls))
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            counters, histograms = dict(self.counters), dict(self.histograms)
+
+        return {
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in counters.items()],
+            "histograms": [{"name": name, "labels": dict(labels)} | histogram.to_dict()
+                           for (name, labels), histogram in histograms.items()],
+            "sheets_quota": {
+                "quota_per_minute": self.sheets_quota_per_minute,
+                "peak_calls_per_minute": self.sheets_peak_calls_per_minute,
+            }
+        }
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            counters, histograms = dict(self.counters), dict(self.histograms)
+
+        lines = []
+
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f'# TYPE {PREFIX}_{name} counter')
+            lines += [f'{PREFIX}_{name}{_format_labels(labels)} {value}'
+                      for (n, labels), value in counters.items() if n == name]
+
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f'# TYPE {PREFIX}_{name} histogram')
+
+            for (n, labels), histogram in histograms.items():
+                if n != name:
+                    continue
+
+                for bucket, count in zip(histogram.buckets, histogram.cumulative_counts()):
+                    le = "+Inf" if math.isinf(bucket) else bucket
+                    lines.append(f'{PREFIX}_{name}_bucket{_format_labels(labels + (("le", le),))} {count}')
+
+                lines.append(f'{PREFIX}_{name}_sum{_format_labels(labels)} {histogram.sum}')
+                lines.append(f'{PREFIX}_{name}_count{_format_labels(labels)} {histogram.count}')
+
+        lines.append(f'# TYPE {PREFIX}_sheets_quota_per_minute gauge')
+        lines.append(f'{PREFIX}_sheets_quota_per_minute {self.sheets_quota_per_minute}')
+        lines.append(f'# TYPE {PREFIX}_sheets_peak_calls_per_minute gauge')
+        lines.append(f'{PREFIX}_sheets_peak_calls_per_minute {self.sheets_peak_calls_per_minute}')
+
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Tuple) -> str:
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in labels) + "}"
+
+
+METRICS = Metrics()
+
+
+def save(metrics: Metrics = METRICS):
+    """
+    Writes the metrics to out/metrics_LATEST.json and out/metrics_LATEST.prom (not archived; these describe the run,
+    not the data).
+    """
+    with open(f'{util.one_dir_up()}/out/metrics_LATEST.json', 'w', encoding='utf-8') as f:
+        json.dump(metrics.to_dict(), f, indent=4)
+
+    with open(f'{util.one_dir_up()}/out/metrics_LATEST.prom', 'w', encoding='utf-8') as f:
+        f.write(metrics.to_prometheus())
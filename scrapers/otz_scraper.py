@@ -1,27 +1,54 @@
 from __future__ import annotations
 
+import json
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Callable, Type, List, Tuple
 
 import constants
+import records
+import sheets
 import util
 
 from unidecode import unidecode
 
 from cell import Cell
+from journal import RunJournal, checkpointed
 
+# the sheets the rest of the run needs (see sheet_configs); any others are optional
+OTZ_SHEETS = ("killer_spreadsheet", "survivor_spreadsheet")
 
-def scrape_otz(service, spreadsheet_id: str, character_type: str, min_characters: int, min_universals: int) -> Dict:
+
+def scrape_otz(service, spreadsheet_id: str, character_type: str, min_characters: int, min_universals: int,
+               journal: RunJournal = None, sheet_constants: Dict = None, name: str = None) -> Dict:
+    """
+    Scrapes the Otzdarva spreadsheet for either Killers or Survivors. If a journal is given, each section (characters,
+    universals, guides, misc) is checkpointed once it's done, and skipped if it's already been done.
+
+    :param sheet_constants: Layout of the sheet (see constants.KILLER_CONSTANTS), for sheets other than Otz's (or
+                            other tabs of it). Defaults to the layout of Otz's sheet for the character type.
+    :param name: Name of the sheet (see sheet_configs), if it isn't one of Otz's.
+    """
     if character_type not in constants.CHARACTER_TYPES:
         raise ValueError(f'character_type must be in {constants.CHARACTER_TYPES}!')
 
-    print(f"Starting scraping Otzdarva spreadsheet for {character_type.capitalize()}...")
-
     is_survivor = character_type == 'survivors'
 
-    characters_info = _scrape_characters(service, spreadsheet_id, is_survivor, min_characters)
-    universal_perks_info = _scrape_universal_perks(service, spreadsheet_id, is_survivor, min_universals)
-    guides_info = _scrape_guide_links(service, spreadsheet_id, is_survivor)
-    misc_info = _scrape_misc(service, spreadsheet_id, is_survivor)
+    if sheet_constants is None:
+        sheet_constants = constants.SURVIVOR_CONSTANTS if is_survivor else constants.KILLER_CONSTANTS
+
+    print(f"Starting scraping {sheet_constants['sheet_name']} ({spreadsheet_id}) for {character_type.capitalize()}...")
+
+    unit = f'sheet:{spreadsheet_id}:{name or character_type}'
+
+    characters_info = checkpointed(journal, f'{unit}:characters',
+                                   lambda: _scrape_characters(service, spreadsheet_id, is_survivor, min_characters,
+                                                              sheet_constants))
+    universal_perks_info = checkpointed(journal, f'{unit}:universals',
+                                        lambda: _scrape_universal_perks(service, spreadsheet_id, min_universals,
+                                                                        sheet_constants))
+    guides_info = checkpointed(journal, f'{unit}:guides',
+                               lambda: _scrape_guide_links(service, spreadsheet_id, sheet_constants))
+    misc_info = checkpointed(journal, f'{unit}:misc', lambda: _scrape_misc(service, spreadsheet_id, sheet_constants))
 
     return {"characters": characters_info} | \
            {"universals": universal_perks_info} | \
@@ -29,14 +56,126 @@ def scrape_otz(service, spreadsheet_id: str, character_type: str, min_characters
            {"misc": misc_info}
 
 
-def _scrape_characters(service, spreadsheet_id: str, is_survivor: bool, min_characters: int) -> Dict:
-    sheet_constants = constants.SURVIVOR_CONSTANTS if is_survivor else constants.KILLER_CONSTANTS
+def sheet_configs(path: str = None) -> List[Dict]:
+    """
+    The sheets to scrape: Otz's killer and survivor sheets (named killer_spreadsheet and survivor_spreadsheet, like
+    their output files), plus any from the config file at path, which is a JSON list of:
+
+    {
+        name (str): what the output is saved as (a sheet with the same name as one of Otz's replaces it),
+        character_type (str): killers or survivors,
+        spreadsheet_id (str, optional): defaults to Otz's,
+        min_characters / min_universals (int, optional): default to --min-characters / --min-universals,
+        <anything in constants.KILLER_CONSTANTS / SURVIVOR_CONSTANTS> (optional): where the sheet's layout differs
+                                                                                 from Otz's, cells in A1 notation
+    }
+
+    e.g. {"name": "survivor_sound_and_stealth", "character_type": "survivors", "sheet_name": "Survivor Sound & Stealth"}
+
+    :return: [{name, character_type, spreadsheet_id, constants, (min_characters), (min_universals)}]
+    """
+    configs = {
+        "killer_spreadsheet": {"character_type": "killers", "spreadsheet_id": constants.OTZ_SPREADSHEET_ID,
+                               "constants": constants.KILLER_CONSTANTS},
+        "survivor_spreadsheet": {"character_type": "survivors", "spreadsheet_id": constants.OTZ_SPREADSHEET_ID,
+                                 "constants": constants.SURVIVOR_CONSTANTS},
+    }
+
+    if path is not None:
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+
+        for entry in entries:
+            entry = dict(entry)
+            name, character_type = entry.pop('name'), entry.pop('character_type')
+
+            if character_type not in constants.CHARACTER_TYPES:
+                raise ValueError(f'character_type of sheet "{name}" must be in {constants.CHARACTER_TYPES}!')
+
+            config = {"character_type": character_type,
+                      "spreadsheet_id": entry.pop('spreadsheet_id', constants.OTZ_SPREADSHEET_ID)}
+
+            for key in ("min_characters", "min_universals"):
+                if key in entry:
+                    config[key] = entry.pop(key)
+
+            config['constants'] = _layout(name, character_type, entry)
+            configs[name] = config
+
+    return [{"name": name} | config for name, config in configs.items()]
+
+
+def _layout(name: str, character_type: str, overrides: Dict) -> Dict:
+    """ Otz's layout for the character type, with the overrides (from a sheet config) applied """
+    layout = dict(constants.SURVIVOR_CONSTANTS if character_type == 'survivors' else constants.KILLER_CONSTANTS)
+
+    unknown = overrides.keys() - layout.keys()
+    if unknown:
+        raise ValueError(f'Unknown setting(s) {sorted(unknown)} for sheet "{name}"!')
+
+    for key, value in overrides.items():
+        if key == "misc":
+            value = util.BiDict({k: Cell.from_a1(v) for k, v in value.items()})
+        elif not isinstance(layout[key], (str, int)):  # a cell
+            value = Cell.from_a1(value)
+
+        layout[key] = value
+
+    return layout
+
+
+def scrape_sheets(service_for: Callable[[str], object], configs: List[Dict], min_characters: int,
+                  min_universals: int, journal: RunJournal = None) -> Dict[str, Dict]:
+    """
+    Scrapes every sheet in configs (see sheet_configs) at once, one thread each. They all share the same Sheets API
+    quota (see sheets.get), so adding more sheets makes the run longer only once the quota's the bottleneck, rather
+    than by a whole sheet's worth of requests each.
+
+    Only Otz's sheets are needed for the rest of the run, so if any other sheet (e.g. a wrong ID, no access, or a
+    different layout) can't be scraped, it's logged and left out rather than stopping the run.
+
+    :param service_for: Function mapping a spreadsheet ID to the service to scrape it with (the same one for every
+                        spreadsheet when using the API).
+
+    :return: name -> scraped sheet (see scrape_otz)
+    """
+    def scrape(config):
+        return scrape_otz(service_for(config['spreadsheet_id']), config['spreadsheet_id'], config['character_type'],
+                          config.get('min_characters', min_characters), config.get('min_universals', min_universals),
+                          journal=journal, sheet_constants=config['constants'], name=_unit_name(config))
+
+    with ThreadPoolExecutor(max_workers=max(1, len(configs))) as executor:
+        jobs = {config['name']: executor.submit(scrape, config) for config in configs}
+
+        scraped = {}
+
+        for name, job in jobs.items():
+            try:
+                scraped[name] = job.result()
+            except Exception as e:
+                if name in OTZ_SHEETS:
+                    raise
+
+                print(f'Unable to scrape sheet "{name}", leaving it out! ({repr(e)})')
+
+        return scraped
+
+
+def _unit_name(config: Dict) -> str | None:
+    # Otz's sheets keep the journal units they've always had, so a run started before this can still be resumed
+    return None if config['name'] in OTZ_SHEETS else config['name']
+
+
+def _scrape_characters(service, spreadsheet_id: str, is_survivor: bool, min_characters: int,
+                       sheet_constants: Dict) -> Dict:
     start = Cell(sheet_constants['character_col_start'], sheet_constants['start'])
 
     # closure (why do you need to make the row skip for killers and survivors different otz, why :(( )
     def next_start_func(cell, i):
         return _get_next_character_start(cell, i,
-                                         row_skip=sheet_constants['character_row_skip'])
+                                         row_skip=sheet_constants['character_row_skip'],
+                                         col_skip=sheet_constants['col_skip'],
+                                         characters_per_row=sheet_constants['characters_per_row'])
 
     def cell_dict_func(cell):
         return _get_cells_for_character(cell, is_survivor)
@@ -88,7 +227,7 @@ def _scrape_characters(service, spreadsheet_id: str, is_survivor: bool, min_char
     for name, character in sheet.items():
         perks = []
         for tier, info in zip(character['perk_tiers'], character['perk_names']):
-            perks.append({**info, 'tier': tier})
+            perks.append(records.build(records.SheetPerk, **info, tier=tier))
 
         character['perks'] = perks
 
@@ -98,8 +237,7 @@ def _scrape_characters(service, spreadsheet_id: str, is_survivor: bool, min_char
     return sheet
 
 
-def _scrape_universal_perks(service, spreadsheet_id: str, is_survivor: bool, min_universals: int) -> Dict:
-    sheet_constants = constants.SURVIVOR_CONSTANTS if is_survivor else constants.KILLER_CONSTANTS
+def _scrape_universal_perks(service, spreadsheet_id: str, min_universals: int, sheet_constants: Dict) -> Dict:
     start = Cell(sheet_constants['base_perks_start_col'], sheet_constants['base_perks_start_row'])
 
     def data_extract_func(dt: str, c: dict) -> (dict, list[Type[str | list]]):
@@ -115,7 +253,7 @@ def _scrape_universal_perks(service, spreadsheet_id: str, is_survivor: bool, min
                                        min_search_amount=min_universals,
                                        start=start,
                                        next_start_func=lambda cell, _: cell + 1,
-                                       cell_dict_func=lambda cell, _: util.BiDict({
+                                       cell_dict_func=lambda cell: util.BiDict({
                              "name": cell >> 1,
                              "tier": cell,
                          }),
@@ -125,11 +263,9 @@ def _scrape_universal_perks(service, spreadsheet_id: str, is_survivor: bool, min
                                        )
 
 
-def _scrape_guide_links(service, spreadsheet_id: str, is_survivor: bool) -> List:
-    sheet_constants = constants.SURVIVOR_CONSTANTS if is_survivor else constants.KILLER_CONSTANTS
+def _scrape_guide_links(service, spreadsheet_id: str, sheet_constants: Dict) -> List:
     guides_start = sheet_constants['guides_start']
-
-    sheet_name = 'Survivor Sound & Stealth' if is_survivor else 'Killer Info'
+    sheet_name = sheet_constants['guides_sheet_name']
 
     def data_extract_func(dt, c):
         if dt == "title" or dt == "link_text":
@@ -143,8 +279,8 @@ def _scrape_guide_links(service, spreadsheet_id: str, is_survivor: bool) -> List
                                             search_for_unknown=False,
                                             min_search_amount=2,
                                             start=guides_start,
-                                            next_start_func=lambda cell, _: cell + (4 if is_survivor else 3),
-                                            cell_dict_func=lambda cell, _: util.BiDict({
+                                            next_start_func=lambda cell, _: cell + sheet_constants['guides_row_skip'],
+                                            cell_dict_func=lambda cell: util.BiDict({
                                   "title": cell,
                                   "hyperlink": cell + 1,
                                   "link_text": cell + 1,
@@ -155,16 +291,13 @@ def _scrape_guide_links(service, spreadsheet_id: str, is_survivor: bool) -> List
                                             ).values())
 
 
-def _scrape_misc(service, spreadsheet_id: str, is_survivor: bool) -> Dict:
-    sheet_constants = constants.SURVIVOR_CONSTANTS if is_survivor else constants.KILLER_CONSTANTS
-
+def _scrape_misc(service, spreadsheet_id: str, sheet_constants: Dict) -> Dict:
     misc = sheet_constants['misc']
 
     if len(misc) == 0:
         return {}
 
-    response = service.spreadsheets().get(spreadsheetId=spreadsheet_id, ranges=list(misc.values()),
-                                          includeGridData=True).execute()
+    response = sheets.get(service, spreadsheet_id, list(misc.values()))
 
     response = response['sheets'][0]['data']
 
@@ -306,8 +439,7 @@ def _send_request(service, spreadsheet_id: str, start: Cell, sheet_name: str, se
         cell_structure[assignment if assignment is not None else i] = cells
         curr = next_start_func(curr, i)
 
-    response = service.spreadsheets().get(spreadsheetId=spreadsheet_id, ranges=request,
-                                          includeGridData=True).execute()
+    response = sheets.get(service, spreadsheet_id, request)
 
     response = response['sheets'][0]['data']
 
@@ -321,7 +453,7 @@ def _send_request(service, spreadsheet_id: str, start: Cell, sheet_name: str, se
         cell_min, cell_max = min(cell_ranges), max(cell_ranges)
 
         request = [f"{sheet_name}!{cell_min}:{cell_max}"]
-        resp = service.spreadsheets().get(spreadsheetId=spreadsheet_id, ranges=request, includeGridData=True).execute()
+        resp = sheets.get(service, spreadsheet_id, request)
 
         root_cell = resp['sheets'][0]['data'][0]['rowData'][0]['values'][0]
 
@@ -428,17 +560,13 @@ if __name__ == "__main__":
     import cli
     from datetime import datetime
 
-    from google.oauth2.service_account import Credentials
-    from googleapiclient.discovery import build
-
     util.make_dirs()
-    args = cli.parse()
+    args = cli.parse_main_args()
 
     current_date = datetime.now().strftime('%d-%m-%Y')
     otz_spreadsheet_id = constants.OTZ_SPREADSHEET_ID
 
-    credentials = Credentials.from_service_account_file(args.creds_path)
-    service = build('sheets', 'v4', credentials=credentials)
+    service = sheets.build_service(args.creds_path)
 
     killer_spreadsheet = scrape_otz(service, otz_spreadsheet_id, 'killer',
                                     args.min_characters, args.min_universals)
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Tuple
+
+import util
+
+# Otz's colours for each perk tier (best first). Perks are coloured by their cell's background; slightly different
+# shades of the same colour (e.g. the survivor sheet's red is a bit lighter than the killer sheet's) are the same tier.
+TIER_PALETTE = [
+    ("Top", (17, 85, 204)),
+    ("Good", (56, 118, 29)),
+    ("Situational", (191, 144, 0)),
+    ("Weak", (91, 15, 0)),
+]
+
+AVAILABILITY_PALETTE = [
+    ("Free", (106, 168, 79)),
+    ("Shards", (166, 77, 121)),
+    ("Auric Cells", (133, 32, 12)),
+]
+
+# colours further than this (euclidean distance in RGB) from every colour in the palette are a new tier, rather than
+# a different shade of one we already know about
+MAX_DISTANCE = 64
+
+CHARACTER_TYPES = ("killers", "survivors")
+
+
+class Palette:
+    """
+    A list of named colours. Looking up a colour gives the index of the closest one in the palette; colours that
+    aren't close to any of them are added on the end (named by their hex), so a new tier on the sheet is kept apart
+    rather than lumped in with an existing one.
+    """
+
+    def __init__(self, named_colours: List[Tuple[str, Tuple[int, int, int]]]):
+        self.entries = [{"name": name, "colour": dict(zip(("red", "green", "blue"), rgb)),
+                         "hex": '#%02x%02x%02x' % rgb} for name, rgb in named_colours]
+        self._rgbs = [rgb for _, rgb in named_colours]
+        self._cache = {}
+
+    def index_of(self, colour: Dict) -> int:
+        rgb = (colour.get('red', 0), colour.get('green', 0), colour.get('blue', 0))
+
+        if rgb not in self._cache:
+            distances = [sum((a - b) ** 2 for a, b in zip(rgb, other)) ** 0.5 for other in self._rgbs]
+            closest = min(range(len(distances)), key=distances.__getitem__, default=None)
+
+            if closest is None or distances[closest] > MAX_DISTANCE:
+                print(f'{util.colour_to_hex(colour)} isn\'t in the palette, adding it as a new entry...')
+                self.entries.append({"name": util.colour_to_hex(colour), "colour": dict(colour),
+                                     "hex": util.colour_to_hex(colour)})
+                self._rgbs.append(rgb)
+                closest = len(self._rgbs) - 1
+
+            self._cache[rgb] = closest
+
+        return self._cache[rgb]
+
+
+def apply_palette(spreadsheets: Dict) -> Dict:
+    """
+    Replaces every perk tier and availability colour in the (transformed) spreadsheet with its index in the tier /
+    availability palette, and adds the palettes themselves under "palette":
+
+    {
+        tiers (list): [{name (str), colour ({red, green, blue}), hex (str)}, ...],
+        availability (list): [{name (str), colour ({red, green, blue}), hex (str)}, ...],
+    }
+
+    i.e. a perk's tier is spreadsheets['palette']['tiers'][perk['tier']].
+    """
+    tiers, availability = Palette(TIER_PALETTE), Palette(AVAILABILITY_PALETTE)
+
+    for character_type in CHARACTER_TYPES:
+        sheet = spreadsheets[character_type]
+
+        for character in sheet['characters'].values():
+            character['availability']['colour'] = availability.index_of(character['availability']['colour'])
+
+            for perk in character['perks'].values():
+                perk['tier'] = tiers.index_of(perk['tier'])
+
+        for perk in sheet['universals'].values():
+            perk['tier'] = tiers.index_of(perk['tier'])
+
+    return spreadsheets | {"palette": {"tiers": tiers.entries, "availability": availability.entries}}
+
+
+def tier_hex(spreadsheets: Dict, tier: int) -> str:
+    return spreadsheets['palette']['tiers'][tier]['hex']
+
+
+def find_tier(spreadsheets: Dict, tier: str) -> int | None:
+    """
+    :return: the index of the tier with the given name, index or hex colour (which can be any shade of the tier, e.g.
+             #5b0f00 or #85200c), or None if there isn't one
+    """
+    tier = tier.lower()
+    entries = spreadsheets.get('palette', {}).get('tiers', [])
+
+    for i, entry in enumerate(entries):
+        if tier in (entry['name'].lower(), entry['hex'], str(i)):
+            return i
+
+    if re.fullmatch(r'#[0-9a-f]{6}', tier):
+        rgb = [int(tier[i:i + 2], 16) for i in (1, 3, 5)]
+        distances = [sum((a - b) ** 2 for a, b in zip(rgb, entry['colour'].values())) ** 0.5 for entry in entries]
+
+        if distances and min(distances) <= MAX_DISTANCE:
+            return distances.index(min(distances))
+
+    return None
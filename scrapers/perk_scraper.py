@@ -1,20 +1,32 @@
 from datetime import datetime
+from typing import Dict, List, Tuple
 
+import records
+import table_crawler
 import util
 from unidecode import unidecode
 
 KILLER_PERKS_URL = "https://deadbydaylight.fandom.com/wiki/Killer_Perks"
 SURVIVOR_PERKS_URL = "https://deadbydaylight.fandom.com/wiki/Survivor_Perks"
 
-
-def _build_perk_json() -> dict:
-    return {
-        "name": "",
-        "icon": "",
-        "description": "",
-        "description_raw": "",
-        "is_upcoming_patch": False
-    }
+# perk page url -> the same page on other language's wikis (see localisation.py), so they don't have to be re-fetched
+LANGUAGE_LINKS = table_crawler.LANGUAGE_LINKS
+
+# the only elements (and their attributes) the site uses from descriptions; everything else is stripped out
+DESCRIPTION_TAGS = {
+    "div": frozenset({"class"}),  # formattedPerkDesc, and dynamicTitle for upcoming patches
+    "p": frozenset(),
+    "ul": frozenset(),
+    "ol": frozenset(),
+    "li": frozenset(),
+    "b": frozenset(),
+    "i": frozenset(),
+    "br": frozenset(),
+    "sup": frozenset(),
+    "sub": frozenset(),
+    "a": frozenset({"href", "title"}),
+    "span": frozenset({"class", "style"}),  # luaClr spans, i.e. coloured numbers
+}
 
 
 def _get_url(character_type):
@@ -24,6 +36,7 @@ def _get_url(character_type):
 def scrape_perks(character_type: str, remove_mini_perk_icons: bool = True) -> dict:
     """
     Scrape perk information from DBD perk table wiki pages. Works for all characters (i.e. both Killers and Survivors).
+    To scrape both, use scrape_all_perks instead, which fetches both pages at once.
 
     Uses BeautifulSoup, so no "real" rate limits here.
 
@@ -44,63 +57,95 @@ def scrape_perks(character_type: str, remove_mini_perk_icons: bool = True) -> di
         }
     }
     """
-    print(f"Starting scraping Wiki ({character_type}) for Perks...")
+    return scrape_all_perks([character_type], remove_mini_perk_icons)[character_type]
 
-    url = _get_url(character_type)
-    soup = util.get_content(url)
 
-    perks = {}
+def scrape_all_perks(character_types: List[str], remove_mini_perk_icons: bool = True) -> Dict[str, dict]:
+    """
+    Scrapes the perk pages of every character type in one crawl, so the pages are fetched at the same time (through
+    concurrency.FANDOM_LIMITER, like everything else), and the row cache is only loaded and saved once.
 
-    # only one table on the page, so we don't need to bother doing anything more rigorous
-    table = soup.find('table')
+    :return: character type -> perks (see scrape_perks)
+    """
+    print(f"Starting scraping Wiki ({', '.join(character_types)}) for Perks...")
+
+    specs = {character_type: _perk_spec(character_type, remove_mini_perk_icons) for character_type in character_types}
+    datasets = table_crawler.crawl(list(specs.values()), no_workers=max(1, len(specs)))
+
+    return {character_type: datasets[spec.name] for character_type, spec in specs.items()}
+
+
+def _perk_spec(character_type: str, remove_mini_perk_icons: bool = True) -> table_crawler.TableSpec:
+    """ the perk table (see table_crawler); its layout's the same on every language's wiki """
+    return table_crawler.TableSpec(
+        name=f'{character_type}_perks' + ("" if remove_mini_perk_icons else "_with_mini_icons"),
+        urls=[_get_url(character_type)],
+        columns={
+            "icon": table_crawler.Column(0, "icon"),
+            "name": table_crawler.Column(1),
+            "character": table_crawler.Column(2),
+            "description": table_crawler.Column(3, select='div.formattedPerkDesc',
+                                                parse=lambda description, wiki_base_link: _parse_description(
+                                                    description, wiki_base_link, remove_mini_perk_icons)),
+        },
+        build=_build_perk,
+        allowed_tags=DESCRIPTION_TAGS,
+        # only one table on the page, so we don't need to bother doing anything more rigorous
+        table_selector="table",
+        all_tables=False,
+    )
+
+
+def _scrape_perk_table(soup, wiki_base_link: str, remove_mini_perk_icons: bool = True) -> List[Tuple[str, Dict]]:
+    """
+    Scrapes every row of the perk table on the page (the layout's the same on every language's wiki).
 
-    for i, row in enumerate(table.find_all('tr')[1:]):  # [1:] to remove header
-        perk = _build_perk_json()  # keeps key ordering when inserting keys (I'm picky about this stuff okay :( )
+    :return: (character name, perk) for each perk in the table
+    """
+    spec = _perk_spec("", remove_mini_perk_icons)  # the page's already been fetched, so the URL doesn't matter
+    return [(character_name, perk) for _, character_name, perk in table_crawler.scrape_tables(soup, spec,
+                                                                                              wiki_base_link)]
 
-        headers = row.find_all('th')
 
-        icon = util.strip_revision_from_url(headers[0].find('a')['href'])
-        perk_name = headers[1].text.strip()
-        character_name = unidecode(headers[2].text.replace('.', '').strip())  # 'All' has a '.' in front of it
+def _parse_description(description, wiki_base_link: str, remove_mini_perk_icons: bool) -> Dict:
+    description = util.replace_all_wiki_links(description, wiki_base_link)
 
-        description = row.find('td').find('div', class_='formattedPerkDesc')
-        description = util.replace_all_wiki_links(description)
+    upcoming_patch = description.find("div", class_="dynamicTitle")
 
-        upcoming_patch = description.find("div", class_="dynamicTitle")
+    if remove_mini_perk_icons and description.span is not None:
+        spans = description.find_all(lambda tag: tag.name == 'span' and 'padding' in tag.get('style', ""))
+        for span in spans:
+            span.extract()
 
-        if remove_mini_perk_icons and description.span is not None:
-            spans = soup.find_all(lambda tag: tag.name == 'span' and 'style' in tag.attrs and 'padding' in tag['style'])
-            for span in spans:
-                if span:
-                    span.replace_with('')
-                    span.extract()
+    # compact, whitelisted HTML (prettify roughly doubled the size of the description with indentation)
+    description_html = util.render_html(description, DESCRIPTION_TAGS).replace("\xa0", "")  # remove NBSP's
+    description_text = description.text.replace("\xa0", "")
+    patch_ver = None
 
-        description_html = description.prettify().replace("\xa0", "")  # remove NBSP's in string
-        description_text = description.text.replace("\xa0", "")
+    if upcoming_patch:
+        patch_split = upcoming_patch.text.split(":")  # quite dodgy; should probably be using regex but here we are
+        patch_ver = patch_split[1].strip()
 
-        if upcoming_patch:
-            patch_split = upcoming_patch.text.split(":")  # quite dodgy; should probably be using regex but here we are
-            patch_ver = patch_split[1].strip()
-            perk['patch_ver'] = patch_ver
+        patch_idx = description_text.find(patch_ver) + len(patch_ver)
+        description_text = description_text[:patch_idx] + "\n" + description_text[patch_idx:]
 
-            patch_idx = description_text.find(patch_ver) + len(patch_ver)
-            description_text = description_text[:patch_idx] + "\n" + description_text[patch_idx:]
+    return {"html": description_html, "text": description_text, "patch_ver": patch_ver}
 
-        # create perk dict
-        perk['icon'] = icon
-        perk['description'] = description_html
-        perk['description_raw'] = description_text
-        perk['is_upcoming_patch'] = upcoming_patch is not None
 
-        # otz doesn't include scourge hook in perk names
-        perk_name = perk_name.replace("Scourge Hook: ", "").strip()
-        perk['name'] = perk_name
+def _build_perk(values: Dict) -> Tuple[str, Dict]:
+    description = values['description']
 
-        if character_name not in perks:
-            perks[character_name] = {}
+    perk = records.build(records.Perk,
+                         # otz doesn't include scourge hook in perk names
+                         name=values['name'].replace("Scourge Hook: ", "").strip(),
+                         icon=values['icon'],
+                         description=description['html'],
+                         description_raw=description['text'],
+                         is_upcoming_patch=description['patch_ver'] is not None,
+                         patch_ver=description['patch_ver'])
 
-        perks[character_name][perk_name] = perk
-    return perks
+    character_name = unidecode(values['character'].replace('.', '').strip())  # 'All' has a '.' in front of it
+    return character_name, perk
 
 
 if __name__ == "__main__":
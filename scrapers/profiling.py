@@ -0,0 +1,118 @@
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import util
+
+PROFILE_DIR = f'{util.one_dir_up()}/out/profile'
+
+SAMPLE_INTERVAL = 0.005
+
+ENABLED = False
+
+# stage name -> collapsed stack -> no. samples, used for the combined collapsed stack file
+STAGE_SAMPLES = {}
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+
+
+class Sampler(threading.Thread):
+    """
+    Sampling profiler that periodically grabs the stack of every thread (cProfile only sees the thread it was started
+    on, which misses all the character scraper workers).
+
+    Stacks are stored in the "collapsed" format (frames separated by semicolons, root first), which can be fed
+    straight into flamegraph.pl / speedscope / etc.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+
+        while not self._stop_event.is_set():
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                    frame = frame.f_back
+
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _write_collapsed(path, samples: Counter):
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in samples.most_common():
+            f.write(f'{stack} {count}\n')
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Profiles everything in the with block (if profiling has been enabled), writing out/profile/<name>.prof (cProfile,
+    can be opened with pstats / snakeviz) and out/profile/<name>.collapsed (sampled stacks from every thread).
+
+    Stages can't be nested, as only one cProfile profiler can be active at once.
+    """
+    if not ENABLED:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    sampler = Sampler()
+
+    sampler.start()
+    profiler.enable()
+
+    try:
+        yield
+    finally:
+        profiler.disable()
+        sampler.stop()
+
+        profiler.dump_stats(f'{PROFILE_DIR}/{name}.prof')
+        _write_collapsed(f'{PROFILE_DIR}/{name}.collapsed', sampler.samples)
+
+        STAGE_SAMPLES[name] = STAGE_SAMPLES.get(name, Counter()) + sampler.samples
+
+
+def save():
+    """
+    Writes out/profile/all.collapsed, containing the samples from every stage with the stage name as the root frame.
+    """
+    if not ENABLED:
+        return
+
+    combined = Counter()
+
+    for name, samples in STAGE_SAMPLES.items():
+        for stack, count in samples.items():
+            combined[f'{name};{stack}'] += count
+
+    _write_collapsed(f'{PROFILE_DIR}/all.collapsed', combined)
+    print(f'Profiles written to {PROFILE_DIR}')
@@ -0,0 +1,328 @@
+from __future__ import annotations
+
+import json
+import types
+import typing
+from dataclasses import dataclass, fields, is_dataclass
+from typing import Dict, List
+
+
+class RecordError(ValueError):
+    """ raised when some JSON isn't the shape of the record it's being decoded into """
+
+
+# ---------------- WIKI --------------------
+@dataclass(slots=True)
+class Perk:
+    name: str = ""
+    icon: str = ""
+    description: str = ""
+    description_raw: str = ""
+    is_upcoming_patch: bool = False
+    patch_ver: str | None = None  # only if is_upcoming_patch
+
+
+@dataclass(slots=True)
+class Power:
+    name: str = ""
+    icon: str = ""
+    desc: str = ""
+
+
+@dataclass(slots=True)
+class Survivor:
+    name: str = ""
+    icon: str = ""
+    image_half: str = ""
+    image_full: str = ""
+    wiki_link: str = ""
+    lore: str = ""
+
+
+@dataclass(slots=True)
+class Killer:
+    name: str = ""
+    former_name: str = ""
+    height: str = ""
+    icon: str = ""
+    image_half: str = ""
+    image_full: str = ""
+    wiki_link: str = ""
+    power: Power = None
+    lore: str = ""
+
+    def __post_init__(self):
+        if self.power is None:
+            self.power = Power()
+
+
+# ---------------- SPREADSHEET --------------------
+@dataclass(slots=True)
+class Colour:
+    red: int
+    green: int
+    blue: int
+
+
+@dataclass(slots=True)
+class Availability:
+    value: str
+    colour: int | Colour  # index into the availability palette (the colour itself before palette.apply_palette)
+
+
+@dataclass(slots=True)
+class SheetPerk:
+    name: str
+    is_exhaustion_perk: bool | None = None  # survivors only
+    tier: int | Colour = None  # index into the tier palette (the colour itself before palette.apply_palette)
+    icon: str | None = None  # only once it's been matched up with the wiki (see main.transform_spreadsheet)
+
+
+@dataclass(slots=True)
+class Universal:
+    tier: int | Colour
+    name: str
+    icon: str | None = None
+
+
+@dataclass(slots=True)
+class SheetSurvivor:
+    name: str
+    availability: Availability
+    stealth: str
+    noise: str
+    cries: str
+    perks: Dict[str, SheetPerk]
+    icon: str
+
+
+@dataclass(slots=True)
+class SheetKiller:
+    name: str
+    availability: Availability
+    movement_speed: str
+    terror_radius: str
+    perks: Dict[str, SheetPerk]
+    icon: str
+
+
+@dataclass(slots=True)
+class Guide:
+    title: str
+    hyperlink: str
+    link_text: str
+
+
+@dataclass(slots=True)
+class LastUpdated:
+    application: str
+    spreadsheet: str
+
+
+@dataclass(slots=True)
+class PaletteEntry:
+    name: str
+    colour: Colour
+    hex: str
+
+
+@dataclass(slots=True)
+class Palette:
+    tiers: List[PaletteEntry]
+    availability: List[PaletteEntry]
+
+
+@dataclass(slots=True)
+class SheetSurvivors:
+    characters: Dict[str, SheetSurvivor]
+    universals: Dict[str, Universal]
+
+
+@dataclass(slots=True)
+class SheetKillers:
+    characters: Dict[str, SheetKiller]
+    universals: Dict[str, Universal]
+
+
+@dataclass(slots=True)
+class Spreadsheet:
+    last_updated: LastUpdated
+    guides: Dict[str, List[Guide]]
+    survivors: SheetSurvivors
+    killers: SheetKillers
+    palette: Palette | None = None  # not in runs from before there was a palette
+
+
+# fields which default to None only so they can be filled in after the record's made, i.e. not actually optional
+_NOT_OPTIONAL = {
+    Killer: {"power"},
+    SheetPerk: {"tier"},
+}
+
+# fields which can be missing from files written by older runs (e.g. the Xenomorph in characters_LATEST.json was
+# saved without its former_name, height or power); they're decoded as their default
+_MAY_BE_MISSING = {
+    Killer: {"former_name", "height", "power"},
+}
+
+
+def _is_optional(cls, f) -> bool:
+    return f.default is None and f.name not in _NOT_OPTIONAL.get(cls, ())
+
+
+# ---------------- BUILDING --------------------
+# record class -> [(field name, whether it's left out when None)], worked out once per class
+_BUILD_FIELDS = {}
+
+
+def _build_fields(cls):
+    if cls not in _BUILD_FIELDS:
+        _BUILD_FIELDS[cls] = [(f.name, _is_optional(cls, f)) for f in fields(cls)]
+
+    return _BUILD_FIELDS[cls]
+
+
+def build(cls, **values) -> Dict:
+    """
+    The scrapers output plain dicts (cheaper to make and dump than records), which are built through this so they
+    always have the same fields as their record, in the same order, without any optional fields that aren't set.
+
+    Unknown fields, and missing ones that aren't optional, raise a RecordError.
+    """
+    out = {}
+
+    for name, optional in _build_fields(cls):
+        if name not in values:
+            if not optional:
+                raise RecordError(f'missing field "{name}" for {cls.__name__}')
+            continue
+
+        if values[name] is None and optional:
+            continue
+
+        out[name] = values[name]
+
+    if len(values) > len(out) and (unknown := values.keys() - {name for name, _ in _build_fields(cls)}):
+        raise RecordError(f'unknown field(s) {sorted(unknown)} for {cls.__name__}')
+
+    return out
+
+
+# ---------------- DECODING --------------------
+# record class -> [(field name, type, whether it's required)], worked out once per class
+_DECODE_FIELDS = {}
+
+
+def _decode_fields(cls):
+    if cls not in _DECODE_FIELDS:
+        hints = typing.get_type_hints(cls)
+        _DECODE_FIELDS[cls] = [(f.name, hints[f.name],
+                                not _is_optional(cls, f) and f.name not in _MAY_BE_MISSING.get(cls, ()))
+                               for f in fields(cls)]
+
+    return _DECODE_FIELDS[cls]
+
+
+def decode(tp, data, path: str = "$"):
+    """
+    Decodes data (as loaded by json) into tp, which can be a record class, or a Dict / List / optional of them.
+
+    Decoding is strict: missing fields, unknown fields and values of the wrong type all raise a RecordError (saying
+    where in the data it went wrong), rather than turning up as a KeyError somewhere much later on.
+    """
+    origin = typing.get_origin(tp)
+
+    if origin in (typing.Union, types.UnionType):
+        if data is None and type(None) in typing.get_args(tp):
+            return None
+
+        # the first type in the union that the data decodes as
+        options = [arg for arg in typing.get_args(tp) if arg is not type(None)]
+
+        for option in options[:-1]:
+            try:
+                return decode(option, data, path)
+            except RecordError:
+                continue
+
+        return decode(options[-1], data, path)
+
+    if origin is dict:
+        _, value_type = typing.get_args(tp)
+        _check(data, dict, path)
+        return {k: decode(value_type, v, f'{path}.{k}') for k, v in data.items()}
+
+    if origin is list:
+        (value_type,) = typing.get_args(tp)
+        _check(data, list, path)
+        return [decode(value_type, v, f'{path}[{i}]') for i, v in enumerate(data)]
+
+    if is_dataclass(tp):
+        _check(data, dict, path)
+
+        unknown = data.keys() - {name for name, _, _ in _decode_fields(tp)}
+        if unknown:
+            raise RecordError(f'{path}: unknown field(s) {sorted(unknown)} for {tp.__name__}')
+
+        kwargs = {}
+
+        for name, field_type, required in _decode_fields(tp):
+            if name in data:
+                kwargs[name] = decode(field_type, data[name], f'{path}.{name}')
+            elif required:
+                raise RecordError(f'{path}: missing field "{name}" for {tp.__name__}')
+
+        return tp(**kwargs)
+
+    _check(data, tp, path)
+    return data
+
+
+def _check(data, tp, path: str):
+    # bool is an int as far as isinstance is concerned, but a tier of True is definitely a mistake
+    if not isinstance(data, tp) or (tp is int and isinstance(data, bool)):
+        raise RecordError(f'{path}: expected {tp.__name__}, got {type(data).__name__}')
+
+
+# what each of the final (LATEST) files decodes to
+PerksFile = Dict[str, Dict[str, Dict[str, Perk]]]  # character type -> character -> perk name -> perk
+CharactersFile = Dict[str, Dict[str, Survivor | Killer]]
+
+CHARACTER_RECORDS = {"survivors": Survivor, "killers": Killer}
+
+
+def decode_perks(data) -> PerksFile:
+    return decode(PerksFile, data)
+
+
+def decode_characters(data) -> CharactersFile:
+    _check(data, dict, "$")
+
+    unknown = data.keys() - CHARACTER_RECORDS.keys()
+    if unknown:
+        raise RecordError(f'$: unknown character type(s) {sorted(unknown)}, must be in {list(CHARACTER_RECORDS)}')
+
+    return {character_type: decode(Dict[str, CHARACTER_RECORDS[character_type]], characters, f'$.{character_type}')
+            for character_type, characters in data.items()}
+
+
+def decode_spreadsheet(data) -> Spreadsheet:
+    return decode(Spreadsheet, data)
+
+
+def decode_last_updated(data) -> LastUpdated:
+    return decode(LastUpdated, data)
+
+
+DECODERS = {
+    "perks": decode_perks,
+    "characters": decode_characters,
+    "spreadsheet": decode_spreadsheet,
+    "last_updated": decode_last_updated,
+}
+
+
+def load(path: str, resource: str):
+    """ loads one of the final JSON files (perks, characters, spreadsheet or last_updated) as records """
+    with open(path, encoding='utf-8') as f:
+        return DECODERS[resource](json.load(f))
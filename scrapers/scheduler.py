@@ -1,58 +1,99 @@
-import json
 import os
+import random
+import time
 from datetime import datetime
 
 import main as scraper
 import cli
+import records
+import sheets
 import util
 
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-
 from scrapers import constants
 
+DATETIME_FORMAT_STR = "%d-%m-%Y"
+
 
 def main():
     util.make_dirs()
     args = cli.parse_scheduler_args()
 
-    credentials = Credentials.from_service_account_file(args.creds_path)
-    service = build('sheets', 'v4', credentials=credentials)
+    service = sheets.build_service(args.creds_path)
+    sheets.configure(args.sheets_quota)
+
+    if args.daemon:
+        run_daemon(args, service)
+    else:
+        run_once(args, service, load_last_updated(), force=args.force)
 
+
+def run_once(args, service, last_updated, force=False) -> bool:
     current_date = datetime.now()
 
-    update_last_refresh, sheet_updated = requires_refresh(service, current_date, args.refresh_time) or args.force
+    update_last_refresh, sheet_updated = requires_refresh(service, current_date, args.refresh_time, last_updated)
     refresh = update_last_refresh or sheet_updated
 
-    if args.force:
+    if force:
         print("Program has been forced to run!")
     else:
         print(f'Update{" " if refresh else " is not "}required! '
               f'{"Running" if refresh else "Exiting"} program ...')
 
-    if refresh or args.force:
-        scraper.scrape_all(args=args, current_date=current_date.strftime('%d-%m-%Y'), sheets_service=service)
+    if refresh or force:
+        scraper.scrape_all(args=args, current_date=current_date.strftime(DATETIME_FORMAT_STR), sheets_service=service)
+
+    return refresh or force
+
 
+def run_daemon(args, service):
+    """
+    Keeps the scheduler alive, checking the sheet every poll interval (plus some jitter, so we're not hitting Google
+    at exactly the same time every hour).
 
-def requires_refresh(service, current_date, refresh_rate_days):
-    last_updated = {}
+    Everything that's expensive to set up (the Sheets service, the HTTP session for the wiki, the previous
+    characters and perk name matches) is kept in memory between runs, so each tick costs a single read of the
+    'Last Updated' cell unless a refresh is actually required.
+    """
+    last_updated = load_last_updated()
+    force = args.force
+
+    print(f"Starting scheduler daemon (poll-interval={args.poll_interval}m, poll-jitter={args.poll_jitter}m)...")
+
+    while True:
+        try:
+            if run_once(args, service, last_updated, force=force):
+                last_updated = load_last_updated()
+        except Exception as e:
+            print(f'An error occurred whilst running the scheduler ({str(e)})! Trying again next poll ...')
+
+        force = False
+
+        sleep_for = (args.poll_interval + random.uniform(0, args.poll_jitter)) * 60
+        print(f'Next poll in {round(sleep_for / 60, 1)} minutes ...')
+        time.sleep(sleep_for)
+
+
+def load_last_updated():
     path = f'{util.one_dir_up()}/out/last_updated_LATEST.json'
-    datetime_format_str = "%d-%m-%Y"
 
     if not os.path.exists(path):
-        print("last_updated_LATEST.json doesn't exist! Running program ...")
-        return False
+        return None
+
+    try:
+        return records.load(path, "last_updated")
+    except (ValueError, KeyError) as e:  # RecordError and JSONDecodeError are both ValueErrors
+        print(f"Malformed last_updated_LATEST.json file ({str(e)})!")
+        return None
 
-    with open(path) as f:
-        last_updated = json.load(f)
 
-    if 'application' not in last_updated or 'spreadsheet' not in last_updated:
-        print("Malformed last_updated_LATEST.json file! Running program ...")
-        return False
+def requires_refresh(service, current_date, refresh_rate_days, last_updated=None):
+    if last_updated is None:
+        print("No (valid) last_updated_LATEST.json! Running program ...")
+        return True, False
 
     last_update_app, last_update_spreadsheet = \
-        datetime.strptime(last_updated['application'], datetime_format_str).date(), \
-        datetime.strptime(last_updated['spreadsheet'], datetime_format_str).date()
+        datetime.strptime(last_updated.application, DATETIME_FORMAT_STR).date(), \
+        datetime.strptime(last_updated.spreadsheet, DATETIME_FORMAT_STR).date()
 
     update_last_refresh = (current_date.date() - last_update_app).days >= refresh_rate_days
     sheet_updated = has_sheet_been_updated(service, last_update_spreadsheet)
@@ -63,8 +104,8 @@ def requires_refresh(service, current_date, refresh_rate_days):
 def has_sheet_been_updated(service, program_last_update,
                            last_update_cell=constants.KILLER_CONSTANTS['misc']['last_updated'],
                            spreadsheet_id=constants.OTZ_SPREADSHEET_ID):
-    response = service.spreadsheets().get(spreadsheetId=spreadsheet_id, ranges=[last_update_cell], includeGridData=True
-                                          ).execute()['sheets'][0]['data'][0]['rowData'][0]['values'][0]
+    response = sheets.get(service, spreadsheet_id, [last_update_cell]
+                          )['sheets'][0]['data'][0]['rowData'][0]['values'][0]
 
     if not response['effectiveValue'] or not response['effectiveValue']['numberValue']:
         raise KeyError("[effectiveValue][numberValue] not in response! "
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import re
+from collections import Counter
+from typing import Dict, List
+
+from unidecode import unidecode
+
+# perk names are weighted above descriptions when ranking
+FIELD_WEIGHTS = {
+    "name": 3,
+    "description": 1,
+}
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is", "it", "its", "of", "on",
+    "or", "that", "the", "their", "them", "they", "this", "to", "was", "when", "which", "while", "will", "with", "you",
+    "your",
+}
+
+# (suffix, replacement, min stem length), checked in order; deliberately much simpler than a "real" stemmer (e.g.
+# Porter), it only needs to be good enough for "heal"/"healing"/"heals" to end up the same
+SUFFIXES = [
+    ("ies", "y", 3),
+    ("sses", "ss", 3),
+    ("ness", "", 4),
+    ("ing", "", 3),
+    ("edly", "", 3),
+    ("ed", "", 3),
+    ("ly", "", 3),
+    ("es", "", 3),
+    ("s", "", 3),
+]
+
+
+def stem(word: str) -> str:
+    for suffix, replacement, min_stem in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= min_stem:
+            word = word[:-len(suffix)] + replacement
+
+            # running -> runn -> run
+            if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]
+
+            return word
+
+    return word
+
+
+def tokenise(text: str) -> List[str]:
+    words = re.findall(r"[a-z0-9]+", unidecode(text).lower().replace("'", ""))
+    return [stem(w) for w in words if w not in STOP_WORDS]
+
+
+def build_search_index(*perks: Dict) -> Dict:
+    """
+    Builds an inverted index over perk names and descriptions, so the front-end can search perks by looking up the
+    (tokenised, stemmed) search terms instead of scanning every perk's description.
+
+    Takes any number of outputs from :func:`perk_scraper.scrape_perks` (i.e. killer perks and survivor perks).
+
+    :return: The index in the following format:
+    {
+        "perks": [[<perk_name> (str), <character_name> (str)]],  (ids used in postings are indexes into this)
+        "terms": {
+            <term> (str): [[<perk_id> (int), <score> (int)]]  (sorted by score, highest first)
+        }
+    }
+
+    Scores are how many times the term is in the perk's name and description, weighted by FIELD_WEIGHTS. To search,
+    tokenise the query the same way (see :func:`tokenise`), then add up the scores for each perk across every term.
+    """
+    index_perks = []
+    terms = {}
+    seen = set()
+
+    for perks_by_character in perks:
+        for character_name, character_perks in perks_by_character.items():
+            for perk_name, perk in character_perks.items():
+                # some perks are in more than one place (e.g. Demogorgon's perks are also under "All")
+                if perk_name in seen:
+                    continue
+
+                seen.add(perk_name)
+                perk_id = len(index_perks)
+                index_perks.append([perk_name, character_name])
+
+                scores = Counter()
+
+                for term in tokenise(perk_name):
+                    scores[term] += FIELD_WEIGHTS['name']
+
+                for term in tokenise(perk.get('description_raw', "")):
+                    scores[term] += FIELD_WEIGHTS['description']
+
+                for term, score in scores.items():
+                    terms.setdefault(term, []).append([perk_id, score])
+
+    for postings in terms.values():
+        postings.sort(key=lambda posting: (-posting[1], posting[0]))
+
+    return {"perks": index_perks, "terms": dict(sorted(terms.items()))}
+
+
+def search(index: Dict, query: str) -> List[List[str]]:
+    """ reference implementation of searching the index (the front-end should do the same), best match first """
+    scores = Counter()
+
+    for term in tokenise(query):
+        for perk_id, score in index['terms'].get(term, []):
+            scores[perk_id] += score
+
+    return [index['perks'][perk_id] for perk_id, _ in scores.most_common()]
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+import cli
+import palette
+import records
+import util
+
+OUT_DIR = f'{util.one_dir_up()}/out'
+
+# last_updated is the final file written by a run, so once it changes, everything else has been written too
+WATCH_FILE = f'{OUT_DIR}/last_updated_LATEST.json'
+
+RESOURCES = ("perks", "characters", "spreadsheet", "last_updated")
+
+# the query parameters that mean anything (see _select); any others are ignored, so they don't make another response
+FILTERS = ("type", "character", "tier")
+
+# most encoded responses kept per dataset (least recently used ones are dropped first); each distinct set of
+# filters is its own response, and there's nothing stopping clients from asking for any number of them
+MAX_CACHED_RESPONSES = 256
+
+
+class Dataset:
+    """
+    The output of one run, as served by the server. Never modified once loaded; a new run means a new Dataset (so
+    requests in progress keep seeing the run they started with).
+
+    Encoded responses are cached (up to MAX_CACHED_RESPONSES of them), so each resource (with each set of filters)
+    is usually only encoded / compressed once per run.
+    """
+
+    def __init__(self, version: float):
+        self.version = version
+        self.data = {}
+
+        for resource in RESOURCES:
+            with open(f'{OUT_DIR}/{resource}_LATEST.json', encoding='utf-8') as f:
+                self.data[resource] = json.load(f)
+
+            # checked against its records first, so a malformed file is rejected (keeping the previous dataset)
+            # rather than served; what's served is the file as it is, though, so it doesn't need encoding again
+            records.DECODERS[resource](self.data[resource])
+
+        self._responses = OrderedDict()
+        self._lock = threading.Lock()
+
+    def response(self, path: Tuple[str, ...], filters: Dict[str, str]) -> Tuple[bytes, bytes, str] | None:
+        """ :return: (body, gzipped body, etag) for the resource, or None if it doesn't exist """
+        filters = {k: filters[k] for k in FILTERS if k in filters}
+        key = (path, tuple(filters.items()))
+
+        with self._lock:
+            if key in self._responses:
+                self._responses.move_to_end(key)
+                return self._responses[key]
+
+        content = _select(self.data, path, filters)
+
+        if content is None:
+            return None
+
+        body = json.dumps(content, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        response = body, gzip.compress(body, mtime=0), f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+        with self._lock:
+            self._responses[key] = response
+
+            if len(self._responses) > MAX_CACHED_RESPONSES:
+                self._responses.popitem(last=False)
+
+        return response
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """ whether an If-None-Match header matches the etag: * matches anything, and W/ (weak) tags match too """
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return "*" in tags or etag in [tag.removeprefix("W/") for tag in tags]
+
+
+def _select(data: Dict, path: Tuple[str, ...], filters: Dict[str, str]):
+    """
+    Picks out the part of the dataset at the path (e.g. /characters/killers/Trapper), then applies any filters:
+
+    - type: killers / survivors
+    - character: only this character (perks, characters and spreadsheet)
+    - tier: only perks on the spreadsheet with this tier (name, palette index or hex, e.g. Top, 0 or %231155cc, i.e.
+            #1155cc; see palette.find_tier)
+    """
+    if not path or path[0] not in data:
+        return None
+
+    resource, content = path[0], data[path[0]]
+
+    if resource == "last_updated":
+        return content if len(path) == 1 else None
+
+    character_type, character = filters.get('type'), filters.get('character')
+    rest = list(path[1:])
+
+    if rest:
+        character_type = rest.pop(0)
+    if rest:
+        character = rest.pop(0)
+    if rest:
+        return None
+
+    if character_type is not None:
+        if character_type not in content:
+            return None
+
+        content = {character_type: content[character_type]}
+
+    types = [t for t in content if t in ("killers", "survivors")]
+
+    if resource == "spreadsheet":
+        tier = palette.find_tier(data['spreadsheet'], filters['tier']) if 'tier' in filters else None
+
+        content = {t: dict(content[t]) for t in types} | \
+                  ({} if character_type is not None else {k: v for k, v in content.items() if k not in types})
+
+        for t in types:
+            if character is not None:
+                content[t]['characters'] = {k: v for k, v in content[t]['characters'].items() if k == character}
+                content[t]['universals'] = {}
+
+            if 'tier' in filters:
+                content[t]['characters'] = {
+                    name: ch | {"perks": {k: p for k, p in ch['perks'].items() if p['tier'] == tier}}
+                    for name, ch in content[t]['characters'].items()
+                }
+                content[t]['universals'] = {k: p for k, p in content[t]['universals'].items() if p['tier'] == tier}
+
+    elif character is not None:
+        content = {t: {k: v for k, v in content[t].items() if k == character} for t in types}
+
+        if not any(content.values()):
+            return None
+
+    if len(path) == 3:  # a single character, no need to nest it
+        return content[character_type][character] if resource != "spreadsheet" else \
+            content[character_type]['characters'].get(character)
+
+    return content
+
+
+class DatasetHolder:
+    """ holds the current dataset, swapping it for a new one (atomically) whenever a new run finishes """
+
+    def __init__(self, reload_interval: float):
+        self.reload_interval = reload_interval
+        self.dataset = self._load()
+
+    def _load(self) -> Dataset:
+        dataset = Dataset(os.path.getmtime(WATCH_FILE))
+        print(f'Loaded dataset (last_updated={dataset.data["last_updated"]})')
+        return dataset
+
+    def watch(self):
+        while True:
+            time.sleep(self.reload_interval)
+
+            try:
+                if os.path.getmtime(WATCH_FILE) != self.dataset.version:
+                    self.dataset = self._load()
+            except Exception as e:
+                print(f'Unable to reload dataset, keeping the current one! ({str(e)})')
+
+
+def make_handler(holder: DatasetHolder):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            path = tuple(unquote(p) for p in url.path.strip('/').split('/') if p)
+            filters = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+            response = holder.dataset.response(path, filters)
+
+            if response is None:
+                self.send_error(404, f'Unknown resource (available: {", ".join(RESOURCES)})')
+                return
+
+            body, gzipped, etag = response
+
+            if _etag_matches(self.headers.get('If-None-Match', ""), etag):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+
+            use_gzip = 'gzip' in self.headers.get('Accept-Encoding', "")
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')  # always revalidate (which is cheap, thanks to the ETag)
+            self.send_header('Vary', 'Accept-Encoding')
+
+            if use_gzip:
+                self.send_header('Content-Encoding', 'gzip')
+
+            self.send_header('Content-Length', str(len(gzipped if use_gzip else body)))
+            self.end_headers()
+            self.wfile.write(gzipped if use_gzip else body)
+
+    return Handler
+
+
+def serve(host: str, port: int, reload_interval: float):
+    """
+    Serves the latest run's perks, characters, spreadsheet and last_updated as JSON:
+
+    - /<resource>: Everything (e.g. /perks)
+    - /<resource>/<character_type>: Only killers / survivors (e.g. /characters/killers)
+    - /<resource>/<character_type>/<character>: One character (e.g. /spreadsheet/survivors/Dwight)
+
+    As well as the filters described in :func:`_select` (e.g. /spreadsheet?tier=Top). Every response has an
+    ETag (so clients can revalidate with If-None-Match, and get a 304 if nothing's changed), and is gzipped if the
+    client accepts it. When a new run finishes, the new outputs are picked up without restarting.
+    """
+    holder = DatasetHolder(reload_interval)
+    threading.Thread(target=holder.watch, daemon=True).start()
+
+    server = ThreadingHTTPServer((host, port), make_handler(holder))
+    print(f'Serving on http://{host}:{port} ...')
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    args = cli.parse_server_args()
+    serve(args.host, args.port, args.reload_interval)
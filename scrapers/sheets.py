@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+
+from metrics import METRICS, SHEETS_QUOTA_PER_MINUTE
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 6
+MAX_BACKOFF = 64
+
+
+class TokenBucket:
+    """
+    Token bucket for the Sheets API quota (60 reqs/min per user at time of writing).
+
+    Google counts the quota per minute, so a bucket that starts full could let through its capacity *plus* a
+    minute's worth of refills in the same minute. To make sure this never happens, the capacity (burst) is taken out
+    of the refill rate, i.e. burst + rate * 1 min = quota.
+    """
+
+    def __init__(self, quota_per_minute: int = SHEETS_QUOTA_PER_MINUTE, burst: int = None):
+        self.quota_per_minute = quota_per_minute
+        self.capacity = burst if burst is not None else max(1, quota_per_minute // 4)
+        self.rate = max(1, quota_per_minute - self.capacity) / 60  # tokens / second
+
+        self.tokens = float(self.capacity)
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self) -> float:
+        """ blocks until a request can be made, returning how long was spent waiting (in seconds) """
+        waited = 0.0
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+
+            time.sleep(wait)
+            waited += wait
+
+    def block(self, seconds: float):
+        """ stops anything from being let through for the given amount of time (e.g. after being told to back off) """
+        with self._lock:
+            self.tokens = 0.0
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+LIMITER = TokenBucket()
+
+# usage for the current run (reset with start_run)
+USAGE = {"requests": 0, "retries": 0, "throttled_seconds": 0.0}
+_USAGE_LOCK = threading.Lock()
+
+# each thread's own connection to the API (see _thread_http)
+_LOCAL = threading.local()
+
+
+def configure(quota_per_minute: int):
+    global LIMITER
+
+    if quota_per_minute != LIMITER.quota_per_minute:
+        LIMITER = TokenBucket(quota_per_minute)
+        METRICS.sheets_quota_per_minute = quota_per_minute
+
+
+def start_run():
+    with _USAGE_LOCK:
+        for key in USAGE:
+            USAGE[key] = 0
+
+
+def _add_usage(key: str, value: float = 1):
+    with _USAGE_LOCK:
+        USAGE[key] += value
+
+
+def quota_report() -> str:
+    return f'Sheets API: {USAGE["requests"]} requests ({USAGE["retries"]} retries), ' \
+           f'throttled for {round(USAGE["throttled_seconds"], 1)}s ' \
+           f'(quota={LIMITER.quota_per_minute}/min, peak={METRICS.sheets_peak_calls_per_minute}/min)'
+
+
+def build_service(creds_path: str):
+    """
+    Builds the Google Sheets API service.
+
+    The Google libraries are pretty heavy to import, so they're only imported here (i.e. when the sheet actually needs
+    to be scraped). The discovery document for the Sheets API is the one that comes with googleapiclient (static
+    discovery), so it's never fetched from Google.
+    """
+    from google.oauth2.service_account import Credentials
+    from googleapiclient.discovery import build
+
+    credentials = Credentials.from_service_account_file(creds_path)
+    return build('sheets', 'v4', credentials=credentials, static_discovery=True)
+
+
+def get(service, spreadsheet_id: str, ranges: list, include_grid_data: bool = True) -> dict:
+    """
+    Every request to the Sheets API should go through here, so that they're all counted against (and limited by)
+    the quota.
+
+    If Google tells us to back off (429) or has a server error (5xx), the request is retried with exponential backoff
+    (or however long Google asks us to wait, if it does), and the limiter is paused so nothing else goes through in
+    the meantime.
+
+    Services that aren't the API (e.g. xlsx.XlsxService, reading from an export of the spreadsheet) have no quota, so
+    they're called straight away.
+
+    Safe to call from several threads at once with the same service (e.g. otz_scraper.scrape_sheets): they all share
+    the one quota, and each thread sends its requests over its own connection.
+    """
+    if getattr(service, 'rate_limited', True) is False:
+        return service.spreadsheets().get(spreadsheetId=spreadsheet_id, ranges=ranges,
+                                          includeGridData=include_grid_data).execute()
+
+    from googleapiclient.errors import HttpError
+
+    for attempt in range(MAX_RETRIES + 1):
+        throttled = LIMITER.acquire()
+        _add_usage("throttled_seconds", throttled)
+        METRICS.inc("sheets_throttled_seconds_total", throttled)
+
+        _add_usage("requests")
+        METRICS.record_sheets_call()
+
+        try:
+            with METRICS.timed("sheets_request_seconds"):
+                return service.spreadsheets().get(spreadsheetId=spreadsheet_id, ranges=ranges,
+                                                  includeGridData=include_grid_data).execute(http=_thread_http(service))
+        except HttpError as e:
+            status = int(e.resp.status)
+
+            if status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                raise
+
+            backoff = _retry_after(e.resp) or min(MAX_BACKOFF, 2 ** attempt + random.uniform(0, 1))
+
+            print(f'Sheets API responded with {status}, retrying in {round(backoff, 1)}s '
+                  f'(attempt {attempt + 1}/{MAX_RETRIES})...')
+
+            _add_usage("retries")
+            METRICS.inc("sheets_retries_total", status=status)
+            LIMITER.block(backoff)
+
+
+def _thread_http(service):
+    """
+    The service's HTTP client (httplib2) isn't thread safe, so rather than building a whole service per thread, each
+    thread gets its own authorised connection (with the service's credentials), made the first time it's needed.
+    """
+    credentials = getattr(getattr(service, '_http', None), 'credentials', None)
+
+    if credentials is None:
+        return None  # not authorised through google-auth, so just use the service's own
+
+    if getattr(_LOCAL, 'http', None) is None or _LOCAL.credentials is not credentials:
+        import google_auth_httplib2
+        import httplib2
+
+        _LOCAL.http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http())
+        _LOCAL.credentials = credentials
+
+    return _LOCAL.http
+
+
+def _retry_after(resp) -> float | None:
+    retry_after = resp.get('retry-after')
+
+    try:
+        return float(retry_after) if retry_after is not None else None
+    except ValueError:  # can also be a HTTP date, but Google only seems to send seconds
+        return None
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple
+
+import util
+from assets import ASSET_SIZES, WEBP_QUALITY
+
+SPRITES_DIR = f'{util.one_dir_up()}/out/sprites'
+
+TILE_SIZE = ASSET_SIZES['icon']
+MAX_ATLAS_SIZE = 2048
+
+
+def generate_perk_atlases(spreadsheets: Dict, no_workers: int = 16) -> Tuple[Dict, set]:
+    """
+    Packs the icons of every perk in the (transformed) spreadsheet output into sprite atlases, one set per character
+    type (out/sprites/<character_type>_<index>.<hash>.webp), so the front-end only needs a few image requests instead
+    of one per perk.
+
+    Atlases are named with a hash of the icons in them (and where they go), so they can be cached forever by the
+    browser, and atlases that are already there from a previous run aren't packed and encoded again. Atlases from
+    previous runs that are no longer used aren't removed here, as the map that's already been saved still points at
+    them; they're returned, for remove_atlases once the new map's been saved.
+
+    Works with both remote icons and ones that have already been mirrored locally (see assets.mirror_assets).
+    Requires Pillow; if it isn't installed, nothing is generated.
+
+    :return: (the map, the paths of the stale atlases). The coordinate map of the atlases is in the following format:
+    {
+        "tile_size": (int),
+        <character_type> (str): {
+            "atlases": [<path relative to out/> (str)],
+            "perks": {
+                <perk_name, same as in spreadsheet_LATEST.json> (str): {atlas (int), x (int), y (int), w (int), h (int)}
+            }
+        }
+    }
+    """
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        print("Pillow isn't installed, skipping generating sprite atlases!")
+        return {}, set()
+
+    print("Starting generating perk sprite atlases...")
+
+    os.makedirs(SPRITES_DIR, exist_ok=True)
+
+    sprite_map = {"tile_size": TILE_SIZE}
+    stale = set()
+
+    for character_type in ("killers", "survivors"):
+        if character_type not in spreadsheets:
+            continue
+
+        icons = _collect_perk_icons(spreadsheets[character_type])
+
+        with ThreadPoolExecutor(max_workers=no_workers) as executor:
+            images = dict(zip(icons.keys(), executor.map(_load_image, icons.values())))
+
+        sprite_map[character_type] = _pack(character_type, {k: v for k, v in images.items() if v is not None})
+        # only this character type's, so the atlases of any that are missing (i.e. aren't being replaced) are kept
+        stale.update(f'sprites/{file_name}' for file_name in os.listdir(SPRITES_DIR)
+                     if file_name.startswith(f'{character_type}_')
+                     and f'sprites/{file_name}' not in sprite_map[character_type]['atlases'])
+
+    return sprite_map, stale
+
+
+def _collect_perk_icons(spreadsheet: Dict) -> Dict[str, str]:
+    icons = {}
+
+    for character in spreadsheet['characters'].values():
+        for name, perk in character['perks'].items():
+            icons[name] = perk['icon']
+
+    for name, perk in spreadsheet['universals'].items():
+        icons[name] = perk['icon']
+
+    return dict(sorted(icons.items()))
+
+
+def _load_image(icon: str):
+    from PIL import Image
+
+    try:
+        if icon.startswith("http"):
+            content = util.get_response(icon).content  # from Fandom, so through concurrency.FANDOM_LIMITER
+        else:
+            with open(f'{util.one_dir_up()}/out/{icon}', 'rb') as f:
+                content = f.read()
+
+        image = Image.open(io.BytesIO(content)).convert('RGBA')
+        image.thumbnail((TILE_SIZE, TILE_SIZE))
+        return image
+    except Exception as e:
+        print(f'Unable to load perk icon {icon}! ({str(e)})')
+        return None
+
+
+def _pack(character_type: str, images: Dict) -> Dict:
+    """
+    All perk icons are (roughly) the same size, so they're just laid out in a grid of fixed size tiles, with as many
+    atlases as needed to keep each one under MAX_ATLAS_SIZE.
+    """
+    from PIL import Image
+
+    per_row = MAX_ATLAS_SIZE // TILE_SIZE
+    per_atlas = per_row * per_row
+
+    names = list(images.keys())
+    atlases = []
+    perks = {}
+
+    for atlas_idx, start in enumerate(range(0, len(names), per_atlas)):
+        chunk = names[start:start + per_atlas]
+
+        columns = min(per_row, math.ceil(math.sqrt(len(chunk))))
+        rows = math.ceil(len(chunk) / columns)
+
+        # every tile's pixels and position, plus anything else that changes the encoded file
+        content_hash = hashlib.sha256(f'{TILE_SIZE}:{WEBP_QUALITY}:{columns}x{rows}'.encode('utf-8'))
+
+        for i, name in enumerate(chunk):
+            image = images[name]
+            x, y = (i % columns) * TILE_SIZE, (i // columns) * TILE_SIZE
+
+            content_hash.update(f'{x},{y},{image.width},{image.height}'.encode('utf-8'))
+            content_hash.update(image.tobytes())
+            perks[name] = {"atlas": atlas_idx, "x": x, "y": y, "w": image.width, "h": image.height}
+
+        file_name = f'{character_type}_{atlas_idx}.{content_hash.hexdigest()[:12]}.webp'
+
+        # same name = same content, so there's nothing to do if it's already there
+        if not os.path.exists(f'{SPRITES_DIR}/{file_name}'):
+            atlas = Image.new('RGBA', (columns * TILE_SIZE, rows * TILE_SIZE), (0, 0, 0, 0))
+
+            for name in chunk:
+                atlas.paste(images[name], (perks[name]['x'], perks[name]['y']))
+
+            atlas.save(f'{SPRITES_DIR}/{file_name}.tmp', 'WEBP', quality=WEBP_QUALITY)
+            os.replace(f'{SPRITES_DIR}/{file_name}.tmp', f'{SPRITES_DIR}/{file_name}')
+
+        atlases.append(f'sprites/{file_name}')
+
+    return {"atlases": atlases, "perks": perks}
+
+
+def remove_atlases(paths: set):
+    """ removes the given (stale) atlases, see generate_perk_atlases """
+    for path in paths:
+        full_path = f'{SPRITES_DIR}/{os.path.basename(path)}'
+
+        if os.path.exists(full_path):
+            os.remove(full_path)
@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+import hashlib
+import html
+import json
+import os
+from string import Template
+from typing import Dict, List
+
+import util
+
+SITE_DIR = f'{util.one_dir_up()}/out/site'
+MANIFEST_PATH = f'{SITE_DIR}/manifest.json'
+
+CHARACTER_TYPES = ("killers", "survivors")
+
+
+# ---------------- TEMPLATES --------------------
+# $root is the relative path from the page to the top of the site, so the pages work wherever they're served from
+# (or straight off the disk).
+PAGE = Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>$title</title>
+<link rel="stylesheet" href="$root/style.css">
+</head>
+<body>
+<nav>
+<a href="$root/index.html">Otz's Quick Info Sheet</a>
+<a href="$root/killers/index.html">Killers</a>
+<a href="$root/survivors/index.html">Survivors</a>
+</nav>
+<main>
+<h1>$title</h1>
+$body
+</main>
+</body>
+</html>
+""")
+
+HOME = Template("""<p>Spreadsheet last updated $spreadsheet_updated.</p>
+<ul class="types">$types</ul>""")
+
+OVERVIEW = Template("""<p>Spreadsheet last updated $spreadsheet_updated.</p>
+<ul class="guides">$guides</ul>
+<div class="characters">$characters</div>
+<h2>Universal Perks</h2>
+<ul class="perks">$universals</ul>""")
+
+CHARACTER_CARD = Template("""<section class="character">
+<a href="$slug.html"><img src="$icon" alt="" loading="lazy"><h2>$name</h2></a>
+$availability
+<dl>$stats</dl>
+<ul class="perks">$perks</ul>
+</section>""")
+
+CHARACTER = Template("""<div class="character-page">
+<img class="portrait" src="$image" alt="">
+<div>
+$availability
+<dl>$stats</dl>
+<p><a href="$wiki_link">Wiki</a></p>
+$power
+</div>
+</div>
+<h2>Perks</h2>
+<ul class="perks detailed">$perks</ul>""")
+
+POWER = Template("""<h2><img src="$icon" alt="" loading="lazy"> $name</h2>
+<p class="power">$desc</p>""")
+
+AVAILABILITY = Template("""<p class="availability" style="background: $colour">$value</p>""")
+
+STAT = Template("""<dt>$label</dt><dd>$value</dd>""")
+
+PERK = Template("""<li class="perk" style="border-color: $colour" title="$tier"><img src="$icon" alt="" loading="lazy">
+<span>$name</span>$description</li>""")
+
+LINK = Template("""<li><a href="$href">$text</a></li>""")
+
+STYLE = """body { margin: 0; font-family: sans-serif; background: #1b1b1b; color: #eee; }
+nav { display: flex; gap: 1em; padding: 0.75em 1em; background: #000; }
+a { color: #8ab4f8; }
+main { max-width: 72em; margin: auto; padding: 0 1em 2em; }
+.characters { display: grid; grid-template-columns: repeat(auto-fill, minmax(16em, 1fr)); gap: 1em; }
+.character { background: #262626; padding: 0.75em; border-radius: 4px; }
+.character a { color: inherit; text-decoration: none; }
+.character img { width: 64px; height: 64px; }
+.availability { display: inline-block; padding: 0.1em 0.5em; border-radius: 4px; }
+dl { display: grid; grid-template-columns: auto 1fr; gap: 0.25em 1em; }
+dt { font-weight: bold; }
+dd { margin: 0; }
+.perks { list-style: none; padding: 0; }
+.perk { display: flex; align-items: center; gap: 0.5em; margin: 0.25em 0; border-left: 6px solid; padding-left: 0.5em; }
+.perk img { width: 48px; height: 48px; }
+.detailed .perk { align-items: flex-start; flex-wrap: wrap; }
+.detailed .perk > div { flex-basis: 100%; }
+.character-page { display: flex; gap: 2em; flex-wrap: wrap; }
+.portrait { max-width: 20em; }
+.power { white-space: pre-line; }
+"""
+
+# should be bumped whenever the rendering code (rather than the templates) changes, e.g. a label, so every page is
+# rendered again
+RENDER_VERSION = 2
+
+# every page depends on the templates too, so changing any of them re-renders everything
+TEMPLATES_HASH = hashlib.sha256("".join(
+    [t.template for t in (PAGE, HOME, OVERVIEW, CHARACTER_CARD, CHARACTER, POWER, AVAILABILITY, STAT, PERK, LINK)] +
+    [STYLE, str(RENDER_VERSION)]).encode('utf-8')).hexdigest()
+
+STATS = {
+    "killers": (("movement_speed", "Movement Speed"), ("terror_radius", "Terror Radius")),
+    "survivors": (("stealth", "Stealth"), ("noise", "Noise"), ("cries", "Cries")),
+}
+
+
+class Html(str):
+    """ HTML that's already been rendered (or is trusted), so isn't escaped again when it's put into a template """
+
+
+def render(template: Template, **fields) -> Html:
+    """ fills in the template, escaping every field that isn't already Html """
+    return Html(template.substitute({k: v if isinstance(v, Html) else html.escape(str(v)) for k, v in fields.items()}))
+
+
+def join(parts: List[Html]) -> Html:
+    return Html("\n".join(parts))
+
+
+# ---------------- SITE --------------------
+def render_site(perks: Dict, characters: Dict, spreadsheets: Dict) -> Dict[str, int]:
+    """
+    Pre-renders the Killer and Survivor Info pages as static HTML (in out/site), so visitors get the finished pages
+    rather than having to download all the JSON and build them client-side:
+
+    - index.html: Links to both overviews.
+    - <character_type>/index.html: Every character on the sheet (availability, stats and their perks' tiers), plus
+                                   the universal perks.
+    - <character_type>/<name>.html: One character, with their wiki info and each perk's description.
+
+    Pages are only rendered (and written) if their inputs (the bit of the JSON they show, and the templates) have
+    changed since the last run, which is tracked by a hash of them in out/site/manifest.json. Usually that's just
+    the handful of characters whose tiers changed. Pages from previous runs that are no longer used are removed.
+
+    :return: How many pages were written, left unchanged and removed.
+    """
+    print("Starting rendering static site...")
+
+    os.makedirs(SITE_DIR, exist_ok=True)
+
+    old_manifest = _load_manifest()
+    manifest = {}
+    written = 0
+
+    for path, inputs, render_page in _pages(perks, characters, spreadsheets):
+        digest = _digest(inputs)
+        manifest[path] = digest
+
+        if old_manifest.get(path) == digest and os.path.exists(f'{SITE_DIR}/{path}'):
+            continue
+
+        os.makedirs(os.path.dirname(f'{SITE_DIR}/{path}'), exist_ok=True)
+        util.write_atomic(f'{SITE_DIR}/{path}', render_page(inputs))
+        written += 1
+
+    removed = [path for path in old_manifest if path not in manifest]
+
+    for path in removed:
+        if os.path.exists(f'{SITE_DIR}/{path}'):
+            os.remove(f'{SITE_DIR}/{path}')
+
+    util.write_atomic(MANIFEST_PATH, json.dumps(manifest, indent=4, sort_keys=True))
+
+    counts = {"written": written, "unchanged": len(manifest) - written, "removed": len(removed)}
+    print(f"Finished rendering static site ({counts['written']} pages written, {counts['unchanged']} unchanged, "
+          f"{counts['removed']} removed).")
+
+    return counts
+
+
+def _load_manifest() -> Dict[str, str]:
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except ValueError:
+        return {}  # everything's just rendered again
+
+
+def _digest(inputs: Dict) -> str:
+    content = json.dumps(inputs, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(f'{TEMPLATES_HASH}{content}'.encode('utf-8')).hexdigest()
+
+
+def _pages(perks: Dict, characters: Dict, spreadsheets: Dict):
+    """ yields (path, inputs, render function) for every page, where the page is render(inputs) """
+    palettes = spreadsheets['palette']
+    spreadsheet_updated = spreadsheets['last_updated']['spreadsheet']
+
+    yield "style.css", {"style": STYLE}, lambda inputs: inputs['style']
+    yield "index.html", {"spreadsheet_updated": spreadsheet_updated}, _render_home
+
+    for character_type in CHARACTER_TYPES:
+        sheet = spreadsheets[character_type]
+
+        yield f'{character_type}/index.html', {
+            "character_type": character_type,
+            "spreadsheet_updated": spreadsheet_updated,
+            "guides": spreadsheets['guides'].get(character_type, []),
+            "characters": sheet['characters'],
+            "universals": sheet['universals'],
+            "palette": palettes,
+        }, _render_overview
+
+        for name, sheet_character in sheet['characters'].items():
+            yield f'{character_type}/{util.slugify(name)}.html', {
+                "character_type": character_type,
+                "spreadsheet": sheet_character,
+                "character": characters[character_type].get(name, {}),
+                "perks": perks[character_type].get(name, {}),
+                "palette": palettes,
+            }, _render_character
+
+
+def _page(title: str, root: str, body: Html) -> str:
+    return render(PAGE, title=title, root=Html(root), body=body)
+
+
+def _src(url: str, root: str) -> str:
+    """ mirrored assets (see assets.py) are relative to out/, i.e. one up from the site """
+    return url if not url or url.startswith(('http://', 'https://')) else f'{root}/../{url}'
+
+
+def _render_home(inputs: Dict) -> str:
+    types = join([render(LINK, href=f'{character_type}/index.html', text=character_type.capitalize())
+                  for character_type in CHARACTER_TYPES])
+
+    return _page("Otz's Quick Info Sheet", ".", render(HOME, spreadsheet_updated=inputs['spreadsheet_updated'],
+                                                       types=types))
+
+
+def _render_overview(inputs: Dict) -> str:
+    character_type, palettes = inputs['character_type'], inputs['palette']
+
+    guides = join([render(LINK, href=guide['hyperlink'], text=f'{guide["title"]} {guide["link_text"]}')
+                   for guide in inputs['guides']])
+
+    cards = join([render(CHARACTER_CARD, slug=util.slugify(name), icon=_src(character.get('icon', ""), ".."), name=name,
+                         availability=_render_availability(character['availability'], palettes),
+                         stats=_render_stats(character_type, character),
+                         perks=join([_render_perk(perk, palettes, "..") for perk in character['perks'].values()]))
+                  for name, character in inputs['characters'].items()])
+
+    universals = join([_render_perk(perk, palettes, "..") for perk in inputs['universals'].values()])
+
+    return _page(character_type.capitalize(), "..", render(OVERVIEW, spreadsheet_updated=inputs['spreadsheet_updated'],
+                                                           guides=guides, characters=cards, universals=universals))
+
+
+def _render_character(inputs: Dict) -> str:
+    character_type, palettes = inputs['character_type'], inputs['palette']
+    sheet_character, character = inputs['spreadsheet'], inputs['character']
+
+    # the sheet's perk names don't always match the wiki's, but their icons do (they're matched up in main)
+    wiki_perks = {util.image_name(perk['icon']): perk for perk in inputs['perks'].values()}
+
+    perks = []
+
+    for sheet_perk in sheet_character['perks'].values():
+        wiki_perk = wiki_perks.get(util.image_name(sheet_perk.get('icon', "")), inputs['perks'].get(sheet_perk['name']))
+
+        # descriptions are rendered (and whitelisted) by perk_scraper, so they can go in as they are
+        description = Html(f'<div>{wiki_perk["description"]}</div>') if wiki_perk is not None else Html("")
+        perks.append(_render_perk(sheet_perk, palettes, "..", description))
+
+    power = character.get('power')
+    power = render(POWER, icon=_src(power['icon'], ".."), name=power['name'], desc=power['desc']) \
+        if power and power.get('name') else Html("")
+
+    stats = _render_stats(character_type, sheet_character)
+
+    if character.get('former_name'):
+        stats = join([render(STAT, label="Real Name", value=character['former_name']), stats])
+
+    body = render(CHARACTER, image=_src(character.get('image_half') or sheet_character.get('icon', ""), ".."),
+                  availability=_render_availability(sheet_character['availability'], palettes), stats=stats,
+                  wiki_link=character.get('wiki_link', ""), power=power, perks=join(perks))
+
+    return _page(sheet_character['name'], "..", body)
+
+
+def _render_availability(availability: Dict, palettes: Dict) -> Html:
+    return render(AVAILABILITY, colour=palettes['availability'][availability['colour']]['hex'],
+                  value=availability['value'])
+
+
+def _render_stats(character_type: str, character: Dict) -> Html:
+    return join([render(STAT, label=label, value=character[key]) for key, label in STATS[character_type]
+                 if character.get(key)])
+
+
+def _render_perk(perk: Dict, palettes: Dict, root: str, description: Html = Html("")) -> Html:
+    tier = palettes['tiers'][perk['tier']]
+    name = f'{perk["name"]} (Exhaustion)' if perk.get('is_exhaustion_perk') else perk['name']
+
+    return render(PERK, colour=tier['hex'], tier=tier['name'], icon=_src(perk.get('icon', ""), root), name=name,
+                  description=description)
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import palette
+import util
+
+DB_PATH = f'{util.one_dir_up()}/out/otz.db'
+
+CHARACTER_TYPES = ("killers", "survivors")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_date TEXT NOT NULL,
+    spreadsheet_updated TEXT,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS perks (
+    character_type TEXT NOT NULL,
+    character TEXT NOT NULL,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    icon TEXT,
+    description_raw TEXT,
+    is_upcoming_patch INTEGER,
+    data TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    PRIMARY KEY (character_type, character, name)
+);
+CREATE INDEX IF NOT EXISTS perks_name ON perks (name);
+CREATE INDEX IF NOT EXISTS perks_character ON perks (character);
+
+CREATE TABLE IF NOT EXISTS characters (
+    character_type TEXT NOT NULL,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    wiki_link TEXT,
+    data TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    PRIMARY KEY (character_type, name)
+);
+CREATE INDEX IF NOT EXISTS characters_name ON characters (name);
+CREATE INDEX IF NOT EXISTS characters_wiki_link ON characters (wiki_link);
+
+CREATE TABLE IF NOT EXISTS sheet_characters (
+    character_type TEXT NOT NULL,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    availability TEXT,
+    data TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    PRIMARY KEY (character_type, name)
+);
+CREATE INDEX IF NOT EXISTS sheet_characters_name ON sheet_characters (name);
+
+-- perks on the spreadsheet; universal perks have character = 'All'
+CREATE TABLE IF NOT EXISTS sheet_perks (
+    character_type TEXT NOT NULL,
+    character TEXT NOT NULL,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    tier TEXT,
+    data TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    PRIMARY KEY (character_type, character, name)
+);
+CREATE INDEX IF NOT EXISTS sheet_perks_name ON sheet_perks (name);
+CREATE INDEX IF NOT EXISTS sheet_perks_character ON sheet_perks (character);
+CREATE INDEX IF NOT EXISTS sheet_perks_tier ON sheet_perks (tier);
+"""
+
+UNIVERSALS = "All"
+
+
+def connect(path: str = DB_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def exists(path: str = DB_PATH) -> bool:
+    return os.path.exists(path)
+
+
+def save_run(conn: sqlite3.Connection, perks: Dict, characters: Dict, spreadsheets: Dict, current_date: str) -> int:
+    """
+    Stores the final JSON (perks, characters, spreadsheet) from a run. Rows are upserted, then anything that wasn't
+    part of this run is removed, all in one transaction (so readers never see a half-written run).
+
+    :return: The id of the run.
+    """
+    with conn:
+        run_id = conn.execute("INSERT INTO runs (run_date, spreadsheet_updated, created_at) VALUES (?, ?, ?)",
+                              (current_date, spreadsheets['last_updated']['spreadsheet'],
+                               datetime.now().isoformat())).lastrowid
+
+        conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                         [("last_updated", json.dumps(spreadsheets['last_updated'])),
+                          ("guides", json.dumps(spreadsheets['guides'])),
+                          ("palette", json.dumps(spreadsheets['palette']))])
+
+        for character_type in CHARACTER_TYPES:
+            conn.executemany(
+                "INSERT OR REPLACE INTO perks (character_type, character, name, position, icon, description_raw, "
+                "is_upcoming_patch, data, run_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(character_type, character, name, i, perk.get('icon'), perk.get('description_raw'),
+                  perk.get('is_upcoming_patch'), json.dumps(perk, ensure_ascii=False), run_id)
+                 for character, character_perks in perks[character_type].items()
+                 for i, (name, perk) in enumerate(character_perks.items())])
+
+            conn.executemany(
+                "INSERT OR REPLACE INTO characters (character_type, name, position, wiki_link, data, run_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(character_type, name, i, character.get('wiki_link'), json.dumps(character, ensure_ascii=False),
+                  run_id) for i, (name, character) in enumerate(characters[character_type].items())])
+
+            sheet = spreadsheets[character_type]
+
+            conn.executemany(
+                "INSERT OR REPLACE INTO sheet_characters (character_type, name, position, availability, data, run_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(character_type, name, i, character.get('availability', {}).get('value'),
+                  json.dumps({k: v for k, v in character.items() if k != 'perks'}, ensure_ascii=False), run_id)
+                 for i, (name, character) in enumerate(sheet['characters'].items())])
+
+            sheet_perks = [(name, perk_name, perk) for name, character in sheet['characters'].items()
+                           for perk_name, perk in character['perks'].items()] + \
+                          [(UNIVERSALS, perk_name, perk) for perk_name, perk in sheet['universals'].items()]
+
+            conn.executemany(
+                "INSERT OR REPLACE INTO sheet_perks (character_type, character, name, position, tier, data, run_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(character_type, character, name, i, palette.tier_hex(spreadsheets, perk['tier']),
+                  json.dumps(perk, ensure_ascii=False), run_id)
+                 for i, (character, name, perk) in enumerate(sheet_perks)])
+
+        for table in ("perks", "characters", "sheet_characters", "sheet_perks"):
+            conn.execute(f"DELETE FROM {table} WHERE run_id != ?", (run_id,))
+
+    return run_id
+
+
+# ---------------- QUERIES --------------------
+def get_perk(conn: sqlite3.Connection, name: str) -> Dict | None:
+    row = conn.execute("SELECT data FROM perks WHERE name = ? LIMIT 1", (name,)).fetchone()
+    return json.loads(row['data']) if row is not None else None
+
+
+def get_character_perks(conn: sqlite3.Connection, character: str) -> Dict:
+    rows = conn.execute("SELECT name, data FROM perks WHERE character = ? ORDER BY position", (character,))
+    return {row['name']: json.loads(row['data']) for row in rows}
+
+
+def get_character(conn: sqlite3.Connection, name: str) -> Dict | None:
+    row = conn.execute("SELECT data FROM characters WHERE name = ? LIMIT 1", (name,)).fetchone()
+    return json.loads(row['data']) if row is not None else None
+
+
+def get_sheet_perks_by_tier(conn: sqlite3.Connection, tier) -> List[Tuple[str, Dict]]:
+    """
+    :return: (character, perk) for every perk on the sheet with the given tier: its name, palette index or colour
+             (hex or rgb dict, any shade of the tier), like the server's ?tier= (see palette.find_tier)
+    """
+    tier = util.colour_to_hex(tier) if isinstance(tier, dict) else str(tier)
+
+    # tiers are stored as hex (the palette's colour for the tier), so they can be indexed / compared
+    row = conn.execute("SELECT value FROM meta WHERE key = 'palette'").fetchone()
+
+    if row is not None:
+        stored = {"palette": json.loads(row['value'])}
+        index = palette.find_tier(stored, tier)
+
+        if index is None:
+            return []
+
+        tier = palette.tier_hex(stored, index)
+
+    rows = conn.execute("SELECT character, data FROM sheet_perks WHERE tier = ?", (tier.lower(),))
+    return [(row['character'], json.loads(row['data'])) for row in rows]
+
+
+def get_scraped_characters(conn: sqlite3.Connection, character_type: str) -> Tuple[List[str], Dict]:
+    """ same return as :func:`character_scraper._generate_already_scraped_list` """
+    rows = conn.execute("SELECT name, wiki_link, data FROM characters WHERE character_type = ? ORDER BY position",
+                        (character_type,)).fetchall()
+
+    return [row['wiki_link'] for row in rows if row['wiki_link']], \
+           {row['name']: json.loads(row['data']) for row in rows}
+
+
+# ---------------- JSON EXPORT --------------------
+def export_json(conn: sqlite3.Connection) -> Tuple[Dict, Dict, Dict]:
+    """
+    Rebuilds the final JSON (perks, characters, spreadsheet) from the database, in the same shape as
+    :func:`main.transform_dicts`.
+    """
+    perks = {character_type: {} for character_type in CHARACTER_TYPES}
+    characters = {character_type: {} for character_type in CHARACTER_TYPES}
+
+    meta = {row['key']: json.loads(row['value']) for row in conn.execute("SELECT key, value FROM meta")}
+    spreadsheets = {"last_updated": meta.get('last_updated', {}), "guides": meta.get('guides', {})} | \
+                   {character_type: {"characters": {}, "universals": {}} for character_type in CHARACTER_TYPES}
+
+    # databases written before there was a palette don't have one (and neither do their spreadsheets)
+    if 'palette' in meta:
+        spreadsheets['palette'] = meta['palette']
+
+    for row in conn.execute("SELECT * FROM perks ORDER BY character_type, rowid"):
+        perks[row['character_type']].setdefault(row['character'], {})
+        perks[row['character_type']][row['character']][row['name']] = json.loads(row['data'])
+
+    for row in conn.execute("SELECT * FROM characters ORDER BY position"):
+        characters[row['character_type']][row['name']] = json.loads(row['data'])
+
+    for row in conn.execute("SELECT * FROM sheet_characters ORDER BY position"):
+        spreadsheets[row['character_type']]['characters'][row['name']] = json.loads(row['data']) | {"perks": {}}
+
+    for row in conn.execute("SELECT * FROM sheet_perks ORDER BY position"):
+        sheet = spreadsheets[row['character_type']]
+
+        if row['character'] == UNIVERSALS:
+            sheet['universals'][row['name']] = json.loads(row['data'])
+        else:
+            sheet['characters'][row['character']]['perks'][row['name']] = json.loads(row['data'])
+
+    return perks, characters, spreadsheets
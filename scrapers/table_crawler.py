@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import urljoin
+
+import util
+from scrapers import constants
+
+ROW_CACHE_PATH = f'{util.one_dir_up()}/out/cache/wiki_table_rows.json'
+
+# page url -> the same page on other language's wikis (see localisation.py), for every page that's been crawled
+LANGUAGE_LINKS = {}
+
+
+@dataclass(slots=True)
+class Column:
+    """
+    Where a value is in a table row, and how to get it out.
+
+    index: Position of the cell in the row (counting both <th> and <td> cells).
+    kind: text (the cell's text), icon (the image it links to, without the revision), link (where it links to, as a
+          full URL) or html (its contents, as compact HTML with only the spec's allowed_tags).
+    select: CSS selector for the element in the cell to use, rather than the whole cell.
+    parse: Used instead of kind, for anything more involved: (element, wiki base link) -> value.
+    """
+    index: int
+    kind: str = "text"
+    select: str | None = None
+    parse: Callable | None = None
+
+
+@dataclass(slots=True)
+class TableSpec:
+    """
+    A dataset on the wiki made up of tables: which pages they're on, and what's in each column.
+
+    build turns a row's values (column name -> value, plus "heading": the heading the table is under) into
+    (group, row), e.g. (character name, perk). Rows are keyed by their "name" within each group.
+
+    allowed_tags are the only elements (tag -> allowed attributes) kept in html columns; everything else is stripped
+    out, so each dataset says what the site actually uses from it.
+
+    version should be bumped whenever the columns or build change, so rows cached from before are parsed again.
+    """
+    name: str
+    urls: List[str]
+    columns: Dict[str, Column]
+    build: Callable[[Dict], Tuple[str, Dict]]
+    allowed_tags: Dict[str, frozenset]
+    table_selector: str = "table.wikitable"
+    all_tables: bool = True  # or just the first one on each page
+    header_rows: int = 1
+    version: int = 1
+
+
+def crawl(specs: List[TableSpec], no_workers: int) -> Dict[str, Dict[str, Dict[str, Dict]]]:
+    """
+    Crawls every page of every spec at once (through util.get_content, so concurrency.FANDOM_LIMITER still decides
+    how many requests are in flight), and parses each page's tables as soon as it's been fetched.
+
+    Rows are cached (in out/cache) by a hash of their HTML, so rows that haven't changed since the last run aren't
+    parsed again; on most runs, that's nearly all of them. Rows that have gone from the wiki are dropped from the
+    cache.
+
+    :return: A dictionary of datasets in the following format:
+    {
+        <spec name> (str): {
+            <group> (str): {
+                <name> (str): <row> (dict)
+            }
+        }
+    }
+    """
+    cache = _load_cache()
+
+    with ThreadPoolExecutor(max_workers=no_workers) as executor:
+        jobs = [(spec, executor.submit(_crawl_page, spec, url, cache.get(spec.name, {})))
+                for spec in specs for url in spec.urls]
+
+        datasets = {spec.name: {} for spec in specs}
+        new_cache = {spec.name: {} for spec in specs}
+
+        for spec, job in jobs:
+            for row_hash, group, row in job.result():
+                datasets[spec.name].setdefault(group, {})[row['name']] = row
+                new_cache[spec.name][row_hash] = [group, row]
+
+    _save_cache(cache | new_cache)
+
+    for spec in specs:
+        print(f"Crawled {sum(len(rows) for rows in datasets[spec.name].values())} {spec.name} from the wiki.")
+
+    return datasets
+
+
+def _crawl_page(spec: TableSpec, url: str, cached: Dict) -> List[Tuple[str, str, Dict]]:
+    soup = util.get_content(url)
+    LANGUAGE_LINKS[url] = util.language_links(soup)
+
+    return scrape_tables(soup, spec, util.wiki_base_link(url), cached)
+
+
+def scrape_tables(soup, spec: TableSpec, wiki_base_link: str = constants.DBD_WIKI_BASE_LINK,
+                  cached: Dict = None) -> List[Tuple[str, str, Dict]]:
+    """
+    Scrapes the rows of the spec's tables on the (already fetched) page.
+
+    :param cached: row hash -> [group, row], from previous runs; rows with the same hash aren't parsed again
+    :return: (row hash, group, row) for each row, in order
+    """
+    cached = cached if cached is not None else {}
+    rows = []
+
+    tables = soup.select(spec.table_selector) if spec.all_tables else [soup.select_one(spec.table_selector)]
+    no_cells = max(column.index for column in spec.columns.values()) + 1
+
+    for table in filter(None, tables):
+        heading = _heading(table)
+
+        for tr in table.find_all('tr')[spec.header_rows:]:
+            # the page URL matters too, as links in the row are relative to it
+            row_hash = hashlib.sha256(
+                f'{spec.name}:{spec.version}:{wiki_base_link}:{heading}:{tr}'.encode('utf-8')).hexdigest()
+
+            if row_hash in cached:
+                group, row = cached[row_hash]
+            else:
+                cells = tr.find_all(['th', 'td'], recursive=False)
+
+                if len(cells) < no_cells:  # e.g. sub-headers part of the way down the table
+                    continue
+
+                values = {name: _extract(cells[column.index], column, wiki_base_link, spec.allowed_tags)
+                          for name, column in spec.columns.items()}
+
+                group, row = spec.build(values | {"heading": heading})
+
+            rows.append((row_hash, group, row))
+
+    return rows
+
+
+def _heading(table) -> str:
+    heading = table.find_previous(['h2', 'h3', 'h4'])
+
+    if heading is None:
+        return ""
+
+    headline = heading.find(class_='mw-headline') or heading
+    return headline.text.replace("[edit]", "").strip()
+
+
+def _extract(cell, column: Column, wiki_base_link: str, allowed_tags: Dict[str, frozenset]):
+    element = cell.select_one(column.select) if column.select is not None else cell
+
+    if column.parse is not None:
+        return column.parse(element, wiki_base_link)
+
+    if element is None:
+        return ""
+
+    if column.kind == "icon":
+        a, img = element.find('a', href=True), element.find('img')
+        src = a['href'] if a is not None else (img.get('data-src') or img.get('src', "")) if img is not None else ""
+
+        return util.strip_revision_from_url(src) if src else ""
+    elif column.kind == "link":
+        a = element if element.name == 'a' else element.find('a', href=True)
+        return urljoin(wiki_base_link, a['href']) if a is not None else ""
+    elif column.kind == "html":
+        element = util.replace_all_wiki_links(element, wiki_base_link)
+        return util.render_html(element, allowed_tags).replace("\xa0", "")
+
+    return util.remove_excessive_whitespace(element.text.replace("\xa0", " ")).strip()
+
+
+def _load_cache() -> Dict:
+    if not os.path.exists(ROW_CACHE_PATH):
+        return {}
+
+    try:
+        with open(ROW_CACHE_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except ValueError:
+        return {}  # every row's just parsed again
+
+
+def _save_cache(cache: Dict):
+    os.makedirs(os.path.dirname(ROW_CACHE_PATH), exist_ok=True)
+    util.write_atomic(ROW_CACHE_PATH, json.dumps(cache, ensure_ascii=False, separators=(',', ':')))
+
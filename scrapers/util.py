@@ -1,13 +1,16 @@
 from __future__ import annotations
 
+import html
 import json
 import os
 import re
+import threading
 from datetime import datetime, timedelta
-from typing import ValuesView, Dict, Hashable
+from typing import ValuesView, Dict, Hashable, TYPE_CHECKING
 
-import requests
-from bs4 import BeautifulSoup
+if TYPE_CHECKING:
+    import requests
+    from bs4 import BeautifulSoup, Tag
 
 
 class BiDict(dict):
@@ -54,23 +57,198 @@ def flatten_list(lst: list | ValuesView) -> list:
     return [item for sublist in lst for item in (sublist if isinstance(sublist, list) else [sublist])]
 
 
-def get_content(url: str) -> BeautifulSoup:
-    req = requests.get(url)
-    return BeautifulSoup(req.content, 'html.parser')
+# shared session so that repeated runs (e.g. from the scheduler daemon) re-use pooled connections to the wiki.
+# requests and bs4 are imported lazily, so only the scrapers that actually fetch pages pay for importing them
+SESSION = None
+SESSION_POOL_SIZE = None
+SESSION_LOCK = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    The shared session, with a connection pool per host big enough for as many requests as concurrency.FANDOM_LIMITER
+    can let through at once (the default of 10 would mean connections being thrown away and opened again, whenever
+    there are more in-flight than that). If the limiter is reconfigured with a different max, the pools are too.
+    """
+    global SESSION, SESSION_POOL_SIZE
+    import concurrency
+
+    pool_size = concurrency.FANDOM_LIMITER.max_limit
+
+    if SESSION is None or SESSION_POOL_SIZE != pool_size:
+        with SESSION_LOCK:
+            # checked again, as another thread may have got here first
+            if SESSION is None or SESSION_POOL_SIZE != pool_size:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = SESSION if SESSION is not None else requests.Session()
+
+                for prefix in ("https://", "http://"):
+                    session.mount(prefix, HTTPAdapter(pool_maxsize=pool_size))
+
+                SESSION, SESSION_POOL_SIZE = session, pool_size
+
+    return SESSION
+
+
+def get_content(url: str, max_retries: int = 5) -> BeautifulSoup:
+    """ Fetches a page from the wiki (see get_response), and parses it. """
+    from bs4 import BeautifulSoup
+    from metrics import METRICS
+
+    req = get_response(url, max_retries=max_retries)
+
+    METRICS.inc("wiki_bytes_total", len(req.content))
+
+    with METRICS.timed("wiki_parse_seconds"):
+        return BeautifulSoup(req.content, 'html.parser')
+
+
+def get_response(url: str, headers: Dict[str, str] = None, max_retries: int = 5) -> requests.Response:
+    """
+    Fetches anything from Fandom (pages from the wiki, or images from its CDN). The number of requests in-flight at
+    once is controlled by concurrency.FANDOM_LIMITER, which backs off if we get throttled (429 / 503), retrying
+    afterwards. If we're still being throttled after max_retries, the HTTPError is raised (rather than the error page
+    being returned).
+    """
+    import time
+    import concurrency
+    from metrics import METRICS
+
+    for attempt in range(max_retries + 1):
+        limiter = concurrency.FANDOM_LIMITER
+
+        with limiter.slot(), METRICS.timed("wiki_request_seconds"):
+            start = time.perf_counter()
+            req = get_session().get(url, headers=headers)
+            latency = time.perf_counter() - start
+
+        METRICS.inc("wiki_requests_total", status=req.status_code)
+
+        if req.status_code in (429, 503):
+            limiter.on_throttle()
+
+            if attempt == max_retries:
+                req.raise_for_status()
+
+            concurrency.backoff_sleep(attempt, req.headers.get('Retry-After'))
+            continue
+
+        limiter.on_success(latency)
+        return req
 
 
 def replace_all_wiki_links(soup: BeautifulSoup,
                            wiki_base_link: str = "https://deadbydaylight.fandom.com/wiki/") -> BeautifulSoup:
-    for a in soup.find_all('a'):
-        a['href'] = a['href'].replace('/wiki/', wiki_base_link)
+    from urllib.parse import urljoin
+
+    # relative to the wiki's root, so links on other languages' wikis (e.g. /de/wiki/Aura) work too
+    for a in soup.find_all('a', href=True):
+        if not a['href'].startswith('#'):
+            a['href'] = urljoin(wiki_base_link, a['href'])
 
     return soup
 
 
+# elements that are left out of rendered HTML altogether (including their contents)
+DROPPED_TAGS = frozenset({"script", "style", "noscript", "img", "figure"})
+
+VOID_TAGS = frozenset({"br", "hr", "img", "wbr"})
+
+# whitespace next to (or at the start / end of) these doesn't render, so it's left out
+BLOCK_TAGS = frozenset({"div", "p", "ul", "ol", "li", "br", "table", "tr", "th", "td"})
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def render_html(tag: Tag, allowed: Dict[str, frozenset]) -> str:
+    """
+    Renders tag (and everything in it) as compact HTML, only keeping the elements in allowed (tag name -> attributes to
+    keep). Any other element is replaced by its contents, apart from DROPPED_TAGS, which are removed completely.
+
+    Whitespace is collapsed (it renders the same) and nothing is indented, unlike prettify(), which puts every tag and
+    string on its own indented line.
+    """
+    from bs4 import NavigableString
+
+    out = []
+
+    def render(node):
+        if isinstance(node, NavigableString):
+            if type(node) is NavigableString and not _is_ignorable_whitespace(node):  # not a comment, doctype etc.
+                out.append(html.escape(WHITESPACE_RE.sub(' ', node), quote=False))
+            return
+
+        if node.name in DROPPED_TAGS:
+            return
+
+        keep = node.name in allowed
+
+        if keep:
+            out.append(f'<{node.name}')
+
+            for attr, value in node.attrs.items():
+                if attr in allowed[node.name]:
+                    value = " ".join(value) if isinstance(value, list) else value  # i.e. class
+                    out.append(f' {attr}="{html.escape(value)}"')
+
+            out.append('>')
+
+        for child in node.children:
+            render(child)
+
+        if keep and node.name not in VOID_TAGS:
+            out.append(f'</{node.name}>')
+
+    render(tag)
+    return "".join(out)
+
+
+def _is_ignorable_whitespace(node) -> bool:
+    if not node.isspace():
+        return False
+
+    return any((sibling.name if sibling is not None else node.parent.name) in BLOCK_TAGS
+               for sibling in (node.previous_sibling, node.next_sibling))
+
+
+def language_links(soup: BeautifulSoup) -> Dict[str, str]:
+    """ :return: locale (e.g. "de") -> link to the same page on that language's wiki, from the page's language list """
+    links = {}
+
+    for a in soup.select('a[data-tracking-label^="lang-"], li.interlanguage-link a'):
+        locale = a.get('lang') or a.get('hreflang') or a.get('data-tracking-label', "").removeprefix('lang-')
+
+        if locale and a.get('href'):
+            links[locale] = a['href']
+
+    return links
+
+
+def wiki_base_link(url: str) -> str:
+    """ e.g. https://deadbydaylight.fandom.com/de/wiki/Fähigkeiten -> https://deadbydaylight.fandom.com/de/wiki/ """
+    return url.split('/wiki/')[0] + '/wiki/'
+
+
+def image_name(url: str) -> str:
+    """
+    The file name of an image on the wiki (e.g. iconperks_bond.png), which is the same on every language's wiki, unlike
+    the rest of the URL.
+    """
+    from urllib.parse import unquote
+    return unquote(url.split('/revision/')[0].split('?')[0].rsplit('/', 1)[-1]).replace(' ', '_').lower()
+
+
 def remove_excessive_whitespace(text: str) -> str:
     return re.sub(r'\s+', ' ', text)
 
 
+def slugify(name: str) -> str:
+    """ e.g. "The Legion" -> The_Legion, for file names (see bundle.py and static_site.py) """
+    return re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_')
+
+
 def pretty_print(obj):
     print(json.dumps(obj, sort_keys=True, indent=4))
 
@@ -84,6 +262,14 @@ def rgb_to_hex(red: float, green: float, blue: float) -> str:
     return '#%02x%02x%02x' % (round(red * 255), round(green * 255), round(blue * 255))
 
 
+def colour_to_hex(colour: dict | str | None) -> str | None:
+    """ colours in the outputs are {"red", "green", "blue"} (0-255) dicts (see rgb_to_dict); hex / None pass through """
+    if isinstance(colour, dict):
+        return '#%02x%02x%02x' % (colour.get('red', 0), colour.get('green', 0), colour.get('blue', 0))
+
+    return colour
+
+
 def rgb_dict_to_dict(rgb: dict) -> Dict:
     return rgb_to_dict(rgb.get('red', 0.0), rgb.get('green', 0.0), rgb.get('blue', 0.0))
 
@@ -135,9 +321,24 @@ def make_dirs():
 
 
 def save_json(file_name, content, current_date):
-    if current_date is not None:
-        with open(f'{one_dir_up()}/out/archive/{file_name}_{current_date}.json', 'w', encoding='utf-8') as f:
-            json.dump(content, f, ensure_ascii=False, indent=4)
+    from metrics import METRICS
+
+    with METRICS.timed("save_json_seconds", file=file_name):
+        encoded = json.dumps(content, ensure_ascii=False, indent=4)
+
+        if current_date is not None:
+            write_atomic(f'{one_dir_up()}/out/archive/{file_name}_{current_date}.json', encoded)
+
+        write_atomic(f'{one_dir_up()}/out/{file_name}_LATEST.json', encoded)
+
+    METRICS.inc("save_json_bytes_total", len(encoded.encode('utf-8')), file=file_name)
+
+
+def write_atomic(path, content: str):
+    """ writes to a temporary file first, so anything reading the file (e.g. the server) never sees half of it """
+    tmp_path = f'{path}.tmp'
+
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
 
-    with open(f'{one_dir_up()}/out/{file_name}_LATEST.json', 'w', encoding='utf-8') as f:
-        json.dump(content, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, path)
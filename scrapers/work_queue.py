@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import json
+import socket
+import sqlite3
+import os
+import time
+from typing import Dict, List, Tuple
+
+import util
+
+QUEUE_PATH = f'{util.one_dir_up()}/out/queue.db'
+
+DEFAULT_LEASE_SECONDS = 120
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',  -- pending, claimed, done, failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    UNIQUE (batch, kind, payload)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires);
+CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch, status);
+"""
+
+
+class WorkQueue:
+    """
+    Job queue stored in a SQLite database, so any number of processes on the same machine can take jobs off it. The
+    database is in WAL mode, which relies on shared memory between the processes, so it mustn't be on a network
+    drive (and SQLite's locking isn't reliable on one anyway).
+
+    Jobs are claimed with a lease; if the worker doesn't finish the job (or renew the lease) before it expires (e.g.
+    because the worker died), the job goes back to being pending and another worker can claim it. Jobs that fail
+    MAX_ATTEMPTS times are marked as failed.
+
+    Jobs are grouped into batches (e.g. one batch per run), and a job is only ever in a batch once.
+    """
+
+    def __init__(self, path: str = QUEUE_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def enqueue(self, batch: str, kind: str, payloads: List[Dict]) -> int:
+        """
+        Adds the jobs to the batch. Jobs already in the batch are left as they are, apart from ones that failed, which
+        are put back with all their attempts (so re-running a batch retries them).
+
+        :return: number of jobs added or put back
+        """
+        cursor = self.conn.executemany("INSERT INTO jobs (batch, kind, payload) VALUES (?, ?, ?) "
+                                       "ON CONFLICT (batch, kind, payload) DO UPDATE SET status = 'pending', "
+                                       "attempts = 0, worker = NULL, lease_expires = NULL, error = NULL "
+                                       "WHERE status = 'failed'",
+                                       [(batch, kind, json.dumps(p, sort_keys=True)) for p in payloads])
+        return cursor.rowcount
+
+    def claim(self, worker: str, kinds: List[str] = None, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+              batch: str = None) -> Tuple[int, str, Dict] | None:
+        """
+        :param batch: Only claim jobs from this batch (any batch if None).
+        :return: (job id, kind, payload) of the claimed job, or None if there's nothing to claim
+        """
+        now = time.time()
+
+        # BEGIN IMMEDIATE takes the write lock straight away, so two workers can't claim the same job
+        self.conn.execute("BEGIN IMMEDIATE")
+
+        try:
+            self._expire_leases(now)
+
+            query = "SELECT id, kind, payload FROM jobs WHERE status = 'pending'"
+            params = []
+
+            if batch is not None:
+                query += " AND batch = ?"
+                params.append(batch)
+
+            if kinds:
+                query += f" AND kind IN ({','.join('?' * len(kinds))})"
+                params += kinds
+
+            row = self.conn.execute(query + " ORDER BY id LIMIT 1", params).fetchone()
+
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+
+            self.conn.execute("UPDATE jobs SET status = 'claimed', worker = ?, lease_expires = ?, "
+                              "attempts = attempts + 1 WHERE id = ?", (worker, now + lease_seconds, row['id']))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        return row['id'], row['kind'], json.loads(row['payload'])
+
+    def _expire_leases(self, now: float):
+        self.conn.execute("UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                          "worker = NULL, error = COALESCE(error, 'lease expired') "
+                          "WHERE status = 'claimed' AND lease_expires < ?", (MAX_ATTEMPTS, now))
+
+    def renew(self, job_id: int, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """ :return: whether the job is still ours """
+        cursor = self.conn.execute("UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? "
+                                   "AND status = 'claimed'", (time.time() + lease_seconds, job_id, worker))
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker: str, result) -> bool:
+        """ :return: whether the result was accepted (False if our lease expired and someone else has the job) """
+        cursor = self.conn.execute("UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_expires = NULL "
+                                   "WHERE id = ? AND worker = ? AND status = 'claimed'",
+                                   (json.dumps(result, ensure_ascii=False), job_id, worker))
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: int, worker: str, error: str):
+        """ puts the job back for another attempt (or marks it as failed, if it's out of attempts) """
+        self.conn.execute("UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                          "worker = NULL, lease_expires = NULL, error = ? "
+                          "WHERE id = ? AND worker = ? AND status = 'claimed'", (MAX_ATTEMPTS, error, job_id, worker))
+
+    def counts(self, batch: str) -> Dict[str, int]:
+        self._expire_leases(time.time())
+        rows = self.conn.execute("SELECT status, COUNT(*) AS n FROM jobs WHERE batch = ? GROUP BY status", (batch,))
+        return {row['status']: row['n'] for row in rows}
+
+    def results(self, batch: str, kind: str) -> List[Tuple[Dict, Dict]]:
+        """ :return: (payload, result) of every finished job of the given kind in the batch """
+        rows = self.conn.execute("SELECT payload, result FROM jobs WHERE batch = ? AND kind = ? AND status = 'done' "
+                                 "ORDER BY id", (batch, kind))
+        return [(json.loads(row['payload']), json.loads(row['result'])) for row in rows]
+
+    def failures(self, batch: str) -> List[Tuple[Dict, str]]:
+        rows = self.conn.execute("SELECT payload, error FROM jobs WHERE batch = ? AND status = 'failed' ORDER BY id",
+                                 (batch,))
+        return [(json.loads(row['payload']), row['error']) for row in rows]
+
+
+def worker_id() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
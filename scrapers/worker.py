@@ -0,0 +1,90 @@
+import threading
+
+import cli
+from work_queue import DEFAULT_LEASE_SECONDS, WorkQueue, worker_id
+
+CHARACTER_JOB = "character"
+
+
+def _scrape_character_job(payload):
+    from character_scraper import _scrape_character
+    return _scrape_character(payload['url'], payload['character_type'])
+
+
+# job kind -> function mapping the job's payload to its result (new kinds of pages go here)
+JOB_HANDLERS = {
+    CHARACTER_JOB: _scrape_character_job,
+}
+
+
+def run_worker(queue_path: str, exit_when_empty: bool = False, poll_interval: float = 2.0, name: str = None,
+               batch: str = None, lease_seconds: float = DEFAULT_LEASE_SECONDS, stop: threading.Event = None):
+    """
+    Takes jobs off the queue at queue_path (only from the given batch, if there is one) and runs them until there's
+    none left (if exit_when_empty), until stop is set (if there is one), or forever.
+
+    While a job's running, its lease is renewed in the background (see _keep_leased), so jobs that take longer than
+    the lease (e.g. while waiting on the wiki's limiter) aren't handed to another worker.
+
+    Each thread needs its own WorkQueue (SQLite connections can't be shared between threads), so this makes its own.
+    """
+    work_queue = WorkQueue(queue_path)
+    name = name or f'{worker_id()}:{threading.get_ident()}'
+    stop = stop if stop is not None else threading.Event()
+
+    while not stop.is_set():
+        job = work_queue.claim(name, kinds=list(JOB_HANDLERS.keys()), lease_seconds=lease_seconds, batch=batch)
+
+        if job is None:
+            if exit_when_empty:
+                return
+
+            stop.wait(poll_interval)
+            continue
+
+        job_id, kind, payload = job
+
+        done = threading.Event()
+        heartbeat = threading.Thread(target=_keep_leased, args=(queue_path, job_id, name, done, lease_seconds),
+                                     daemon=True)
+        heartbeat.start()
+
+        try:
+            result = JOB_HANDLERS[kind](payload)
+        except Exception as e:
+            print(f'Job {job_id} ({kind}: {payload}) failed! ({repr(e)})')
+            work_queue.fail(job_id, name, repr(e))
+            continue
+        finally:
+            done.set()
+            heartbeat.join()
+
+        if not work_queue.complete(job_id, name, result):
+            print(f'Job {job_id} ({kind}) finished after its lease expired, result discarded.')
+
+
+def _keep_leased(queue_path: str, job_id: int, name: str, done: threading.Event,
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS):
+    """ renews the job's lease every third of the lease, until done is set (or the job's no longer ours) """
+    work_queue = None
+
+    while not done.wait(lease_seconds / 3):
+        work_queue = work_queue or WorkQueue(queue_path)  # its own connection, as it's on its own thread
+
+        if not work_queue.renew(job_id, name, lease_seconds):
+            return
+
+
+def run_workers(queue_path: str, no_workers: int, exit_when_empty: bool = False, batch: str = None):
+    workers = [threading.Thread(target=run_worker, args=(queue_path, exit_when_empty),
+                                kwargs={"batch": batch}) for _ in range(no_workers)]
+
+    [worker.start() for worker in workers]
+    [worker.join() for worker in workers]
+
+
+if __name__ == "__main__":
+    args = cli.parse_worker_args()
+
+    print(f'Starting {args.no_workers} worker(s) on {args.queue}...')
+    run_workers(args.queue, args.no_workers, exit_when_empty=args.exit_when_empty, batch=args.batch)
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import os
+import posixpath
+import re
+import threading
+import zipfile
+from typing import Dict, List, Tuple
+from xml.etree import ElementTree
+
+import util
+
+EXPORT_URL = "https://docs.google.com/spreadsheets/d/{spreadsheet_id}/export?format=xlsx"
+EXPORT_PATH = f'{util.one_dir_up()}/out/cache/{{spreadsheet_id}}.xlsx'
+
+NS = {
+    "m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+
+CELL_REF_RE = re.compile(r'^\$?([A-Z]+)\$?(\d+)$')
+HYPERLINK_FORMULA_RE = re.compile(r'^=?HYPERLINK\(\s*"((?:[^"]|"")*)"', re.IGNORECASE)
+
+
+def download_export(spreadsheet_id: str, path: str = None) -> str:
+    """ downloads the whole spreadsheet (values, formatting and links) as one XLSX file, in a single request """
+    print(f"Downloading spreadsheet {spreadsheet_id} as XLSX...")
+
+    response = util.get_session().get(EXPORT_URL.format(spreadsheet_id=spreadsheet_id))
+    response.raise_for_status()
+
+    path = path if path is not None else EXPORT_PATH.format(spreadsheet_id=spreadsheet_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(f'{path}.tmp', 'wb') as f:
+        f.write(response.content)
+
+    os.replace(f'{path}.tmp', path)
+    return path
+
+
+def load_service(path: str | None, spreadsheet_id: str) -> XlsxService:
+    """ the service for the workbook at path, or for a fresh export of the spreadsheet if path is None """
+    return XlsxService(path if path is not None else download_export(spreadsheet_id))
+
+
+class XlsxService:
+    """
+    Stands in for the Google Sheets API service, answering spreadsheets().get(...) from a local XLSX export of the
+    spreadsheet instead, with the same response shape (only the parts otz_scraper uses: effectiveValue,
+    userEnteredFormat.backgroundColor(Style), effectiveFormat.borders and hyperlink).
+
+    Each sheet in the workbook is only read the first time it's asked for, and is streamed (cell by cell) rather
+    than loaded as a whole XML tree.
+    """
+
+    # not an API, so there's no quota to stay within (see sheets.get)
+    rate_limited = False
+
+    def __init__(self, path: str):
+        self.path = path
+        self.zip = zipfile.ZipFile(path)
+
+        self.sheet_paths = self._read_sheet_paths()
+        self.shared_strings = self._read_shared_strings()
+        self.styles = self._read_styles()
+
+        self._sheets = {}
+        self._lock = threading.Lock()  # several sheets can be scraped at once (see otz_scraper.scrape_sheets)
+
+    # ---- the (tiny) part of the googleapiclient interface that's used ----
+    def spreadsheets(self):
+        return self
+
+    def get(self, spreadsheetId: str, ranges: List[str], includeGridData: bool = True):
+        return _Request(self, ranges)
+
+    def values_for(self, ranges: List[str]) -> Dict:
+        data = {}
+
+        for sheet_name, (start, end) in (_parse_range(str(r)) for r in ranges):
+            # like the API, a range without a sheet name (e.g. the misc cells, see otz_scraper._scrape_misc) is on the
+            # first sheet
+            sheet_name = sheet_name if sheet_name is not None else next(iter(self.sheet_paths))
+            cells = self._sheet(sheet_name)
+
+            data.setdefault(sheet_name, []).append({"rowData": [
+                {"values": [cells.get((col, row), _empty_cell()) for col in range(start[0], end[0] + 1)]}
+                for row in range(start[1], end[1] + 1)
+            ]})
+
+        return {"sheets": [{"properties": {"title": name}, "data": grids} for name, grids in data.items()]}
+
+    # ---- reading the workbook ----
+    def _xml(self, path: str) -> ElementTree.Element | None:
+        if path not in self.zip.namelist():
+            return None
+
+        with self.zip.open(path) as f:
+            return ElementTree.parse(f).getroot()
+
+    def _read_sheet_paths(self) -> Dict[str, str]:
+        """ sheet name -> path of the sheet's XML in the workbook """
+        workbook = self._xml("xl/workbook.xml")
+        rels = _read_rels(self._xml("xl/_rels/workbook.xml.rels"), "xl")
+
+        return {sheet.get('name'): rels[sheet.get(f'{{{NS["r"]}}}id')]
+                for sheet in workbook.iterfind('m:sheets/m:sheet', NS)}
+
+    def _read_shared_strings(self) -> List[str]:
+        root = self._xml("xl/sharedStrings.xml")
+
+        if root is None:
+            return []
+
+        # rich text strings are split up into runs, each with their own <t>
+        return ["".join(t.text or "" for t in si.iter(f'{{{NS["m"]}}}t')) for si in root.iterfind('m:si', NS)]
+
+    def _read_styles(self) -> List[Tuple[Dict | None, Dict]]:
+        """ :return: (background colour, borders) for each cell style (what a cell's s="..." refers to) """
+        root = self._xml("xl/styles.xml")
+
+        if root is None:
+            return []
+
+        fills = []
+
+        for fill in root.iterfind('m:fills/m:fill', NS):
+            pattern = fill.find('m:patternFill', NS)
+            colour = pattern.find('m:fgColor', NS) if pattern is not None and pattern.get('patternType') == 'solid' \
+                else None
+
+            # theme / indexed colours aren't resolved (Google's exports always give the RGB)
+            fills.append(_argb_to_colour(colour.get('rgb')) if colour is not None and colour.get('rgb') else None)
+
+        borders = [{side.tag.split('}')[1]: {"style": side.get('style').upper()}
+                    for side in border if side.get('style') is not None}
+                   for border in root.iterfind('m:borders/m:border', NS)]
+
+        return [(fills[int(xf.get('fillId', 0))] if fills else None,
+                 borders[int(xf.get('borderId', 0))] if borders else {})
+                for xf in root.iterfind('m:cellXfs/m:xf', NS)]
+
+    def _sheet(self, sheet_name: str) -> Dict[Tuple[int, int], Dict]:
+        with self._lock:
+            if sheet_name not in self._sheets:
+                if sheet_name not in self.sheet_paths:
+                    raise KeyError(f'No sheet called "{sheet_name}" in {self.path}!')
+
+                self._sheets[sheet_name] = self._read_sheet(self.sheet_paths[sheet_name])
+
+            return self._sheets[sheet_name]
+
+    def _read_sheet(self, path: str) -> Dict[Tuple[int, int], Dict]:
+        cells = {}
+        links = {}
+        link_ids = {}
+
+        with self.zip.open(path) as f:
+            for _, elem in ElementTree.iterparse(f):
+                tag = elem.tag.split('}')[1]
+
+                if tag == 'c':
+                    position = _parse_cell_ref(elem.get('r'))
+                    cells[position] = self._cell(elem)
+
+                    if (formula := elem.findtext('m:f', None, NS)) and HYPERLINK_FORMULA_RE.match(formula):
+                        links[position] = HYPERLINK_FORMULA_RE.match(formula).group(1).replace('""', '"')
+
+                    elem.clear()  # keeps memory flat, however big the sheet is
+                elif tag == 'hyperlink':
+                    link_ids[_parse_cell_ref(elem.get('ref').split(':')[0])] = elem.get(f'{{{NS["r"]}}}id')
+
+        # links that aren't formulas point (by id) at the sheet's relationships
+        rels = _read_rels(self._xml(_rels_path(path)), posixpath.dirname(path))
+
+        for position, rel_id in link_ids.items():
+            if rel_id in rels:
+                links.setdefault(position, rels[rel_id])
+
+        for position, link in links.items():
+            cells.setdefault(position, _empty_cell())['hyperlink'] = link
+
+        return cells
+
+    def _cell(self, elem: ElementTree.Element) -> Dict:
+        cell = _empty_cell()
+        value, cell_type = elem.findtext('m:v', None, NS), elem.get('t', 'n')
+
+        if cell_type == 'inlineStr':
+            value = "".join(t.text or "" for t in elem.iter(f'{{{NS["m"]}}}t'))
+
+        if value is not None:
+            if cell_type == 's':
+                cell['effectiveValue'] = {"stringValue": self.shared_strings[int(value)]}
+            elif cell_type in ('str', 'inlineStr', 'e'):
+                cell['effectiveValue'] = {"stringValue": value}
+            elif cell_type == 'b':
+                cell['effectiveValue'] = {"boolValue": value == '1'}
+            else:
+                cell['effectiveValue'] = {"numberValue": float(value)}
+
+        style = int(elem.get('s', 0))
+
+        if style < len(self.styles):
+            background, borders = self.styles[style]
+
+            if background is not None:
+                cell['userEnteredFormat'] = {"backgroundColor": background,
+                                             "backgroundColorStyle": {"rgbColor": background}}
+            if borders:
+                cell['effectiveFormat'] = {"borders": borders}
+
+        return cell
+
+
+class _Request:
+    def __init__(self, service: XlsxService, ranges: List[str]):
+        self.service = service
+        self.ranges = ranges
+
+    def execute(self) -> Dict:
+        return self.service.values_for(self.ranges)
+
+
+def _empty_cell() -> Dict:
+    return {"userEnteredFormat": {"backgroundColor": {}}, "effectiveFormat": {}}
+
+
+def _argb_to_colour(argb: str) -> Dict:
+    """ e.g. FF38761D -> {red: 0.22, green: 0.46, blue: 0.11} (0-1, like the Sheets API) """
+    rgb = argb[-6:]
+    return {name: int(rgb[i:i + 2], 16) / 255 for name, i in (("red", 0), ("green", 2), ("blue", 4))}
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+
+    for letter in letters:
+        index = index * 26 + (ord(letter) - ord('A') + 1)
+
+    return index - 1
+
+
+def _parse_cell_ref(ref: str) -> Tuple[int, int]:
+    """ e.g. B20 -> (1, 20), i.e. the same (col, row) as Cell """
+    letters, row = CELL_REF_RE.match(ref.upper()).groups()
+    return _column_index(letters), int(row)
+
+
+def _parse_range(a1_range: str) -> Tuple[str | None, Tuple[Tuple[int, int], Tuple[int, int]]]:
+    """ e.g. Killer Info!B20:K31 -> ("Killer Info", ((1, 20), (10, 31))), or G4 -> (None, ((6, 4), (6, 4))) """
+    sheet_name, _, cells = a1_range.rpartition('!')
+    start, _, end = cells.partition(':')
+
+    sheet_name = sheet_name.strip("'").replace("''", "'") if sheet_name else None
+    return sheet_name, (_parse_cell_ref(start), _parse_cell_ref(end or start))
+
+
+def _rels_path(path: str) -> str:
+    return posixpath.join(posixpath.dirname(path), "_rels", f'{posixpath.basename(path)}.rels')
+
+
+def _read_rels(root: ElementTree.Element | None, base_dir: str) -> Dict[str, str]:
+    """ relationship id -> target (a path in the workbook, or an external URL) """
+    if root is None:
+        return {}
+
+    rels = {}
+
+    for rel in root.iterfind('rel:Relationship', NS):
+        target = rel.get('Target')
+
+        if rel.get('TargetMode') != 'External':
+            target = target.lstrip('/') if target.startswith('/') else posixpath.normpath(f'{base_dir}/{target}')
+
+        rels[rel.get('Id')] = target
+
+    return rels